@@ -0,0 +1,500 @@
+"""
+Cálculo dos widgets de análise
+- Funções puras que recebem um DataFrame já filtrado
+- Usadas pelos endpoints individuais e pelo /dashboard
+- O dashboard reaproveita colunas derivadas e agrupamentos entre widgets
+- Widgets com medidas aditivas aceitam um CubeQuery e somam o cubo diário
+  em vez de varrer as transações
+- Rankings por seleção parcial (argpartition): só os k escolhidos são ordenados
+- Clientes distintos exatos pelos códigos inteiros de cliente_id (bitmap, sem hash) ou
+  aproximados pelos sketches HyperLogLog diários (SketchQuery)
+"""
+
+import logging
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from cube import CubeQuery
+
+if TYPE_CHECKING:
+    from sketch import SketchQuery
+
+logger = logging.getLogger("analytics_api")
+
+# Faixas etárias usadas em /customers-by-age
+AGE_BINS = [0, 18, 25, 35, 45, 55, 65, 150]
+AGE_LABELS = ['< 18', '18-25', '25-35', '35-45', '45-55', '55-65', '> 65']
+
+# Medidas aceitas em /top-products?order_by=
+RANKING_MEASURES = ('quantidade', 'valor_total', 'lucro', 'transacoes')
+
+EMPTY_KPIS = {
+    "total_vendas": 0,
+    "faturamento_total": 0,
+    "ticket_medio": 0,
+    "lucro_total": 0,
+    "margem_lucro_media": 0,
+    "clientes_unicos": 0,
+    "avaliacao_media": 0
+}
+
+# ============================================================================
+# COLUNAS DERIVADAS E AGRUPAMENTOS COMPARTILHADOS
+# ============================================================================
+
+def compute_profit(data: pd.DataFrame) -> Optional[pd.Series]:
+    """Lucro por linha: valor_final - custo_produto * quantidade"""
+    if not {'valor_final', 'custo_produto', 'quantidade'}.issubset(data.columns):
+        return None
+    return (data['valor_final'] - (data['custo_produto'] * data['quantidade'])).rename('lucro')
+
+
+def product_summary(data: pd.DataFrame, profit: Optional[pd.Series] = None) -> pd.DataFrame:
+    """Agrupamento único por produto usado pelo ranking e pelas avaliações"""
+    if profit is None:
+        profit = compute_profit(data)
+
+    aggregations = {
+        'quantidade': ('quantidade', 'sum'),
+        'valor_total': ('valor_final', 'sum'),
+        'transacoes': ('id_transacao', 'count'),
+    }
+    frame = data
+    if profit is not None:
+        frame = data.assign(lucro=profit)
+        aggregations['lucro'] = ('lucro', 'sum')
+    if 'avaliacao_produto' in data.columns:
+        aggregations['avaliacao'] = ('avaliacao_produto', 'mean')
+
+    products = frame.groupby('nome_produto', observed=True).agg(**aggregations).reset_index()
+    products = products.rename(columns={'nome_produto': 'name'})
+    if profit is None:
+        products['lucro'] = products['valor_total'] * 0.3  # Margem padrão de 30%
+    return products
+
+
+def product_summary_from_cube(cube: CubeQuery) -> pd.DataFrame:
+    """Mesmo formato de product_summary, somando o cuboide dia x produto"""
+    grouped = cube.group('nome_produto')
+    grouped = grouped[grouped['linhas'] > 0]
+
+    products = pd.DataFrame({
+        'quantidade': grouped['quantidade'],
+        'valor_total': grouped['valor_final'],
+        'transacoes': grouped['transacoes'],
+    })
+    if cube.has_profit:
+        products['lucro'] = grouped['lucro']
+    else:
+        products['lucro'] = products['valor_total'] * 0.3  # Margem padrão de 30%
+    if 'avaliacao' in grouped.columns:
+        products['avaliacao'] = grouped['avaliacao'] / grouped['avaliacao_n']
+
+    products.index.name = 'name'
+    return products.reset_index()
+
+
+def _cube_records(grouped: pd.DataFrame, columns: Dict[str, pd.Series], sort_by: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+    """Monta registros name/medidas a partir de um agrupamento do cubo"""
+    result = pd.DataFrame(columns, index=grouped.index)
+    result = result[grouped['linhas'] > 0]
+    result.index.name = 'name'
+    result = result.reset_index()
+    if sort_by:
+        result = result.sort_values(sort_by, ascending=False)
+    if limit is not None:
+        result = result.head(limit)
+    return result.to_dict('records')
+
+
+def top_k(frame: pd.DataFrame, column: str, limit: int, ascending: bool = False) -> pd.DataFrame:
+    """
+    As limit linhas com maior (ou menor) valor em column, ordenadas
+
+    Equivale a sort_values(kind='stable').head(limit): empates mantêm a ordem original e
+    NaN fica por último. A seleção é O(n) (argpartition) e só os k escolhidos são ordenados.
+    """
+    if limit <= 0:
+        return frame.iloc[:0]
+    if limit >= len(frame):
+        return frame.sort_values(column, ascending=ascending, kind='stable')
+
+    values = frame[column].to_numpy(dtype='float64')
+    keys = values if ascending else -values
+    kth = np.partition(keys, limit - 1)[limit - 1]
+    if np.isnan(kth):
+        # Menos de limit valores válidos: todos eles e os primeiros NaN
+        chosen = np.flatnonzero(~np.isnan(keys))
+        ties = np.flatnonzero(np.isnan(keys))
+    else:
+        chosen = np.flatnonzero(keys < kth)
+        ties = np.flatnonzero(keys == kth)
+    selected = np.concatenate([chosen, ties[:limit - len(chosen)]])
+    order = selected[np.lexsort((selected, keys[selected]))]
+    return frame.iloc[order]
+
+
+def _products(data: pd.DataFrame, cube: Optional[CubeQuery]) -> pd.DataFrame:
+    if _use_cube(cube, 'nome_produto') and 'quantidade' in data.columns:
+        return product_summary_from_cube(cube)
+    return product_summary(data)
+
+
+def _use_cube(cube: Optional[CubeQuery], *dims: str) -> bool:
+    return cube is not None and all(cube.has(dim) for dim in dims)
+
+
+def age_bands(ages: pd.Series) -> np.ndarray:
+    """Índice da faixa etária (AGE_LABELS) de cada linha, -1 fora das faixas ou sem idade"""
+    return pd.cut(ages, bins=AGE_BINS, labels=AGE_LABELS, right=False).cat.codes.to_numpy().astype(np.int64)
+
+
+def distinct_count(values: pd.Series) -> int:
+    """Distintos exatos; em category conta os códigos presentes (bitmap, sem hash por linha)"""
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return int(values.nunique())
+    codes = values.cat.codes.to_numpy()
+    seen = np.zeros(len(values.cat.categories), dtype=bool)
+    seen[codes[codes >= 0]] = True
+    return int(np.count_nonzero(seen))
+
+
+def distinct_by_group(values: pd.Series, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """Distintos exatos por grupo (0..n_groups-1; -1 fica de fora)"""
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        counts = values[groups >= 0].groupby(groups[groups >= 0]).nunique()
+        return counts.reindex(range(n_groups), fill_value=0).to_numpy()
+    codes = values.cat.codes.to_numpy()
+    size = len(values.cat.categories)
+    valid = (codes >= 0) & (groups >= 0)
+    seen = np.zeros(n_groups * size, dtype=bool)
+    seen[groups[valid] * size + codes[valid]] = True
+    return seen.reshape(n_groups, size).sum(axis=1)
+
+# ============================================================================
+# WIDGETS
+# ============================================================================
+
+def kpis(data: pd.DataFrame, profit: Optional[pd.Series] = None, cube: Optional[CubeQuery] = None,
+         distinct: Optional["SketchQuery"] = None) -> Dict:
+    """KPIs principais (clientes_unicos aproximado quando recebe os sketches do intervalo)"""
+    if data.empty:
+        return dict(EMPTY_KPIS)
+
+    if cube is not None and cube.has_profit:
+        return _kpis_from_cube(data, cube, distinct)
+
+    result = {
+        "total_vendas": int(len(data)),
+    }
+
+    # Usar colunas específicas do dataset
+    if 'valor_final' in data.columns:
+        result["faturamento_total"] = float(data['valor_final'].sum())
+        result["ticket_medio"] = float(data['valor_final'].mean())
+
+    if profit is None:
+        profit = compute_profit(data)
+
+    if profit is not None:
+        # Calcular lucro: (valor_final - custo_total) por linha
+        lucro = profit.sum()
+        faturamento = data['valor_final'].sum()
+        result["lucro_total"] = float(lucro)
+        result["margem_lucro_media"] = float((lucro / faturamento * 100)) if faturamento > 0 else 0
+    elif 'margem_lucro' in data.columns:
+        result["lucro_total"] = float((data['valor_final'] * data['margem_lucro']).sum()) if 'valor_final' in data.columns else 0
+        result["margem_lucro_media"] = float(data['margem_lucro'].mean() * 100)
+
+    _unique_customers(result, data, distinct)
+
+    if 'avaliacao_produto' in data.columns:
+        result["avaliacao_media"] = float(data['avaliacao_produto'].mean())
+
+    return result
+
+
+def _kpis_from_cube(data: pd.DataFrame, cube: CubeQuery, distinct: Optional["SketchQuery"] = None) -> Dict:
+    """Somas do cubo; clientes_unicos (não aditivo) vem dos sketches ou é exato sobre a fatia"""
+    totals = cube.total()
+    lucro = totals['lucro']
+    faturamento = totals['valor_final']
+
+    result = {
+        "total_vendas": int(totals['linhas']),
+        "faturamento_total": float(faturamento),
+        "ticket_medio": float(faturamento / totals['valor_final_n']),
+        "lucro_total": float(lucro),
+        "margem_lucro_media": float((lucro / faturamento * 100)) if faturamento > 0 else 0,
+    }
+
+    _unique_customers(result, data, distinct)
+
+    if 'avaliacao' in totals.index:
+        result["avaliacao_media"] = float(totals['avaliacao'] / totals['avaliacao_n'])
+
+    return result
+
+
+def _unique_customers(result: Dict, data: pd.DataFrame, distinct: Optional["SketchQuery"]) -> None:
+    if distinct is not None:
+        result["clientes_unicos"] = distinct.total()
+        result["clientes_unicos_erro_relativo"] = round(float(distinct.relative_error), 4)
+    elif 'cliente_id' in data.columns:
+        result["clientes_unicos"] = distinct_count(data['cliente_id'])
+
+
+def sales_by_month(data: pd.DataFrame, profit: Optional[pd.Series] = None, cube: Optional[CubeQuery] = None) -> List[Dict]:
+    """Faturamento, vendas e lucro por mês"""
+    if data.empty:
+        return []
+
+    if cube is not None:
+        daily = cube.daily()
+        mes = daily.index.to_period('M').astype(str).rename('mes')
+        monthly = pd.DataFrame({
+            'faturamento': daily['valor_final'].groupby(mes).sum(),
+            'vendas': daily['transacoes'].groupby(mes).sum(),
+        })
+        if cube.has_profit:
+            monthly['lucro'] = daily['lucro'].groupby(mes).sum()
+        return monthly.reset_index().to_dict('records')
+
+    # data_venda já é datetime64 - sem cópia nem re-parsing
+    mes = data['data_venda'].dt.to_period('M').astype(str).rename('mes')
+
+    monthly = data.groupby(mes).agg({
+        'valor_final': 'sum',
+        'id_transacao': 'count'
+    }).reset_index()
+
+    monthly.columns = ['mes', 'faturamento', 'vendas']
+
+    # Adicionar lucro se possível
+    if profit is None:
+        profit = compute_profit(data)
+    if profit is not None:
+        lucro_monthly = profit.groupby(mes).sum().reset_index()
+        monthly = monthly.merge(lucro_monthly, on='mes')
+
+    return monthly.to_dict('records')
+
+
+def sales_by_category(data: pd.DataFrame, cube: Optional[CubeQuery] = None) -> List[Dict]:
+    """Faturamento por categoria"""
+    if data.empty or 'categoria' not in data.columns:
+        return []
+
+    if _use_cube(cube, 'categoria'):
+        grouped = cube.group('categoria')
+        return _cube_records(grouped, {'value': grouped['valor_final']}, sort_by='value')
+
+    category = data.groupby('categoria', observed=True)['valor_final'].sum().reset_index()
+    category.columns = ['name', 'value']
+    category = category.sort_values('value', ascending=False)
+    return category.to_dict('records')
+
+
+def top_products(data: pd.DataFrame, limit: int = 10, products: Optional[pd.DataFrame] = None, cube: Optional[CubeQuery] = None,
+                 order_by: str = 'quantidade') -> List[Dict]:
+    """Produtos mais vendidos por uma das RANKING_MEASURES (padrão: quantidade)"""
+    if order_by not in RANKING_MEASURES:
+        raise ValueError(f"Medida de ranking inválida: {order_by}")
+    if data.empty or 'nome_produto' not in data.columns:
+        return []
+
+    if products is None:
+        products = _products(data, cube)
+
+    products = top_k(products, order_by, limit)
+    return products[['name', 'quantidade', 'valor_total', 'transacoes', 'lucro']].to_dict('records')
+
+
+def customers_by_gender(data: pd.DataFrame, cube: Optional[CubeQuery] = None) -> List[Dict]:
+    """Distribuição de vendas por gênero"""
+    if data.empty or 'genero_cliente' not in data.columns:
+        return []
+
+    if _use_cube(cube, 'genero_cliente'):
+        grouped = cube.group('genero_cliente')
+        return _cube_records(grouped, {'value': grouped['linhas']})
+
+    gender = data.groupby('genero_cliente', observed=True).size().reset_index(name='value')
+    gender.columns = ['name', 'value']
+    return gender.to_dict('records')
+
+
+def sales_by_state(data: pd.DataFrame, limit: int = 10, cube: Optional[CubeQuery] = None) -> List[Dict]:
+    """Faturamento por estado"""
+    if data.empty or 'estado_cliente' not in data.columns:
+        return []
+
+    if _use_cube(cube, 'estado_cliente'):
+        grouped = cube.group('estado_cliente')
+        return _cube_records(grouped, {'value': grouped['valor_final']}, sort_by='value', limit=limit)
+
+    states = data.groupby('estado_cliente', observed=True)['valor_final'].sum().reset_index()
+    states.columns = ['name', 'value']
+    states = states.sort_values('value', ascending=False).head(limit)
+    return states.to_dict('records')
+
+
+def payment_methods(data: pd.DataFrame, cube: Optional[CubeQuery] = None) -> List[Dict]:
+    """Quantidade, total e média por forma de pagamento"""
+    if data.empty or 'forma_pagamento' not in data.columns:
+        return []
+
+    if _use_cube(cube, 'forma_pagamento'):
+        grouped = cube.group('forma_pagamento')
+        return _cube_records(grouped, {
+            'quantidade': grouped['transacoes'],
+            'valor_total': grouped['valor_final'],
+            'valor_medio': grouped['valor_final'] / grouped['valor_final_n'],
+        }, sort_by='quantidade')
+
+    payment = data.groupby('forma_pagamento', observed=True).agg({
+        'id_transacao': 'count',
+        'valor_final': ['sum', 'mean']
+    }).reset_index()
+
+    payment.columns = ['name', 'quantidade', 'valor_total', 'valor_medio']
+    payment = payment.sort_values('quantidade', ascending=False)
+    return payment.to_dict('records')
+
+
+def customers_by_age(data: pd.DataFrame, distinct: Optional["SketchQuery"] = None) -> List[Dict]:
+    """Clientes únicos por faixa etária (exato pelos códigos de cliente_id ou pelos sketches)"""
+    if data.empty or 'idade_cliente' not in data.columns or 'cliente_id' not in data.columns:
+        return []
+
+    if distinct is not None and distinct.labels:
+        return [{'name': label, 'value': value} for label, value in distinct.by_band()]
+
+    bands = age_bands(data['idade_cliente'])
+    counts = distinct_by_group(data['cliente_id'], bands, len(AGE_LABELS))
+    # Só as faixas com alguma venda, como no agrupamento com observed=True
+    observed = np.bincount(bands[bands >= 0], minlength=len(AGE_LABELS)) > 0
+    return [
+        {'name': label, 'value': int(count)}
+        for label, count, seen in zip(AGE_LABELS, counts, observed) if seen
+    ]
+
+
+def installments(data: pd.DataFrame, cube: Optional[CubeQuery] = None) -> List[Dict]:
+    """Distribuição por número de parcelas"""
+    if data.empty or 'parcelas' not in data.columns:
+        return []
+
+    if _use_cube(cube, 'parcelas'):
+        grouped = cube.group('parcelas')
+        return _cube_records(grouped, {
+            'quantidade': grouped['transacoes'],
+            'value': grouped['valor_final'],
+        }, sort_by='quantidade')
+
+    result = data.groupby('parcelas').agg({
+        'id_transacao': 'count',
+        'valor_final': 'sum'
+    }).reset_index()
+
+    result.columns = ['name', 'quantidade', 'value']
+    result = result.sort_values('quantidade', ascending=False)
+    return result.to_dict('records')
+
+
+def delivery_status(data: pd.DataFrame, cube: Optional[CubeQuery] = None) -> List[Dict]:
+    """Vendas por status de entrega"""
+    if data.empty or 'status_entrega' not in data.columns:
+        return []
+
+    if _use_cube(cube, 'status_entrega'):
+        grouped = cube.group('status_entrega')
+        return _cube_records(grouped, {'value': grouped['transacoes']}, sort_by='value')
+
+    status = data.groupby('status_entrega', observed=True).agg({
+        'id_transacao': 'count'
+    }).reset_index()
+
+    status.columns = ['name', 'value']
+    status = status.sort_values('value', ascending=False)
+    return status.to_dict('records')
+
+
+def product_ratings(data: pd.DataFrame, limit: int = 10, products: Optional[pd.DataFrame] = None, cube: Optional[CubeQuery] = None) -> List[Dict]:
+    """Produtos com menor avaliação média (mínimo de 2 vendas)"""
+    if data.empty or 'nome_produto' not in data.columns or 'avaliacao_produto' not in data.columns:
+        return []
+
+    if products is not None:
+        ratings = products[['name', 'avaliacao', 'transacoes']]
+    elif _use_cube(cube, 'nome_produto') and 'quantidade' in data.columns:
+        ratings = product_summary_from_cube(cube)[['name', 'avaliacao', 'transacoes']]
+    else:
+        # Sem agrupamento pronto: só média e contagem (lucro e somas do ranking não entram)
+        ratings = data.groupby('nome_produto', observed=True).agg(
+            avaliacao=('avaliacao_produto', 'mean'),
+            transacoes=('id_transacao', 'count'),
+        ).reset_index().rename(columns={'nome_produto': 'name'})
+
+    ratings = ratings[ratings['transacoes'] >= 2]  # Apenas produtos com 2+ avaliações
+    ratings = top_k(ratings, 'avaliacao', limit, ascending=True)
+    return ratings[['name', 'avaliacao']].to_dict('records')
+
+
+def average_delivery_time(data: pd.DataFrame, cube: Optional[CubeQuery] = None) -> Dict:
+    """Tempo médio de entrega em dias"""
+    if data.empty or 'tempo_entrega_dias' not in data.columns:
+        return {"tempo_medio": 0}
+
+    if cube is not None:
+        totals = cube.total()
+        return {"tempo_medio": round(float(totals['tempo_entrega'] / totals['tempo_entrega_n']), 1)}
+
+    tempo_medio = float(data['tempo_entrega_dias'].mean())
+    return {"tempo_medio": round(tempo_medio, 1)}
+
+# ============================================================================
+# DASHBOARD
+# ============================================================================
+
+def dashboard(data: pd.DataFrame, top_limit: int = 10, state_limit: int = 10, ratings_limit: int = 10,
+              cube: Optional[CubeQuery] = None) -> Dict:
+    """
+    Calcula todos os widgets do dashboard sobre a mesma fatia
+    - Com cubo: medidas aditivas vêm do cubo diário, só os distintos varrem a fatia
+    - Sem cubo: lucro por linha calculado uma vez (KPIs, meses e produtos)
+    - Um único agrupamento por produto (ranking e avaliações)
+    """
+    profit = compute_profit(data) if not data.empty and cube is None else None
+    products = None
+    if not data.empty and 'nome_produto' in data.columns:
+        if cube is None:
+            products = _safe("product_summary", lambda: product_summary(data, profit), None)
+        else:
+            products = _safe("product_summary", lambda: _products(data, cube), None)
+
+    return {
+        "kpis": _safe("kpis", lambda: kpis(data, profit, cube), dict(EMPTY_KPIS)),
+        "sales_by_month": _safe("sales_by_month", lambda: sales_by_month(data, profit, cube), []),
+        "sales_by_category": _safe("sales_by_category", lambda: sales_by_category(data, cube), []),
+        "top_products": _safe("top_products", lambda: top_products(data, top_limit, products), []),
+        "customers_by_gender": _safe("customers_by_gender", lambda: customers_by_gender(data, cube), []),
+        "sales_by_state": _safe("sales_by_state", lambda: sales_by_state(data, state_limit, cube), []),
+        "payment_methods": _safe("payment_methods", lambda: payment_methods(data, cube), []),
+        "customers_by_age": _safe("customers_by_age", lambda: customers_by_age(data), []),
+        "installments": _safe("installments", lambda: installments(data, cube), []),
+        "delivery_status": _safe("delivery_status", lambda: delivery_status(data, cube), []),
+        "product_ratings": _safe("product_ratings", lambda: product_ratings(data, ratings_limit, products), []),
+        "average_delivery_time": _safe("average_delivery_time", lambda: average_delivery_time(data, cube), {"tempo_medio": 0}),
+    }
+
+
+def _safe(name: str, fn: Callable, default):
+    """Executa um widget sem derrubar o dashboard inteiro em caso de erro"""
+    try:
+        return fn()
+    except Exception as e:
+        logger.error(f"❌ Erro ao calcular widget '{name}': {e}", exc_info=True)
+        return default
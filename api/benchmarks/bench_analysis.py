@@ -0,0 +1,103 @@
+"""
+Benchmark: /analysis com estatísticas recalculadas a cada chamada (antigo) versus pré-calculadas
+- antigo: describe_data (mean/median/min/max/std/sum por coluna, um método do pandas por vez)
+- atual sem datas: ColumnStats.summary pronto no dataset (custo de construção mostrado à parte)
+- atual com datas: describe_range (momentos dos parciais diários, quantis sobre a fatia) versus
+  o mesmo conjunto de estatísticas calculado inteiro sobre a fatia
+
+Uso (a partir de api/):
+    python benchmarks/bench_analysis.py [--sizes 100000 1000000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dataset import parse_date_range  # noqa: E402
+from stats import ColumnStats  # noqa: E402
+from synthetic import generate_dataset  # noqa: E402
+
+SELECTIVITIES = [0.01, 0.1, 0.5]
+
+
+def legacy_describe_data(data: pd.DataFrame) -> Dict:
+    """Cópia fiel do describe_data anterior"""
+    numeric_cols = data.select_dtypes(include=['number']).columns
+    analysis = {
+        "shape": {"rows": len(data), "columns": len(data.columns)},
+        "columns": list(data.columns),
+        "statistics": {}
+    }
+    for col in numeric_cols:
+        analysis["statistics"][col] = {
+            "mean": float(data[col].mean()),
+            "median": float(data[col].median()),
+            "min": float(data[col].min()),
+            "max": float(data[col].max()),
+            "std": float(data[col].std()),
+            "sum": float(data[col].sum())
+        }
+    return analysis
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def check(expected: Dict, actual: Dict) -> None:
+    """Mesmos valores das chaves antigas (tolerância de ponto flutuante)"""
+    for col, values in expected["statistics"].items():
+        for key, value in values.items():
+            assert np.isclose(value, actual["statistics"][col][key], rtol=1e-9, equal_nan=True), (col, key)
+
+
+def run(sizes, repeat: int) -> None:
+    print(f"{'linhas':>10} {'etapa':<24} {'fatia':>9} {'antigo (ms)':>12} {'fatia inteira (ms)':>19} {'atual (ms)':>11} {'speedup':>8}")
+    for size in sizes:
+        dataset = generate_dataset(size)
+        frame = dataset.frame
+
+        build = best_of(lambda: ColumnStats.build(frame), repeat)
+        stats = ColumnStats.build(frame)
+        check(legacy_describe_data(frame), stats.summary)
+
+        legacy = best_of(lambda: legacy_describe_data(frame), repeat)
+        served = best_of(lambda: stats.summary, repeat)
+        print(f"{size:>10} {'sem datas':<24} {size:>9} {legacy * 1000:>12.2f} {'-':>19} "
+              f"{served * 1000:>11.4f} {legacy / max(served, 1e-9):>7.0f}x")
+        print(f"{size:>10} {'construção (1x/dataset)':<24} {size:>9} {'-':>12} {'-':>19} {build * 1000:>11.2f} {'-':>8}")
+
+        first = frame['data_venda'].iloc[0].normalize()
+        span = (frame['data_venda'].max().normalize() - first).days + 1
+        for selectivity in SELECTIVITIES:
+            days = max(1, int(span * selectivity))
+            start, end = parse_date_range(first.strftime('%Y-%m-%d'), (first + pd.Timedelta(days=days - 1)).strftime('%Y-%m-%d'))
+            lo, hi = dataset.date_index.row_range(start, end)
+            part = frame.iloc[lo:hi]
+            check(legacy_describe_data(part), stats.describe_range(frame, lo, hi, start, end))
+
+            legacy = best_of(lambda: legacy_describe_data(part), repeat)
+            whole = best_of(lambda: ColumnStats.build(part, daily=False), repeat)
+            ranged = best_of(lambda: stats.describe_range(frame, lo, hi, start, end), repeat)
+            print(f"{size:>10} {f'datas ({selectivity:.0%} dos dias)':<24} {hi - lo:>9} {legacy * 1000:>12.2f} "
+                  f"{whole * 1000:>19.2f} {ranged * 1000:>11.2f} {legacy / max(ranged, 1e-9):>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,155 @@
+"""
+Benchmark: middleware CORS antigo (BaseHTTPMiddleware) versus ASGI puro (cors.py)
+- req/s de /kpis já em cache (o custo medido é basicamente o da pilha de middlewares)
+- tempo até o primeiro byte e total de /export/csv em streaming
+
+Troca o middleware de main.app entre os cenários e roda em processo (httpx + ASGITransport).
+
+Uso (a partir de api/):
+    python benchmarks/bench_cors.py [--rows 100000] [--duration 5] [--clients 8]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+from fastapi.responses import JSONResponse
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ["SNAPSHOT_DIR"] = ""
+
+import main  # noqa: E402
+from cors import CustomCORSMiddleware  # noqa: E402
+from synthetic import generate_dataset  # noqa: E402
+
+ORIGIN = "https://preview-123.hanami-analytics.vercel.app"
+
+
+class LegacyCORSMiddleware(BaseHTTPMiddleware):
+    """Cópia fiel do CustomCORSMiddleware anterior"""
+
+    async def dispatch(self, request, call_next):
+        origin = request.headers.get("origin")
+        is_vercel = origin and ".vercel.app" in origin
+        is_allowed = origin in main.allowed_origins or is_vercel
+        allowed_origin = origin if is_allowed else "https://hanami-analytics.vercel.app"
+        main.logger.debug(f"🌐 CORS Request - Origin: {origin}, Allowed: {is_allowed}")
+        if request.method == "OPTIONS":
+            return JSONResponse(
+                {"status": "ok"},
+                headers={
+                    "Access-Control-Allow-Origin": allowed_origin,
+                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
+                    "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With, Accept, X-Profile",
+                    "Access-Control-Allow-Credentials": "true",
+                    "Access-Control-Max-Age": "86400",
+                }
+            )
+        response = await call_next(request)
+        response.headers["Access-Control-Allow-Origin"] = allowed_origin
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With, Accept, X-Profile"
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Vary"] = "Origin"
+        return response
+
+
+MIDDLEWARES = {
+    "legacy": Middleware(LegacyCORSMiddleware),
+    "asgi": Middleware(CustomCORSMiddleware, allowed_origins=main.allowed_origins, fallback_origin=main.CORS_FALLBACK_ORIGIN),
+}
+
+
+def use_middleware(name: str) -> None:
+    """Substitui o CORS da pilha de middlewares e força a reconstrução"""
+    main.app.user_middleware = [
+        MIDDLEWARES[name] if middleware.cls in (CustomCORSMiddleware, LegacyCORSMiddleware) else middleware
+        for middleware in main.app.user_middleware
+    ]
+    main.app.middleware_stack = None
+
+
+async def kpis_client(client: httpx.AsyncClient, deadline: float, latencies: List[float]) -> None:
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        response = await client.get("/kpis", headers={"Origin": ORIGIN})
+        latencies.append(time.perf_counter() - t0)
+        assert response.headers["access-control-allow-origin"] == ORIGIN
+
+
+async def csv_export() -> Dict:
+    """
+    Chamada ASGI direta a /export/csv: o ASGITransport do httpx junta o corpo inteiro antes
+    de devolver a resposta, então o primeiro bloco é medido na mensagem enviada pela pilha
+    """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/export/csv", "raw_path": b"/export/csv", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench"), (b"origin", ORIGIN.encode()), (b"accept-encoding", b"identity")],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Cliente nunca desconecta: a espera é cancelada quando a resposta termina
+        await asyncio.Event().wait()
+
+    first = None
+
+    async def send(message):
+        nonlocal first
+        if message["type"] == "http.response.body" and message.get("body") and first is None:
+            first = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    await main.app(scope, receive, send)
+    return {"ttfb": first * 1000, "total": (time.perf_counter() - t0) * 1000}
+
+
+async def scenario(duration: float, clients: int) -> Dict:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.get("/kpis", headers={"Origin": ORIGIN})
+        latencies: List[float] = []
+        started = time.perf_counter()
+        await asyncio.gather(*[kpis_client(client, started + duration, latencies) for _ in range(clients)])
+        elapsed = time.perf_counter() - started
+    export = await csv_export()
+    values = np.array(latencies) * 1000
+    return {"rps": len(values) / elapsed, "p50": float(np.percentile(values, 50)), "p99": float(np.percentile(values, 99)), **export}
+
+
+def run(rows: int, duration: float, clients: int) -> None:
+    logging.getLogger("analytics_api").setLevel(logging.ERROR)
+    main.uploaded_data['current'] = generate_dataset(rows)
+    print(f"Dataset: {rows} linhas | {clients} clientes em /kpis (cache) | {duration:.0f}s por middleware")
+    print(f"{'cors':>7} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'csv 1º byte (ms)':>17} {'csv total (ms)':>15}")
+    results = {}
+    for name in MIDDLEWARES:
+        use_middleware(name)
+        result = results[name] = asyncio.run(scenario(duration, clients))
+        print(f"{name:>7} {result['rps']:>9.1f} {result['p50']:>9.2f} {result['p99']:>9.2f} "
+              f"{result['ttfb']:>17.1f} {result['total']:>15.1f}")
+    print(f"speedup req/s: {results['asgi']['rps'] / results['legacy']['rps']:.2f}x")
+    use_middleware("asgi")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+    run(args.rows, args.duration, args.clients)
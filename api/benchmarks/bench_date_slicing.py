@@ -0,0 +1,72 @@
+"""
+Benchmark: filtro por data com máscaras booleanas sobre cópia (implementação antiga)
+versus fatia por busca binária no índice de datas (Dataset.slice_dates)
+
+Cada medição inclui uma soma de valor_final sobre o resultado, para que o custo
+proporcional ao tamanho da fatia apareça na comparação.
+
+Uso (a partir de api/):
+    python benchmarks/bench_date_slicing.py [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dataset import build_dataset, parse_date_range  # noqa: E402
+from synthetic import generate_sales  # noqa: E402
+
+SELECTIVITIES = [0.001, 0.01, 0.1, 0.5, 1.0]
+
+
+def legacy_filter(data: pd.DataFrame, start_date: str, end_date: str) -> pd.DataFrame:
+    """Cópia fiel do filter_data_by_date anterior"""
+    df = data.copy()
+    df['data_venda'] = pd.to_datetime(df['data_venda'])
+    df = df[df['data_venda'] >= pd.to_datetime(start_date)]
+    df = df[df['data_venda'] < pd.to_datetime(end_date) + pd.Timedelta(days=1)]
+    return df
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def run(sizes, repeat: int):
+    print(f"{'linhas':>10} {'seletividade':>12} {'resultado':>10} {'antigo (ms)':>12} {'índice (ms)':>12} {'speedup':>9}")
+    for size in sizes:
+        raw = generate_sales(size)
+        dataset = build_dataset(raw)
+        first = dataset.frame['data_venda'].iloc[0]
+        span = (dataset.frame['data_venda'].iloc[-1] - first).days + 1
+
+        for selectivity in SELECTIVITIES:
+            days = max(1, int(span * selectivity))
+            start_date = first.strftime('%Y-%m-%d')
+            end_date = (first + pd.Timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+            legacy = best_of(lambda: legacy_filter(raw, start_date, end_date)['valor_final'].sum(), repeat)
+            start, end = parse_date_range(start_date, end_date)
+            indexed = best_of(lambda: dataset.slice_dates(start, end)['valor_final'].sum(), repeat * 10)
+            rows = len(dataset.slice_dates(start, end))
+
+            print(f"{size:>10} {selectivity:>12.1%} {rows:>10} {legacy * 1000:>12.2f} "
+                  f"{indexed * 1000:>12.4f} {legacy / max(indexed, 1e-9):>8.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,90 @@
+"""
+Benchmark: clientes distintos de /kpis e /customers-by-age sobre o histórico inteiro
+- antigo: cliente_id como texto + nunique (hash de cada linha a cada requisição)
+- exato: códigos inteiros do cliente_id category (bitmap, analytics.distinct_count)
+- aproximado: sketches HyperLogLog diários combinados (CustomerSketch.query)
+
+Também mostra o erro relativo da estimativa frente ao valor exato e o custo de
+construção dos sketches (uma vez por dataset).
+
+Uso (a partir de api/):
+    python benchmarks/bench_distinct.py [--sizes 100000 1000000] [--customers 200000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import analytics  # noqa: E402
+from dataset import build_dataset  # noqa: E402
+from sketch import RELATIVE_ERROR, CustomerSketch  # noqa: E402
+from synthetic import generate_sales  # noqa: E402
+
+
+def legacy_customers_by_age(data: pd.DataFrame) -> list:
+    """Cópia fiel do customers_by_age anterior"""
+    faixa_etaria = pd.cut(data['idade_cliente'], bins=analytics.AGE_BINS, labels=analytics.AGE_LABELS, right=False).rename('faixa_etaria')
+    age_dist = data.groupby(faixa_etaria, observed=True).agg({'cliente_id': 'nunique'}).reset_index()
+    age_dist.columns = ['name', 'value']
+    return age_dist.to_dict('records')
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def run(sizes, customers: int, repeat: int) -> None:
+    print(f"erro padrão relativo documentado: {RELATIVE_ERROR:.2%}")
+    print(f"{'linhas':>10} {'etapa':<22} {'antigo (ms)':>12} {'exato (ms)':>11} {'aprox (ms)':>11} {'erro aprox':>11}")
+    for size in sizes:
+        dataset = build_dataset(generate_sales(size, customers=customers))
+        data = dataset.frame
+        as_text = data.assign(cliente_id=data['cliente_id'].astype(str))
+
+        t0 = time.perf_counter()
+        sketch = CustomerSketch.build(data)
+        build_time = time.perf_counter() - t0
+        query = sketch.query()
+
+        exact = analytics.distinct_count(data['cliente_id'])
+        assert exact == as_text['cliente_id'].nunique()
+        legacy_age = legacy_customers_by_age(as_text)
+        assert legacy_age == analytics.customers_by_age(data)
+
+        cases = [
+            ("clientes_unicos",
+             lambda: as_text['cliente_id'].nunique(),
+             lambda: analytics.distinct_count(data['cliente_id']),
+             lambda: sketch.query().total(),
+             abs(query.total() - exact) / exact),
+            ("customers_by_age",
+             lambda: legacy_customers_by_age(as_text),
+             lambda: analytics.customers_by_age(data),
+             lambda: analytics.customers_by_age(data, distinct=sketch.query()),
+             max(abs(estimate - row['value']) / row['value']
+                 for (_, estimate), row in zip(query.by_band(), legacy_age))),
+        ]
+        for name, legacy, exact_fn, approx_fn, error in cases:
+            print(f"{size:>10} {name:<22} {best_of(legacy, repeat) * 1000:>12.2f} "
+                  f"{best_of(exact_fn, repeat) * 1000:>11.2f} {best_of(approx_fn, repeat) * 1000:>11.2f} {error:>10.2%}")
+        print(f"{size:>10} {'construção dos sketches':<22} {'-':>12} {'-':>11} {build_time * 1000:>11.2f} "
+              f"({sketch.memory_usage() / (1024 * 1024):.1f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.customers, args.repeat)
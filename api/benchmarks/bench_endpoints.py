@@ -0,0 +1,356 @@
+"""
+Suíte de benchmark de todos os endpoints da API
+- Dados sintéticos (synthetic.generate_dataset) nos tamanhos pedidos: 10k/100k/1M, e 10M com --sizes
+- Cada endpoint de main.app é chamado em processo (httpx + ASGITransport), sem servidor
+- Por caso: latência sem cache (p50/p95/p99/média/máx), primeira chamada (índices lazy),
+  vazão com --concurrency clientes, latência com o cache de resultados, tamanho da resposta
+  e pico de memória alocada (tracemalloc, numa chamada separada para não distorcer as latências)
+- Rotas GET sem caso explícito entram com os parâmetros padrão: nenhuma fica de fora
+- Relatório JSON (--output) com commit, versões e máquina, para comparar entre commits;
+  --compare <relatório anterior> aponta regressões acima de --threshold e sai com código 1
+
+Uso (a partir de api/):
+    python benchmarks/bench_endpoints.py [--sizes 10000 100000 1000000] [--iterations 20]
+                                         [--output bench-report.json] [--compare anterior.json]
+                                         [--only kpis sales] [--threshold 0.2]
+
+10M linhas (--sizes 10000000) pedem ~6 GB de RAM; a exportação Excel usa um intervalo de 30 dias.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Datasets sintéticos só em memória (o registro usa um diretório temporário)
+os.environ["SNAPSHOT_DIR"] = ""
+
+import main  # noqa: E402
+from data_validator import EXPECTED_SCHEMA, validate_data  # noqa: E402
+from synthetic import generate_dataset, generate_sales  # noqa: E402
+
+REPORT_VERSION = 1
+
+MONTH = {"start_date": "2023-06-01", "end_date": "2023-06-30"}
+QUARTER = {"start_date": "2023-04-01", "end_date": "2023-06-30"}
+FILTERS = {"regiao": "Sul,Sudeste", "canal_venda": "Online"}
+
+# Métricas comparadas pelo --compare (maior = pior)
+COMPARED_METRICS = ("p50_ms", "p95_ms", "p99_ms", "peak_alloc_mb")
+
+
+class Case:
+    """Uma requisição medida: método, rota, parâmetros e se é pesada (menos iterações)"""
+
+    def __init__(self, name: str, path: str, params: Optional[Dict] = None, method: str = "GET",
+                 heavy: bool = False, prepare=None, mutates: bool = False):
+        self.name = name
+        self.path = path
+        self.params = params or {}
+        self.method = method
+        self.heavy = heavy
+        # prepare(ctx) -> kwargs extras da requisição (ex: arquivo do upload, dataset_id novo)
+        self.prepare = prepare
+        self.mutates = mutates
+
+
+def read_cases(ctx: Dict) -> List[Case]:
+    """Casos de leitura (não alteram o dataset atual)"""
+    rows = ctx["rows"]
+    return [
+        Case("root", "/"),
+        Case("sales", "/sales"),
+        Case("sales_page_10k", "/sales", {"limit": 10_000}),
+        Case("sales_page_10k_columns", "/sales", {"limit": 10_000, "format": "columns"}),
+        Case("sales_deep_offset", "/sales", {"offset": max(rows // 2, 0)}),
+        Case("sales_filtered_sorted", "/sales", {"sort_by": "valor_final", "sort_order": "desc", **FILTERS}),
+        Case("analysis", "/analysis"),
+        Case("kpis", "/kpis"),
+        Case("kpis_month", "/kpis", MONTH),
+        Case("kpis_filtered", "/kpis", {**QUARTER, **FILTERS}),
+        Case("kpis_approx", "/kpis", {"distinct": "approx"}),
+        Case("kpis_dataset_id", "/kpis", {"dataset_id": ctx["dataset_id"]}),
+        Case("sales_by_month", "/sales-by-month"),
+        Case("sales_by_category", "/sales-by-category"),
+        Case("top_products", "/top-products"),
+        Case("top_products_lucro", "/top-products", {"order_by": "lucro", "limit": 50}),
+        Case("customers_by_gender", "/customers-by-gender"),
+        Case("sales_by_state", "/sales-by-state"),
+        Case("payment_methods", "/payment-methods"),
+        Case("customers_by_age", "/customers-by-age"),
+        Case("customers_by_age_approx", "/customers-by-age", {"distinct": "approx"}),
+        Case("installments", "/installments"),
+        Case("delivery_status", "/delivery-status"),
+        Case("product_ratings", "/product-ratings"),
+        Case("average_delivery_time", "/average-delivery-time"),
+        Case("dashboard", "/dashboard"),
+        Case("dashboard_filtered", "/dashboard", {**QUARTER, "region": "sudeste"}),
+        Case("reports_summary", "/reports/summary"),
+        Case("reports_detailed", "/reports/detailed"),
+        Case("datasets", "/datasets"),
+        Case("cache_stats", "/cache/stats"),
+        Case("workers_stats", "/workers/stats"),
+        # httpx envia Accept-Encoding: gzip por padrão: o caso sem compressão pede identity
+        Case("export_csv", "/export/csv", heavy=True, prepare=lambda ctx: {"headers": {"Accept-Encoding": "identity"}}),
+        Case("export_csv_gzip", "/export/csv", heavy=True, prepare=lambda ctx: {"headers": {"Accept-Encoding": "gzip"}}),
+        Case("export_excel_month", "/export/excel", MONTH, heavy=True),
+    ]
+
+
+def write_cases(ctx: Dict) -> List[Case]:
+    """Casos que alteram o estado (rodam por último; o dataset atual é restaurado depois)"""
+    return [
+        Case("upload_csv", "/upload", method="POST", heavy=True, mutates=True,
+             prepare=lambda ctx: {"files": {"file": ("bench.csv", ctx["upload_csv"], "text/csv")}}),
+        Case("upload_append", "/upload", {"mode": "append"}, method="POST", heavy=True, mutates=True,
+             prepare=lambda ctx: {"files": {"file": ("delta.csv", next_delta(ctx), "text/csv")}}),
+        Case("delete_dataset", "/datasets/{dataset_id}", method="DELETE", mutates=True,
+             prepare=lambda ctx: {"path": {"dataset_id": main.dataset_registry.add(ctx["small_dataset"])[0]}}),
+        Case("reset", "/reset", method="DELETE", mutates=True),
+    ]
+
+
+def next_delta(ctx: Dict) -> bytes:
+    """Lote novo a cada chamada (ids inéditos), para o append não virar só duplicatas"""
+    ctx["delta_seed"] += 1
+    first_id = 100_000_000 + ctx["delta_seed"] * ctx["delta_rows"]
+    return generate_sales(ctx["delta_rows"], seed=ctx["delta_seed"], first_id=first_id).to_csv(index=False).encode("utf-8")
+
+
+def uncovered_routes(cases: List[Case]) -> List[Case]:
+    """Rotas GET de main.app sem caso explícito, chamadas com os parâmetros padrão"""
+    covered = {(case.method, case.path) for case in cases}
+    extra = []
+    for route in main.app.routes:
+        methods = getattr(route, "methods", None) or set()
+        path = getattr(route, "path", "")
+        if "GET" not in methods or "{" in path or path.startswith(("/docs", "/redoc", "/openapi")):
+            continue
+        if ("GET", path) not in covered:
+            extra.append(Case(f"auto{path.replace('/', '_').replace('-', '_')}", path))
+    return extra
+
+
+async def request(client: httpx.AsyncClient, case: Case, ctx: Dict) -> httpx.Response:
+    extra = case.prepare(ctx) if case.prepare else {}
+    path = case.path.format(**extra.pop("path", {}))
+    response = await client.request(case.method, path, params=case.params, **extra)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{case.name}: {case.method} {path} -> {response.status_code} {response.text[:200]}")
+    return response
+
+
+async def timed(client: httpx.AsyncClient, case: Case, ctx: Dict) -> float:
+    t0 = time.perf_counter()
+    await request(client, case, ctx)
+    return time.perf_counter() - t0
+
+
+async def measure(client: httpx.AsyncClient, case: Case, ctx: Dict, iterations: int, concurrency: int) -> Dict:
+    """Latências sem cache, vazão concorrente, latência com cache e pico de memória de um caso"""
+    cache_limit = main.result_cache.max_bytes
+    main.result_cache.max_bytes = 0
+    try:
+        t0 = time.perf_counter()
+        response = await request(client, case, ctx)
+        first = time.perf_counter() - t0
+
+        latencies = [await timed(client, case, ctx) for _ in range(iterations)]
+
+        throughput = None
+        if not case.mutates:
+            per_client = max(1, iterations // concurrency)
+
+            async def sequential():
+                # Cada cliente espera a resposta antes da próxima requisição
+                for _ in range(per_client):
+                    await timed(client, case, ctx)
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*[sequential() for _ in range(concurrency)])
+            throughput = per_client * concurrency / (time.perf_counter() - t0)
+
+        tracemalloc.start()
+        await request(client, case, ctx)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        main.result_cache.max_bytes = cache_limit
+
+    cached = None
+    if not case.mutates:
+        main.result_cache.invalidate()
+        await request(client, case, ctx)
+        cached = float(np.median([await timed(client, case, ctx) for _ in range(iterations)]) * 1000)
+
+    values = np.array(latencies) * 1000
+    return {
+        "method": case.method,
+        "path": case.path,
+        "params": case.params,
+        "status": response.status_code,
+        "response_bytes": int(response.headers.get("content-length") or len(response.content)),
+        "first_ms": round(first * 1000, 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "max_ms": round(float(values.max()), 3),
+        "iterations": len(values),
+        "throughput_rps": round(throughput, 2) if throughput is not None else None,
+        "cached_p50_ms": round(cached, 3) if cached is not None else None,
+        "peak_alloc_mb": round(peak / (1024 * 1024), 3),
+    }
+
+
+async def run_size(rows: int, args) -> Dict:
+    t0 = time.perf_counter()
+    dataset = generate_dataset(rows, seed=args.seed)
+    generation = time.perf_counter() - t0
+
+    upload_rows = min(rows, args.upload_rows)
+    ctx = {
+        "rows": rows,
+        "dataset_id": main.dataset_registry.add(dataset)[0],
+        "upload_csv": generate_sales(upload_rows, seed=args.seed).to_csv(index=False).encode("utf-8"),
+        "small_dataset": generate_dataset(1_000, seed=args.seed),
+        "delta_rows": 1_000,
+        "delta_seed": args.seed,
+    }
+    main.uploaded_data["current"] = dataset
+    main.result_cache.invalidate()
+
+    cases = read_cases(ctx)
+    cases += uncovered_routes(cases) + write_cases(ctx)
+    if args.only:
+        cases = [case for case in cases if any(name in case.name for name in args.only)]
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for case in cases:
+            iterations = args.heavy_iterations if case.heavy else args.iterations
+            results[case.name] = await measure(client, case, ctx, iterations, args.concurrency)
+            result = results[case.name]
+            print(f"{rows:>10} {case.name:<28} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                  f"{result['throughput_rps'] or 0:>9.1f} {result['cached_p50_ms'] or 0:>9.2f} {result['peak_alloc_mb']:>9.1f} "
+                  f"{result['response_bytes']:>11}")
+            if case.mutates:
+                # Upload/reset trocam o dataset atual: os próximos casos voltam a usar o sintético
+                main.uploaded_data["current"] = dataset
+                main.result_cache.invalidate()
+
+    return {
+        "generation_s": round(generation, 3),
+        "dataset_mb": round(dataset.memory_usage() / (1024 * 1024), 3),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "cases": results,
+    }
+
+
+def schema_check(seed: int) -> Dict:
+    """Amostra do gerador passa pela mesma validação do upload (EXPECTED_SCHEMA / VALID_RANGES)"""
+    _, report = validate_data(generate_sales(10_000, seed=seed))
+    sample = generate_sales(10, seed=seed)
+    return {
+        "quality_score": round(report.get_quality_score(), 2),
+        "missing_expected_columns": sorted(set(EXPECTED_SCHEMA) - set(sample.columns)),
+    }
+
+
+def metadata(args) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "report_version": REPORT_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "worker_pool_size": main.WORKER_POOL_SIZE,
+        "sizes": args.sizes,
+        "iterations": args.iterations,
+        "heavy_iterations": args.heavy_iterations,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "schema": schema_check(args.seed),
+    }
+
+
+def compare(previous: Dict, current: Dict, threshold: float) -> List[str]:
+    """Casos cujas métricas pioraram mais que threshold (fração) em relação ao relatório anterior"""
+    regressions = []
+    for size, result in current["results"].items():
+        before = previous.get("results", {}).get(size, {}).get("cases", {})
+        for name, metrics in result["cases"].items():
+            old = before.get(name)
+            if old is None:
+                continue
+            for metric in COMPARED_METRICS:
+                if not old.get(metric) or metrics.get(metric) is None:
+                    continue
+                change = metrics[metric] / old[metric] - 1
+                if change > threshold:
+                    regressions.append(f"{size:>10} {name:<28} {metric:<14} {old[metric]:>10.2f} -> {metrics[metric]:>10.2f} (+{change:.0%})")
+    return regressions
+
+
+def main_cli(args) -> int:
+    logging.getLogger("analytics_api").setLevel(logging.ERROR)
+    report = {"metadata": metadata(args), "results": {}}
+    schema = report["metadata"]["schema"]
+    print(f"Gerador: qualidade {schema['quality_score']}% | colunas do EXPECTED_SCHEMA ausentes: {schema['missing_expected_columns']}")
+    print(f"{'linhas':>10} {'caso':<28} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'req/s':>9} {'cache ms':>9} {'pico MB':>9} {'bytes':>11}")
+
+    for rows in args.sizes:
+        report["results"][str(rows)] = asyncio.run(run_size(rows, args))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, sort_keys=True)
+    print(f"Relatório gravado em {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        regressions = compare(previous, report, args.threshold)
+        print(f"Comparação com {args.compare} (commit {previous.get('metadata', {}).get('commit')}): "
+              f"{len(regressions)} regressões acima de {args.threshold:.0%}")
+        for line in regressions:
+            print(line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--heavy-iterations", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--upload-rows", type=int, default=100_000, help="Linhas do CSV enviado nos casos de upload")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="+", help="Só os casos cujo nome contém algum destes trechos")
+    parser.add_argument("--output", default=f"bench-report-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    parser.add_argument("--compare", help="Relatório anterior para detectar regressões")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Piora relativa tolerada no --compare (0.2 = 20%%)")
+    sys.exit(main_cli(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""
+Benchmark: exportação CSV montada inteira em BytesIO (implementação antiga) versus
+CSV gerado em blocos (export.csv_chunks), com e sem gzip
+
+Métricas: tempo até o primeiro byte (TTFB), tempo total e pico de RSS acima do
+RSS antes da exportação. Cada variante roda em um subprocesso próprio, para que
+a memória de uma não contamine a medição da outra.
+
+Uso (a partir de api/):
+    python benchmarks/bench_export_csv.py [--sizes 100000 1000000] [--chunk-rows 10000] [--gzip-level 1]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import export  # noqa: E402
+from dataset import build_dataset  # noqa: E402
+from synthetic import generate_sales  # noqa: E402
+
+VARIANTS = ["bytesio", "stream", "stream+gzip"]
+
+
+class RssSampler(threading.Thread):
+    """Amostra o RSS do processo (Linux, /proc/self/statm) e guarda o máximo"""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def rss() -> int:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, self.rss())
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return max(self.peak, self.rss())
+
+
+def legacy_chunks(data):
+    """Cópia fiel da exportação anterior: todo o CSV em BytesIO, enviado depois"""
+    output = BytesIO()
+    data.to_csv(output, index=False, encoding='utf-8-sig')
+    output.seek(0)
+    yield from output
+
+
+def child(size: int, variant: str, chunk_rows: int, gzip_level: int) -> None:
+    data = build_dataset(generate_sales(size)).frame
+
+    if variant == "bytesio":
+        chunks = legacy_chunks(data)
+    else:
+        chunks = export.csv_chunks(data, chunk_rows)
+        if variant == "stream+gzip":
+            chunks = export.gzip_chunks(chunks, gzip_level)
+
+    baseline = RssSampler.rss()
+    sampler = RssSampler()
+    sampler.start()
+    t0 = time.perf_counter()
+    ttfb = None
+    sent = 0
+    for chunk in chunks:
+        if ttfb is None:
+            ttfb = time.perf_counter() - t0
+        sent += len(chunk)
+    total = time.perf_counter() - t0
+    peak = sampler.stop()
+
+    print(json.dumps({"ttfb": ttfb, "total": total, "bytes": sent, "rss_mb": (peak - baseline) / (1024 * 1024)}))
+
+
+def run(sizes, chunk_rows: int, gzip_level: int) -> None:
+    print(f"{'linhas':>10} {'variante':>12} {'TTFB (ms)':>10} {'total (s)':>10} {'MB enviados':>12} {'pico RSS (MB)':>14}")
+    for size in sizes:
+        for variant in VARIANTS:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", variant, "--sizes", str(size), "--chunk-rows", str(chunk_rows),
+                 "--gzip-level", str(gzip_level)],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(output)
+            print(f"{size:>10} {variant:>12} {result['ttfb'] * 1000:>10.1f} {result['total']:>10.2f} "
+                  f"{result['bytes'] / (1024 * 1024):>12.1f} {result['rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--chunk-rows", type=int, default=10_000)
+    parser.add_argument("--gzip-level", type=int, default=1)
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.sizes[0], args.child, args.chunk_rows, args.gzip_level)
+    else:
+        run(args.sizes, args.chunk_rows, args.gzip_level)
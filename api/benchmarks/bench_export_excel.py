@@ -0,0 +1,99 @@
+"""
+Benchmark: exportação Excel com pd.ExcelWriter/openpyxl em modo normal (implementação
+antiga) versus openpyxl em modo write-only (export.write_excel)
+
+Métricas: linhas por segundo e pico de RSS acima do RSS antes da exportação, cada
+variante em um subprocesso próprio.
+
+Uso (a partir de api/):
+    python benchmarks/bench_export_excel.py [--sizes 10000 100000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import analytics  # noqa: E402
+import export  # noqa: E402
+from bench_export_csv import RssSampler  # noqa: E402
+from dataset import build_dataset  # noqa: E402
+from synthetic import generate_sales  # noqa: E402
+
+VARIANTS = ["legacy", "write-only"]
+
+FILTERS = [('Data Inicial', 'Não aplicado'), ('Data Final', 'Não aplicado'), ('Região', 'Todas as regiões')]
+
+
+def legacy_excel(data: pd.DataFrame) -> BytesIO:
+    """Cópia fiel da exportação anterior (modo normal, Resumo somando o frame)"""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        data.to_excel(writer, sheet_name='Dados de Vendas', index=False)
+        summary_data = {
+            'Métrica': ['Total de Vendas', 'Faturamento Total', 'Lucro Total', 'Ticket Médio', 'Clientes Únicos'],
+            'Valor': [
+                len(data),
+                f"R$ {data['valor_final'].sum():,.2f}",
+                f"R$ {data['lucro'].sum():,.2f}" if 'lucro' in data.columns else 'N/A',
+                f"R$ {data['valor_final'].mean():,.2f}",
+                data['id_cliente'].nunique() if 'id_cliente' in data.columns else 'N/A'
+            ]
+        }
+        pd.DataFrame(summary_data).to_excel(writer, sheet_name='Resumo', index=False)
+        pd.DataFrame(FILTERS, columns=['Filtro', 'Valor']).to_excel(writer, sheet_name='Informações', index=False)
+    output.seek(0)
+    return output
+
+
+def child(size: int, variant: str, spool_rows: int) -> None:
+    dataset = build_dataset(generate_sales(size))
+    data = dataset.frame
+    # Na API os KPIs vêm do cache de /kpis; aqui são calculados antes da medição
+    summary = export.summary_rows(analytics.kpis(data, cube=dataset.cube.query()))
+
+    baseline = RssSampler.rss()
+    sampler = RssSampler()
+    sampler.start()
+    t0 = time.perf_counter()
+    if variant == "legacy":
+        size_bytes = len(legacy_excel(data).getvalue())
+    else:
+        content = export.write_excel(data, summary, FILTERS, spool_rows)
+        size_bytes = sum(len(chunk) for chunk in export.file_chunks(content))
+    elapsed = time.perf_counter() - t0
+    peak = sampler.stop()
+
+    print(json.dumps({"seconds": elapsed, "bytes": size_bytes, "rss_mb": (peak - baseline) / (1024 * 1024)}))
+
+
+def run(sizes, spool_rows: int) -> None:
+    print(f"{'linhas':>10} {'variante':>12} {'tempo (s)':>10} {'linhas/s':>10} {'MB':>8} {'pico RSS (MB)':>14}")
+    for size in sizes:
+        for variant in VARIANTS:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", variant, "--sizes", str(size), "--spool-rows", str(spool_rows)],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(output)
+            print(f"{size:>10} {variant:>12} {result['seconds']:>10.2f} {size / result['seconds']:>10.0f} "
+                  f"{result['bytes'] / (1024 * 1024):>8.1f} {result['rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--spool-rows", type=int, default=50_000)
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.sizes[0], args.child, args.spool_rows)
+    else:
+        run(args.sizes, args.spool_rows)
@@ -0,0 +1,127 @@
+"""
+Benchmark: vazão das requisições com logging desligado, síncrono (antigo) e assíncrono
+- off: logger desligado (referência)
+- sync: RotatingFileHandler (DEBUG) + console (INFO) presos ao logger, como antes: cada
+  requisição escreve no arquivo dentro do event loop
+- async: pipeline de log_pipeline (fila + thread de escrita, amostragem de DEBUG e limite por nível)
+
+Clientes concorrentes em processo (httpx + ASGITransport) chamando /kpis com intervalos
+aleatórios (sem depender do cache) e /sales. O arquivo de log vai para um diretório
+temporário e o console para /dev/null, para medir formatação e escrita sem o terminal.
+
+Uso (a partir de api/):
+    python benchmarks/bench_logging.py [--rows 100000] [--duration 5] [--clients 8]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List
+
+import httpx
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ["SNAPSHOT_DIR"] = ""
+
+import main  # noqa: E402
+from log_pipeline import JsonFormatter, LoggingPipeline, TextFormatter, parse_rate_limits  # noqa: E402
+from synthetic import generate_dataset  # noqa: E402
+
+START = pd.Timestamp("2023-01-01")
+DAYS = 730
+MODES = ("off", "sync", "async")
+
+
+def configure(mode: str, log_dir: str, devnull) -> LoggingPipeline:
+    """Troca os handlers do logger da aplicação pelos do modo; retorna o pipeline (async)"""
+    logger = logging.getLogger("analytics_api")
+    main.log_pipeline.stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.disabled = mode == "off"
+    logger.setLevel(logging.DEBUG)
+
+    file_handler = RotatingFileHandler(os.path.join(log_dir, f"{mode}.log"), maxBytes=10 * 1024 * 1024, backupCount=5)
+    file_handler.setLevel(logging.DEBUG)
+    console_handler = logging.StreamHandler(devnull)
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(TextFormatter())
+    if mode == "sync":
+        file_handler.setFormatter(TextFormatter())
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
+        return main.log_pipeline
+
+    file_handler.setFormatter(JsonFormatter())
+    pipeline = LoggingPipeline(logger, [file_handler, console_handler], queue_size=main.LOG_QUEUE_SIZE,
+                               debug_sample_every=main.LOG_DEBUG_SAMPLE_EVERY,
+                               rate_limits=parse_rate_limits(main.LOG_RATE_LIMITS))
+    if mode == "async":
+        pipeline.start()
+    main.log_pipeline = pipeline
+    return pipeline
+
+
+async def client_loop(client: httpx.AsyncClient, deadline: float, seed: int, latencies: List[float]) -> None:
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        first = rng.randrange(DAYS - 30)
+        params = {
+            "start_date": (START + pd.Timedelta(days=first)).strftime("%Y-%m-%d"),
+            "end_date": (START + pd.Timedelta(days=first + rng.randrange(1, 30))).strftime("%Y-%m-%d"),
+        }
+        path = "/kpis" if rng.random() < 0.5 else "/sales"
+        t0 = time.perf_counter()
+        response = await client.get(path, params=params)
+        latencies.append(time.perf_counter() - t0)
+        response.raise_for_status()
+
+
+async def scenario(duration: float, clients: int) -> Dict:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        latencies: List[float] = []
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*[client_loop(client, deadline, i, latencies) for i in range(clients)])
+        elapsed = time.perf_counter() - started
+    values = np.array(latencies) * 1000
+    return {
+        "rps": len(values) / elapsed,
+        "p50": float(np.percentile(values, 50)),
+        "p99": float(np.percentile(values, 99)),
+    }
+
+
+def run(rows: int, duration: float, clients: int, modes: List[str]) -> None:
+    main.uploaded_data['current'] = generate_dataset(rows)
+    print(f"Dataset: {rows} linhas | {clients} clientes | {duration:.0f}s por modo")
+    print(f"{'modo':>6} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'arquivo (KB)':>13}  descartes")
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull:
+        for mode in modes:
+            pipeline = configure(mode, log_dir, devnull)
+            main.result_cache.invalidate()
+            result = asyncio.run(scenario(duration, clients))
+            pipeline.stop()
+            log_file = os.path.join(log_dir, f"{mode}.log")
+            size = os.path.getsize(log_file) / 1024 if os.path.exists(log_file) else 0
+            dropped = pipeline.stats() if mode == "async" else "-"
+            print(f"{mode:>6} {result['rps']:>9.1f} {result['p50']:>9.2f} {result['p99']:>9.2f} {size:>13.1f}  {dropped}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+    run(args.rows, args.duration, args.clients, args.modes)
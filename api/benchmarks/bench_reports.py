@@ -0,0 +1,125 @@
+"""
+Benchmark: /reports/detailed e /reports/summary sequenciais (antigo) versus o montador de relatórios
+- antigo: cada seção aguarda a função do endpoint individual, uma depois da outra
+  (cada uma refiltra os dados e recalcula lucro e agrupamento por produto)
+- atual: reports.ReportBuilder (fatia única, entradas compartilhadas, seções em paralelo no pool)
+
+Mede a latência sem cache (o cache de resultados é esvaziado a cada repetição) em dois
+cenários: só datas (o cubo diário responde) e com filtro de região (as seções varrem a fatia).
+Também mostra a seção individual mais lenta, o piso esperado para o relatório paralelo.
+
+Uso (a partir de api/):
+    python benchmarks/bench_reports.py [--rows 1000000] [--repeat 5] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ["SNAPSHOT_DIR"] = ""
+
+import main  # noqa: E402
+import reports  # noqa: E402
+from query import DimensionFilters  # noqa: E402
+from synthetic import generate_dataset  # noqa: E402
+from workers import WorkerPool  # noqa: E402
+
+SCENARIOS = {
+    "datas": {"start_date": "2023-03-01", "end_date": "2024-09-01", "filters": DimensionFilters()},
+    "regiao": {"start_date": "2023-03-01", "end_date": "2024-09-01", "filters": DimensionFilters.parse(regiao="Sul,Sudeste")},
+}
+
+
+async def legacy_report_detailed(start_date, end_date, filters) -> Dict:
+    """Cópia fiel do get_report_detailed anterior (dataset atual)"""
+    params = dict(start_date=start_date, end_date=end_date, dataset_id=None, filters=filters)
+    # Chamadas diretas passam todos os parâmetros (os defaults do Query() não são resolvidos)
+    records = dict(params, response_format="records")
+    return {
+        "analysis": await main.get_analysis(dataset_id=None, start_date=None, end_date=None),
+        "kpis": await main.get_kpis(**params, distinct="exact"),
+        "monthly_sales": await main.get_sales_by_month(**records),
+        "sales_by_category": await main.get_sales_by_category(**records),
+        "top_products": await main.get_top_products(limit=10, **records, order_by="quantidade"),
+        "customers_by_gender": await main.get_customers_by_gender(**records),
+        "sales_by_state": await main.get_sales_by_state(limit=15, **records),
+        "payment_methods": await main.get_payment_methods(**records),
+    }
+
+
+async def legacy_report_summary(start_date, end_date, filters) -> Dict:
+    """Cópia fiel do get_report_summary anterior (dataset atual)"""
+    params = dict(start_date=start_date, end_date=end_date, dataset_id=None, filters=filters)
+    records = dict(params, response_format="records")
+    categories = await main.get_sales_by_category(**records)
+    return {
+        "kpis": await main.get_kpis(**params, distinct="exact"),
+        "top_categories": categories[:3] if categories else [],
+        "top_products": await main.get_top_products(limit=5, **records, order_by="quantidade"),
+    }
+
+
+async def slowest_section(scenario: Dict, repeat: int) -> float:
+    """Seção mais lenta do relatório detalhado calculada sozinha (mesma fatia e entradas)"""
+    builder = main.report_builder(scenario["start_date"], scenario["end_date"], None, scenario["filters"])
+    slowest = 0.0
+    for section in reports.DETAILED_SECTIONS:
+        async def single(section=section):
+            await reports.ReportBuilder(builder.pool, builder.data, builder.cube).build([section])
+        slowest = max(slowest, await best_of(single, repeat))
+    return slowest
+
+
+async def best_of(fn: Callable, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        main.result_cache.invalidate()
+        t0 = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings) * 1000
+
+
+async def scenario_timings(scenario: Dict, repeat: int) -> List[float]:
+    params = dict(start_date=scenario["start_date"], end_date=scenario["end_date"], dataset_id=None, filters=scenario["filters"])
+    args = (scenario["start_date"], scenario["end_date"], scenario["filters"])
+
+    legacy = await legacy_report_detailed(*args)
+    current = await main.get_report_detailed(**params)
+    assert list(legacy) == [key for key in current if key != "timestamp"]
+
+    return [
+        await best_of(lambda: legacy_report_summary(*args), repeat),
+        await best_of(lambda: main.get_report_summary(**params), repeat),
+        await best_of(lambda: legacy_report_detailed(*args), repeat),
+        await best_of(lambda: main.get_report_detailed(**params), repeat),
+        await slowest_section(scenario, repeat),
+    ]
+
+
+def run(rows: int, repeat: int, workers: int) -> None:
+    logging.getLogger("analytics_api").setLevel(logging.ERROR)
+    main.analytics_pool.shutdown()
+    main.analytics_pool = WorkerPool("analytics", workers, main.WORKER_QUEUE_DEPTH)
+    main.uploaded_data['current'] = generate_dataset(rows)
+    print(f"Dataset: {rows} linhas | pool de análise com {workers} threads | melhor de {repeat}")
+    print(f"{'cenário':<8} {'resumo antigo':>14} {'resumo atual':>13} {'detalhado antigo':>17} "
+          f"{'detalhado atual':>16} {'seção mais lenta':>17} {'speedup':>8}  (ms)")
+    for name, scenario in SCENARIOS.items():
+        old_summary, new_summary, old_detailed, new_detailed, slowest = asyncio.run(scenario_timings(scenario, repeat))
+        print(f"{name:<8} {old_summary:>14.1f} {new_summary:>13.1f} {old_detailed:>17.1f} "
+              f"{new_detailed:>16.1f} {slowest:>17.1f} {old_detailed / new_detailed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=main.WORKER_POOL_SIZE)
+    args = parser.parse_args()
+    run(args.rows, args.repeat, args.workers)
@@ -0,0 +1,76 @@
+"""
+Benchmark: serialização de páginas de /sales
+- records: page.to_dict('records') + jsonable_encoder + json.dumps (caminho padrão do FastAPI)
+- columns: serialize.columns_json direto dos arrays NumPy (?format=columns)
+
+Mede tempo e tamanho da resposta (bruto e com gzip nível 1) para páginas de --page linhas.
+
+Uso (a partir de api/):
+    python benchmarks/bench_serialization.py [--rows 100000] [--page 10000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import serialize  # noqa: E402
+from dataset import build_dataset  # noqa: E402
+from synthetic import generate_sales  # noqa: E402
+
+
+def records_body(page, meta) -> bytes:
+    """Mesmo caminho do /sales em formato records"""
+    page = page.assign(data_venda=page['data_venda'].dt.strftime('%Y-%m-%d'))
+    content = dict(meta, data=page.to_dict('records'))
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode('utf-8')
+
+
+def columns_body(page, meta) -> bytes:
+    return serialize.envelope(dict(meta, format="columns"), serialize.columns_json(page))
+
+
+def best_of(fn, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings), result
+
+
+def run(rows: int, page_rows: int, repeat: int) -> None:
+    data = build_dataset(generate_sales(rows)).frame
+    page = data.iloc[:page_rows]
+    meta = {"total": len(data), "limit": page_rows, "offset": 0}
+
+    # Sanidade: mesmo conteúdo nos dois formatos
+    records = json.loads(records_body(page, meta))["data"]
+    columns = json.loads(columns_body(page, meta))["data"]
+    assert len(records) == len(columns["id_transacao"]) == len(page)
+    assert records[0]["data_venda"] == columns["data_venda"][0]
+
+    print(f"{'formato':<8} {'tempo (ms)':>11} {'bytes':>11} {'gzip (bytes)':>13}")
+    results = {}
+    for name, fn in (("records", lambda: records_body(page, meta)), ("columns", lambda: columns_body(page, meta))):
+        elapsed, body = best_of(fn, repeat)
+        results[name] = elapsed
+        print(f"{name:<8} {elapsed * 1000:>11.2f} {len(body):>11} {len(zlib.compress(body, 1)):>13}")
+    print(f"speedup: {results['records'] / max(results['columns'], 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.page, args.repeat)
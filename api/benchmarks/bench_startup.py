@@ -0,0 +1,95 @@
+"""
+Benchmark: carga do dataset na inicialização - pd.read_csv + build_dataset (implementação
+antiga, a cada início de processo) versus snapshot colunar com memory-map (snapshot.py)
+
+Cada variante roda em um subprocesso novo (como um worker recém-iniciado) e mede o tempo
+de carga, o tempo do primeiro cálculo de KPIs (no snapshot, inclui trazer as páginas do
+disco) e o RSS acima do RSS antes da carga. O cache de páginas do sistema fica quente
+após a gravação, como em um reinício do processo na mesma máquina.
+
+Uso (a partir de api/):
+    python benchmarks/bench_startup.py [--sizes 10000 1000000]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import analytics  # noqa: E402
+import snapshot  # noqa: E402
+from bench_export_csv import RssSampler  # noqa: E402
+from dataset import build_dataset  # noqa: E402
+from synthetic import generate_sales  # noqa: E402
+
+VARIANTS = ["csv", "snapshot"]
+
+
+def child(variant: str, workdir: str) -> None:
+    csv_path = os.path.join(workdir, "vendas.csv")
+    baseline = RssSampler.rss()
+    t0 = time.perf_counter()
+    if variant == "csv":
+        dataset = build_dataset(pd.read_csv(csv_path))
+    else:
+        dataset = snapshot.load_snapshot(workdir, "default", snapshot.file_fingerprint(csv_path))
+    load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    analytics.kpis(dataset.frame)
+    first_query = time.perf_counter() - t0
+
+    print(json.dumps({"load": load, "first_query": first_query, "rss_mb": (RssSampler.rss() - baseline) / (1024 * 1024)}))
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def run(sizes) -> None:
+    print(f"{'linhas':>10} {'variante':>9} {'carga (ms)':>11} {'1ª consulta (ms)':>17} {'RSS (MB)':>9} {'disco (MB)':>11}")
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix="bench_startup_")
+        try:
+            csv_path = os.path.join(workdir, "vendas.csv")
+            generate_sales(size).to_csv(csv_path, index=False)
+            t0 = time.perf_counter()
+            dataset = build_dataset(pd.read_csv(csv_path))
+            build = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            snapshot.save_snapshot(dataset, workdir, "default", snapshot.file_fingerprint(csv_path))
+            save = time.perf_counter() - t0
+            del dataset
+            disk = {"csv": os.path.getsize(csv_path), "snapshot": directory_size(workdir) - os.path.getsize(csv_path)}
+
+            for variant in VARIANTS:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", variant, "--workdir", workdir],
+                    capture_output=True, text=True, check=True,
+                ).stdout.strip().splitlines()[-1]
+                result = json.loads(output)
+                print(f"{size:>10} {variant:>9} {result['load'] * 1000:>11.1f} {result['first_query'] * 1000:>17.1f} "
+                      f"{result['rss_mb']:>9.1f} {disk[variant] / (1024 * 1024):>11.1f}")
+            print(f"{'':>10} (build inicial {build:.2f}s, gravação do snapshot {save:.2f}s)")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.workdir)
+    else:
+        run(args.sizes)
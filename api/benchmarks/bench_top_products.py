@@ -0,0 +1,107 @@
+"""
+Benchmark: ranking de /top-products e /product-ratings
+- antigo: groupby + groupby.apply(lambda) para o lucro + merge + sort_values().head()
+- atual: lucro por coluna antes do agrupamento (product_summary) + seleção parcial (top_k)
+
+Também mede só a etapa de seleção (sort_values().head() versus top_k) sobre o
+agrupamento por produto já pronto.
+
+Uso (a partir de api/):
+    python benchmarks/bench_top_products.py [--sizes 100000 1000000] [--products 10000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import analytics  # noqa: E402
+from dataset import build_dataset  # noqa: E402
+from synthetic import generate_sales  # noqa: E402
+
+
+def legacy_top_products(data: pd.DataFrame, limit: int) -> list:
+    """Cópia fiel do get_top_products anterior"""
+    products = data.groupby('nome_produto').agg({
+        'quantidade': 'sum',
+        'valor_final': 'sum',
+        'id_transacao': 'count'
+    }).reset_index()
+    lucro_by_product = data.groupby('nome_produto').apply(
+        lambda x: (x['valor_final'] - (x['custo_produto'] * x['quantidade'])).sum()
+    ).reset_index(name='lucro')
+    products = products.merge(lucro_by_product, on='nome_produto')
+    products.columns = ['name', 'quantidade', 'valor_total', 'transacoes', 'lucro']
+    products = products.sort_values('quantidade', ascending=False).head(limit)
+    return products.to_dict('records')
+
+
+def legacy_product_ratings(data: pd.DataFrame, limit: int) -> list:
+    """Cópia fiel do get_product_ratings anterior"""
+    ratings = data.groupby('nome_produto').agg({
+        'avaliacao_produto': 'mean',
+        'id_transacao': 'count'
+    }).reset_index()
+    ratings.columns = ['name', 'avaliacao', 'quantidade']
+    ratings = ratings[ratings['quantidade'] >= 2]
+    ratings = ratings.sort_values('avaliacao', ascending=True).head(limit)
+    return ratings[['name', 'avaliacao']].to_dict('records')
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def run(sizes, products: int, limit: int, repeat: int) -> None:
+    print(f"{'linhas':>10} {'produtos':>9} {'etapa':<26} {'antigo (ms)':>12} {'atual (ms)':>11} {'speedup':>8}")
+    for size in sizes:
+        raw = generate_sales(size, products=products)
+        data = build_dataset(raw).frame
+        summary = analytics.product_summary(data)
+
+        # Sanidade: mesmos valores no ranking (o sort antigo não é estável, empates podem trocar de nome)
+        legacy = legacy_top_products(data, limit)
+        current = analytics.top_products(data, limit)
+        assert [row['quantidade'] for row in legacy] == [row['quantidade'] for row in current]
+
+        cases = [
+            ("top_products (quantidade)",
+             lambda: legacy_top_products(data, limit),
+             lambda: analytics.top_products(data, limit)),
+            ("top_products (lucro)",
+             None,
+             lambda: analytics.top_products(data, limit, order_by='lucro')),
+            ("product_ratings",
+             lambda: legacy_product_ratings(data, limit),
+             lambda: analytics.product_ratings(data, limit)),
+            ("seleção: sort+head x top_k",
+             lambda: summary.sort_values('quantidade', ascending=False).head(limit),
+             lambda: analytics.top_k(summary, 'quantidade', limit)),
+        ]
+        for name, old, new in cases:
+            current_time = best_of(new, repeat)
+            if old is None:
+                print(f"{size:>10} {products:>9} {name:<26} {'-':>12} {current_time * 1000:>11.2f} {'-':>8}")
+                continue
+            legacy_time = best_of(old, repeat)
+            print(f"{size:>10} {products:>9} {name:<26} {legacy_time * 1000:>12.2f} "
+                  f"{current_time * 1000:>11.2f} {legacy_time / max(current_time, 1e-9):>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.products, args.limit, args.repeat)
@@ -0,0 +1,100 @@
+"""
+Benchmark: validate_data com parsing de datas / normalização de strings linha a linha
+(implementação antiga, via .apply) versus o motor vetorizado atual
+
+Uso (a partir de api/):
+    python benchmarks/bench_validation.py [--sizes 10000 100000]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import data_validator  # noqa: E402
+from synthetic import generate_sales  # noqa: E402
+
+
+def legacy_standardize_dates(df, report):
+    """Cópia fiel do _standardize_dates anterior (parse por linha com .apply)"""
+    def parse_date(date_str):
+        if pd.isna(date_str):
+            return None
+        date_str = str(date_str).strip()
+        for fmt in data_validator.DATE_FORMATS:
+            try:
+                return pd.to_datetime(date_str, format=fmt)
+            except Exception:
+                continue
+        return None
+
+    df['data_venda'] = df['data_venda'].apply(parse_date)
+    errors = df['data_venda'].isna().sum()
+    if errors > 0:
+        report.date_conversion_errors = errors
+        df = df[df['data_venda'].notna()]
+    return df
+
+
+def legacy_normalize_strings(df, report):
+    """Cópia fiel do _normalize_strings anterior (lambda por linha)"""
+    for col in ['nome_produto', 'categoria', 'genero_cliente', 'estado_cliente', 'forma_pagamento', 'status_entrega']:
+        if col in df.columns:
+            df[col] = df[col].apply(lambda x: str(x).strip().title() if pd.notna(x) else x)
+    return df
+
+
+def legacy_validate(data):
+    with mock.patch.object(data_validator, '_standardize_dates', legacy_standardize_dates), \
+            mock.patch.object(data_validator, '_normalize_strings', legacy_normalize_strings), \
+            mock.patch.object(data_validator, '_to_numeric', lambda values: pd.to_numeric(values, errors='coerce')), \
+            mock.patch.object(data_validator, 'drop_duplicates', lambda df: df.drop_duplicates()):
+        return data_validator.validate_data(data)
+
+
+def sample_data(size: int) -> pd.DataFrame:
+    """Dados sintéticos com 10% das datas em dd/mm/aaaa e strings sujas"""
+    raw = generate_sales(size)
+    mixed = raw.index[::10]
+    raw.loc[mixed, 'data_venda'] = pd.to_datetime(raw.loc[mixed, 'data_venda']).dt.strftime('%d/%m/%Y')
+    raw.loc[raw.index[::7], 'categoria'] = '  ' + raw.loc[raw.index[::7], 'categoria'].str.lower() + ' '
+    return raw
+
+
+def timed(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def run(sizes, repeat: int):
+    logging.getLogger("analytics_api").disabled = True
+    print(f"{'linhas':>10} {'antigo (ms)':>12} {'vetorizado (ms)':>16} {'speedup':>9}")
+    for size in sizes:
+        raw = sample_data(size)
+        legacy = timed(lambda: legacy_validate(raw), 1)
+        current = timed(lambda: data_validator.validate_data(raw), repeat)
+
+        # Os dois caminhos precisam produzir exatamente o mesmo resultado
+        expected, _ = legacy_validate(raw)
+        result, _ = data_validator.validate_data(raw)
+        pd.testing.assert_frame_equal(expected, result)
+
+        print(f"{size:>10} {legacy * 1000:>12.0f} {current * 1000:>16.0f} {legacy / current:>8.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,131 @@
+"""
+Teste de carga: latência de endpoints leves (/kpis) com e sem requisições pesadas
+(/export/excel, /export/csv) em paralelo, com o trabalho pesado no event loop
+(pools com 0 workers, comportamento antigo) versus nos pools de workers, com a
+exportação em threads ou em processos
+
+Roda a aplicação em processo (httpx + ASGITransport), no mesmo event loop, como um
+worker do uvicorn. Cada /kpis usa um intervalo de datas aleatório para não depender
+só do cache de resultados.
+
+Uso (a partir de api/):
+    python benchmarks/load_test.py [--rows 200000] [--duration 10] [--light 8] [--heavy 2]
+                                  [--modes inline thread process]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Dataset sintético só em memória: sem ler nem publicar snapshots do diretório real
+os.environ["SNAPSHOT_DIR"] = ""
+
+import main  # noqa: E402
+from dataset import build_dataset  # noqa: E402
+from synthetic import generate_sales  # noqa: E402
+from workers import WorkerPool  # noqa: E402
+
+START = pd.Timestamp("2023-01-01")
+DAYS = 730
+
+
+def random_range(rng: random.Random, max_days: int) -> Dict[str, str]:
+    first = rng.randrange(DAYS - max_days)
+    length = rng.randrange(1, max_days)
+    return {
+        "start_date": (START + pd.Timedelta(days=first)).strftime("%Y-%m-%d"),
+        "end_date": (START + pd.Timedelta(days=first + length)).strftime("%Y-%m-%d"),
+    }
+
+
+async def light_client(client: httpx.AsyncClient, deadline: float, seed: int, latencies: List[float], statuses: Dict[int, int]):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        response = await client.get("/kpis", params=random_range(rng, 365))
+        latencies.append(time.perf_counter() - t0)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def heavy_client(client: httpx.AsyncClient, deadline: float, seed: int, statuses: Dict[int, int]):
+    rng = random.Random(seed)
+    paths = ["/export/excel", "/export/csv"]
+    while time.perf_counter() < deadline:
+        path = paths[0]
+        paths.reverse()
+        response = await client.get(path, params=random_range(rng, 60))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 429:
+            await asyncio.sleep(0.1)
+
+
+async def scenario(duration: float, light: int, heavy: int) -> Dict:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        deadline = time.perf_counter() + duration
+        latencies: List[float] = []
+        light_statuses: Dict[int, int] = {}
+        heavy_statuses: Dict[int, int] = {}
+        tasks = [light_client(client, deadline, i, latencies, light_statuses) for i in range(light)]
+        tasks += [heavy_client(client, deadline, 1000 + i, heavy_statuses) for i in range(heavy)]
+        await asyncio.gather(*tasks)
+
+    values = np.array(latencies) * 1000
+    return {
+        "requests": len(values),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+        "light_statuses": light_statuses,
+        "heavy_statuses": heavy_statuses,
+    }
+
+
+def configure_pools(mode: str) -> None:
+    """inline: trabalho no event loop (antigo); thread/process: tipo do pool de exportação"""
+    for pool in (main.analytics_pool, main.export_pool):
+        pool.shutdown()
+    if mode == "inline":
+        main.analytics_pool = WorkerPool("analytics", 0, 0)
+        main.export_pool = WorkerPool("export", 0, 0)
+    else:
+        main.analytics_pool = WorkerPool("analytics", main.WORKER_POOL_SIZE, main.WORKER_QUEUE_DEPTH)
+        main.export_pool = WorkerPool("export", main.EXPORT_POOL_SIZE, main.EXPORT_QUEUE_DEPTH, kind=mode)
+
+
+def run(rows: int, duration: float, light: int, heavy: int, modes: List[str]) -> None:
+    logging.getLogger("analytics_api").setLevel(logging.ERROR)
+    main.uploaded_data['current'] = build_dataset(generate_sales(rows))
+
+    print(f"Dataset: {rows} linhas | {light} clientes /kpis | {heavy} clientes de exportação | {duration:.0f}s por cenário")
+    print(f"{'modo':>8} {'pesadas':>8} {'reqs':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}  status leves / pesadas")
+    for mode in modes:
+        configure_pools(mode)
+        for heavy_clients in (0, heavy):
+            main.result_cache.invalidate()
+            result = asyncio.run(scenario(duration, light, heavy_clients))
+            print(f"{mode:>8} {heavy_clients:>8} {result['requests']:>6} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+                  f"{result['p99']:>9.1f} {result['max']:>9.1f}  {result['light_statuses']} / {result['heavy_statuses']}")
+    configure_pools(main.EXPORT_POOL_KIND)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--light", type=int, default=8)
+    parser.add_argument("--heavy", type=int, default=2)
+    parser.add_argument("--modes", nargs="+", default=["inline", "thread", "process"], choices=["inline", "thread", "process"])
+    args = parser.parse_args()
+    run(args.rows, args.duration, args.light, args.heavy, args.modes)
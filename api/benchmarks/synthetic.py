@@ -0,0 +1,107 @@
+"""
+Gerador de dados sintéticos de vendas para benchmarks
+- Mesmas colunas do CSV padrão (vendas_ficticias_10000_linhas.csv)
+- Valores compatíveis com EXPECTED_SCHEMA / VALID_RANGES do data_validator
+- Reprodutível via seed
+- generate_dataset: gera e tipa em blocos (10M linhas sem manter todo o texto bruto em memória)
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dataset import Dataset, build_dataset, concat_frames, prepare_chunk  # noqa: E402
+
+CATEGORIAS = ['Smartphones', 'Notebooks', 'Tablets', 'Audio', 'Wearables', 'Monitores',
+              'Periféricos', 'Armazenamento', 'Games', 'Acessórios']
+MARCAS = ['Apple', 'Samsung', 'Dell', 'JBL', 'Xiaomi', 'Microsoft', 'Garmin', 'Sony', 'LG', 'Logitech']
+ESTADOS = ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'PE', 'CE', 'GO', 'DF', 'AM', 'PA']
+CIDADES = ['São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Porto Alegre', 'Curitiba', 'Recife',
+           'Salvador', 'Fortaleza', 'Brasília', 'Manaus', 'Belém', 'Natal', 'Maceió', 'Aracaju']
+REGIOES = ['Norte', 'Nordeste', 'Centro-Oeste', 'Sudeste', 'Sul']
+CANAIS = ['Online', 'Loja Física', 'Marketplace', 'App Mobile']
+PAGAMENTOS = ['Cartão Crédito', 'Cartão Débito', 'Boleto', 'PIX']
+STATUS = ['Entregue', 'Em Trânsito', 'Processando', 'Cancelado']
+DIAS = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+PERIODOS = ['Manhã', 'Tarde', 'Noite']
+NOMES = ['Rodrigo Castro', 'Lucia Ferreira', 'João Silva', 'Maria Santos', 'Beatriz Araújo',
+         'Eduardo Gomes', 'Fernanda Rocha', 'Mariana Cardoso']
+
+
+def generate_sales(rows: int, seed: int = 42, products: int = 100, customers: int = 2000,
+                   start: str = '2023-01-01', days: int = 730, first_id: int = 1) -> pd.DataFrame:
+    """Gera um DataFrame de vendas sintético com `rows` linhas (id_transacao a partir de first_id)"""
+    rng = np.random.default_rng(seed)
+
+    def pick(values):
+        return np.asarray(values, dtype=object)[rng.integers(0, len(values), rows)]
+
+    product_ids = rng.integers(1, products + 1, rows)
+    customer_ids = rng.integers(1, customers + 1, rows)
+    dates = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, rows), unit='D')
+
+    quantidade = rng.integers(1, 6, rows)
+    preco = np.round(rng.uniform(20, 8000, rows), 2)
+    subtotal = np.round(preco * quantidade, 2)
+    desconto_percent = rng.integers(0, 30, rows)
+    desconto_valor = np.round(subtotal * desconto_percent / 100, 2)
+    valor_final = np.round(subtotal - desconto_valor, 2)
+    margem = np.round(rng.uniform(0.1, 0.6, rows), 2)
+    custo = np.round(preco * (1 - margem), 2)
+
+    return pd.DataFrame({
+        'id_transacao': np.char.add('TXN', np.char.zfill(np.arange(first_id, first_id + rows).astype(str), 8)),
+        'data_venda': dates.strftime('%Y-%m-%d'),
+        'cliente_id': np.char.add('CLI', np.char.zfill(customer_ids.astype(str), 6)),
+        'nome_cliente': pick(NOMES),
+        'idade_cliente': rng.integers(18, 80, rows),
+        'genero_cliente': pick(['M', 'F']),
+        'cidade_cliente': pick(CIDADES),
+        'estado_cliente': pick(ESTADOS),
+        'renda_estimada': rng.integers(1500, 30000, rows),
+        'produto_id': np.char.add('PRD', np.char.zfill(product_ids.astype(str), 5)),
+        'nome_produto': np.char.add('Produto ', product_ids.astype(str)),
+        'categoria': np.asarray(CATEGORIAS, dtype=object)[product_ids % len(CATEGORIAS)],
+        'marca': np.asarray(MARCAS, dtype=object)[product_ids % len(MARCAS)],
+        'preco_unitario': preco,
+        'quantidade': quantidade,
+        'subtotal': subtotal,
+        'desconto_percent': desconto_percent,
+        'desconto_valor': desconto_valor,
+        'valor_final': valor_final,
+        'regiao': pick(REGIOES),
+        'canal_venda': pick(CANAIS),
+        'custo_produto': custo,
+        'margem_lucro': margem,
+        'vendedor_id': np.char.add('VEN', np.char.zfill(rng.integers(1, 51, rows).astype(str), 3)),
+        'comissao_vendedor': np.round(valor_final * 0.02, 2),
+        'mes': dates.month,
+        'trimestre': dates.quarter,
+        'dia_semana': pick(DIAS),
+        'periodo_dia': pick(PERIODOS),
+        'status_entrega': pick(STATUS),
+        'avaliacao_produto': np.round(rng.uniform(1, 5, rows), 1),
+        'tempo_entrega_dias': rng.integers(1, 20, rows),
+        'forma_pagamento': pick(PAGAMENTOS),
+        'parcelas': rng.integers(1, 13, rows),
+    })
+
+
+def generate_dataset(rows: int, seed: int = 42, chunk_rows: int = 1_000_000, **kwargs) -> Dataset:
+    """
+    Dataset canônico com `rows` linhas, gerado em blocos de chunk_rows
+
+    Cada bloco é tipado (datas e dimensões) antes do próximo ser gerado, como no upload.
+    Até chunk_rows linhas o resultado é igual a build_dataset(generate_sales(rows, seed)).
+    """
+    if rows <= chunk_rows:
+        return build_dataset(generate_sales(rows, seed=seed, **kwargs))
+    parts = []
+    for i, first in enumerate(range(0, rows, chunk_rows)):
+        size = min(chunk_rows, rows - first)
+        parts.append(prepare_chunk(generate_sales(size, seed=seed + i, first_id=first + 1, **kwargs)))
+    return build_dataset(concat_frames(parts))
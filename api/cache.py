@@ -0,0 +1,143 @@
+"""
+Cache de resultados dos endpoints de análise
+- Chave: (versão do dataset, endpoint, parâmetros normalizados)
+- Limitado por memória com despejo LRU
+- Invalidado quando o dataset é substituído (/upload, /reset)
+- Contadores de hit/miss/evicção para dimensionamento
+"""
+
+import functools
+import inspect
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger("analytics_api")
+
+
+class ResultCache:
+    """Cache LRU limitado pelo tamanho estimado (JSON) dos resultados"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Retorna (encontrado, valor) e marca a entrada como usada recentemente"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Armazena um resultado, despejando os menos usados se passar do limite"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            logger.debug(f"Resultado de {size} bytes maior que o cache, ignorado")
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """Remove todas as entradas (dataset substituído)"""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self.current_bytes = 0
+            self.invalidations += 1
+        logger.info(f"🧹 Cache de resultados invalidado ({removed} entradas removidas)")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def estimate_size(value: Any) -> int:
+    """Tamanho aproximado do resultado serializado em JSON"""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+
+def normalize_params(params: Dict[str, Any]) -> Tuple:
+    """Normaliza parâmetros de consulta para compor a chave do cache"""
+    normalized = []
+    for name, value in sorted(params.items()):
+        if isinstance(value, str):
+            value = value.strip()
+            if name.endswith('_date') and value:
+                try:
+                    value = pd.to_datetime(value).strftime('%Y-%m-%d')
+                except (ValueError, TypeError):
+                    pass
+            elif name == 'region':
+                value = value.lower()
+        if value == '':
+            value = None
+        normalized.append((name, value))
+    return tuple(normalized)
+
+
+def cached_endpoint(cache: ResultCache, name: str, version_getter: Callable[[Dict[str, Any]], Optional[int]]):
+    """
+    Decorator para endpoints async cujos resultados dependem só do dataset e dos parâmetros
+
+    version_getter recebe os parâmetros normalizados (ex: dataset_id) e devolve a versão
+    do dataset consultado. Os valores em cache são compartilhados entre requisições e não
+    devem ser alterados.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = normalize_params(bound.arguments)
+            key = (version_getter(dict(params)), name, params)
+
+            hit, value = cache.get(key)
+            if hit:
+                return value
+
+            value = await fn(*args, **kwargs)
+            cache.put(key, value)
+            return value
+
+        return wrapper
+    return decorator
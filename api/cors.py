@@ -0,0 +1,120 @@
+"""
+Middleware CORS em ASGI puro
+- Sobrescreve os headers CORS da resposta (o proxy do Railway injeta os seus)
+- Sem BaseHTTPMiddleware: a resposta passa direto, sem tarefa nem fila extra por requisição,
+  e o streaming das exportações chega ao cliente bloco a bloco
+- Origens exatas em um set; subdomínios *.vercel.app por expressão regular
+- Headers pré-codificados em bytes; respostas OPTIONS montadas uma vez por origem e reutilizadas
+"""
+
+import json
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+from metrics import header
+
+logger = logging.getLogger("analytics_api")
+
+ALLOW_METHODS = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
+ALLOW_HEADERS = "Content-Type, Authorization, X-Requested-With, Accept, X-Profile"
+PREFLIGHT_MAX_AGE = "86400"
+
+# Qualquer subdomínio da Vercel (previews e produção)
+VERCEL_ORIGIN = re.compile(r"^https?://([a-z0-9-]+\.)+vercel\.app(:\d+)?$")
+
+# Respostas OPTIONS guardadas (uma por origem aceita; acima disso o cache recomeça)
+PREFLIGHT_CACHE_SIZE = 256
+
+# Headers da resposta que o middleware substitui
+_REPLACED = {b"access-control-allow-origin", b"access-control-allow-methods",
+             b"access-control-allow-headers", b"access-control-allow-credentials"}
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class CustomCORSMiddleware:
+    """CORS que sobrescreve headers do Railway, com headers e preflights pré-calculados"""
+
+    def __init__(self, app, allowed_origins: Iterable[str], fallback_origin: str,
+                 origin_patterns: Iterable[Pattern] = (VERCEL_ORIGIN,)):
+        self.app = app
+        self.allowed_origins = frozenset(origin for origin in allowed_origins if origin)
+        self.origin_patterns = tuple(origin_patterns)
+        self.fallback_origin = fallback_origin
+        # Headers fixos (métodos, headers, credenciais) codificados uma única vez
+        self._common: Headers = [
+            (b"access-control-allow-methods", ALLOW_METHODS.encode("latin-1")),
+            (b"access-control-allow-headers", ALLOW_HEADERS.encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+        ]
+        self._preflight_body = json.dumps({"status": "ok"}, separators=(",", ":")).encode("utf-8")
+        self._preflights: Dict[bytes, Headers] = {}
+
+    def is_allowed(self, origin: Optional[str]) -> bool:
+        if not origin:
+            return False
+        return origin in self.allowed_origins or any(pattern.match(origin) for pattern in self.origin_patterns)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = header(scope, b"origin")
+        allowed_origin = origin if self.is_allowed(origin.decode("latin-1") if origin else None) else self.fallback_origin.encode("latin-1")
+        if origin and allowed_origin != origin:
+            logger.debug(f"🌐 CORS: origem não permitida {origin.decode('latin-1')!r}, respondendo com {self.fallback_origin}")
+
+        # Responder a requisições OPTIONS (preflight) sem chegar à aplicação
+        if scope["method"] == "OPTIONS":
+            await send({"type": "http.response.start", "status": 200, "headers": self._preflight_headers(allowed_origin)})
+            await send({"type": "http.response.body", "body": self._preflight_body})
+            return
+
+        cors_headers = [(b"access-control-allow-origin", allowed_origin), *self._common]
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = _with_cors(message.get("headers", []), cors_headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    def _preflight_headers(self, allowed_origin: bytes) -> Headers:
+        headers = self._preflights.get(allowed_origin)
+        if headers is None:
+            if len(self._preflights) >= PREFLIGHT_CACHE_SIZE:
+                self._preflights.clear()
+            headers = self._preflights[allowed_origin] = [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(self._preflight_body)).encode("latin-1")),
+                (b"access-control-allow-origin", allowed_origin),
+                *self._common,
+                (b"access-control-max-age", PREFLIGHT_MAX_AGE.encode("latin-1")),
+                (b"vary", b"Origin"),
+            ]
+        return headers
+
+
+def _with_cors(headers, cors_headers: Headers) -> Headers:
+    """Troca os headers CORS existentes pelos do middleware e acrescenta Origin ao Vary"""
+    result = []
+    vary = None
+    for name, value in headers:
+        lowered = name.lower()
+        if lowered in _REPLACED:
+            continue
+        if lowered == b"vary":
+            vary = value
+            continue
+        result.append((name, value))
+    result.extend(cors_headers)
+    # Mantém Vary: Accept-Encoding da exportação CSV
+    if vary is None or vary.strip() == b"*":
+        result.append((b"vary", vary or b"Origin"))
+    elif b"origin" in vary.lower():
+        result.append((b"vary", vary))
+    else:
+        result.append((b"vary", vary + b", Origin"))
+    return result
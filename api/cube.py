@@ -0,0 +1,207 @@
+"""
+Cubo diário pré-agregado
+- Construído uma vez quando o dataset é carregado
+- Um cuboide (dia x dimensão) por dimensão, mais o total por dia
+- Somente medidas aditivas: consultas por intervalo de datas somam linhas pré-agregadas
+- Medidas não aditivas (clientes_unicos, nunique por faixa etária) não estão no cubo:
+  são calculadas de forma exata sobre a fatia de datas (busca binária, O(fatia))
+"""
+
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("analytics_api")
+
+# Dimensões pré-agregadas por dia
+CUBE_DIMENSIONS = [
+    'categoria',
+    'nome_produto',
+    'estado_cliente',
+    'genero_cliente',
+    'forma_pagamento',
+    'parcelas',
+    'status_entrega',
+]
+
+# Colunas mínimas para construir o cubo
+REQUIRED_COLUMNS = ['data_venda', 'id_transacao', 'valor_final']
+
+
+class DailyCube:
+    """Agregados diários aditivos (somas e contagens) por dimensão"""
+
+    def __init__(self, totals: pd.DataFrame, by_dimension: Dict[str, pd.DataFrame], has_profit: bool, missing_dates: int = 0):
+        # totals: indexado por dia (ordenado); by_dimension: coluna da dimensão + medidas, ordenado por dia
+        self.totals = totals
+        self.by_dimension = by_dimension
+        self.has_profit = has_profit
+        # Linhas sem data ficam fora do cubo (só entram em consultas sem filtro de data)
+        self.missing_dates = missing_dates
+        self._total_days = totals.index.values.view('int64')
+        self._dimension_days = {
+            dim: frame.pop('dia').values.view('int64') for dim, frame in by_dimension.items()
+        }
+
+    @classmethod
+    def build(cls, frame: pd.DataFrame) -> Optional["DailyCube"]:
+        """Constrói o cubo a partir do frame canônico (ou None se faltarem colunas)"""
+        if frame.empty or not all(col in frame.columns for col in REQUIRED_COLUMNS):
+            return None
+
+        measures = measure_frame(frame)
+        dia = frame['data_venda'].dt.normalize().rename('dia')
+
+        totals = measures.groupby(dia).sum()
+        by_dimension = {}
+        for dim in CUBE_DIMENSIONS:
+            if dim not in frame.columns:
+                continue
+            grouped = measures.groupby([dia, frame[dim]], observed=True).sum()
+            by_dimension[dim] = grouped.reset_index()
+
+        return cls(
+            totals,
+            by_dimension,
+            has_profit='lucro' in measures.columns,
+            missing_dates=int(frame['data_venda'].isna().sum()),
+        )
+
+    def frames(self) -> Dict[str, pd.DataFrame]:
+        """Agregados como frames planos com a coluna 'dia' (para persistência em snapshot)"""
+        frames = {'totals': self.totals.reset_index()}
+        for dim, frame in self.by_dimension.items():
+            frames[dim] = frame.assign(dia=self._dimension_days[dim].view('datetime64[ns]'))
+        return frames
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame], has_profit: bool, missing_dates: int) -> "DailyCube":
+        """Reconstrói o cubo a partir de frames() sem reagrupar as linhas"""
+        frames = dict(frames)
+        # Mesmo caminho do build (frame de medidas + groupby por dia, uma linha por dia):
+        # o layout de blocos se repete e as somas de total() saem idênticas bit a bit
+        flat = frames.pop('totals')
+        measures = pd.DataFrame({col: flat[col].to_numpy() for col in flat.columns if col != 'dia'})
+        totals = measures.groupby(flat['dia']).sum()
+        return cls(totals, frames, has_profit=has_profit, missing_dates=missing_dates)
+
+    def merged(self, other: "DailyCube") -> Optional["DailyCube"]:
+        """
+        Cubo com os agregados de outro cubo somados (append incremental)
+
+        Reagrupa só as linhas dos dois cubos (dia x valor), nunca as linhas do dataset.
+        None se os cubos não tiverem as mesmas medidas e dimensões.
+        """
+        if other.has_profit != self.has_profit or set(other.by_dimension) != set(self.by_dimension):
+            return None
+        mine, theirs = self.frames(), other.frames()
+        if list(mine['totals'].columns) != list(theirs['totals'].columns):
+            return None
+
+        totals = pd.concat([mine.pop('totals'), theirs.pop('totals')], ignore_index=True)
+        frames = {'totals': totals.groupby('dia', sort=True).sum().reset_index()}
+        for dim, frame in mine.items():
+            combined = pd.concat(_unify_categories(dim, frame, theirs[dim]), ignore_index=True)
+            frames[dim] = combined.groupby(['dia', dim], observed=True, sort=True).sum().reset_index()
+        return DailyCube.from_frames(frames, self.has_profit, self.missing_dates + other.missing_dates)
+
+    def __len__(self) -> int:
+        return len(self.totals) + sum(len(frame) for frame in self.by_dimension.values())
+
+    def covers(self, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> bool:
+        """O cubo responde apenas intervalos alinhados em dias inteiros"""
+        if start is None and end is None:
+            return self.missing_dates == 0
+        return all(bound is None or bound == bound.normalize() for bound in (start, end))
+
+    def query(self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> Optional["CubeQuery"]:
+        """Restringe o cubo a um intervalo, ou None se o intervalo não for coberto"""
+        if not self.covers(start, end):
+            return None
+        return CubeQuery(self, start, end)
+
+    def has(self, dim: str) -> bool:
+        return dim in self.by_dimension
+
+    def daily(self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Totais diários no intervalo [start, end)"""
+        lo, hi = _day_range(self._total_days, start, end)
+        return self.totals.iloc[lo:hi]
+
+    def total(self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.Series:
+        """Soma de todas as medidas no intervalo [start, end)"""
+        return self.daily(start, end).sum()
+
+    def group(self, dim: str, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Medidas somadas por valor da dimensão no intervalo [start, end)"""
+        frame = self.by_dimension[dim]
+        lo, hi = _day_range(self._dimension_days[dim], start, end)
+        return frame.iloc[lo:hi].groupby(dim, observed=True).sum()
+
+
+class CubeQuery:
+    """Cubo restrito a um intervalo de datas [start, end)"""
+
+    def __init__(self, cube: DailyCube, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]):
+        self.cube = cube
+        self.start = start
+        self.end = end
+
+    @property
+    def has_profit(self) -> bool:
+        return self.cube.has_profit
+
+    def has(self, dim: str) -> bool:
+        return self.cube.has(dim)
+
+    def daily(self) -> pd.DataFrame:
+        return self.cube.daily(self.start, self.end)
+
+    def total(self) -> pd.Series:
+        return self.cube.total(self.start, self.end)
+
+    def group(self, dim: str) -> pd.DataFrame:
+        return self.cube.group(dim, self.start, self.end)
+
+
+def measure_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Medidas aditivas por linha (somas e contagens de não nulos)"""
+    measures = {
+        'linhas': np.ones(len(frame), dtype='int64'),
+        'transacoes': frame['id_transacao'].notna().astype('int64').to_numpy(),
+        'valor_final': frame['valor_final'].to_numpy(),
+        'valor_final_n': frame['valor_final'].notna().astype('int64').to_numpy(),
+    }
+    if 'quantidade' in frame.columns:
+        measures['quantidade'] = _sum_ready(frame['quantidade'])
+    if 'custo_produto' in frame.columns and 'quantidade' in frame.columns:
+        measures['lucro'] = (frame['valor_final'] - (frame['custo_produto'] * frame['quantidade'])).to_numpy()
+    for col, name in (('avaliacao_produto', 'avaliacao'), ('tempo_entrega_dias', 'tempo_entrega')):
+        if col in frame.columns:
+            measures[name] = frame[col].to_numpy(dtype='float64')
+            measures[f'{name}_n'] = frame[col].notna().astype('int64').to_numpy()
+    return pd.DataFrame(measures, index=frame.index)
+
+
+def _sum_ready(series: pd.Series) -> np.ndarray:
+    """Inteiros como int64 (sem overflow nas somas), demais como float64"""
+    if pd.api.types.is_integer_dtype(series):
+        return series.to_numpy(dtype='int64')
+    return series.to_numpy(dtype='float64')
+
+
+def _unify_categories(dim: str, first: pd.DataFrame, second: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Mesmas categorias nos dois lados (concat de category diferentes viraria object)"""
+    dtypes = (first[dim].dtype, second[dim].dtype)
+    if not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes) or dtypes[0] == dtypes[1]:
+        return first, second
+    dtype = pd.CategoricalDtype(dtypes[0].categories.union(dtypes[1].categories))
+    return first.astype({dim: dtype}), second.astype({dim: dtype})
+
+
+def _day_range(days: np.ndarray, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> Tuple[int, int]:
+    lo = 0 if start is None else int(np.searchsorted(days, start.value, side='left'))
+    hi = len(days) if end is None else int(np.searchsorted(days, end.value, side='left'))
+    return lo, max(lo, hi)
@@ -6,12 +6,15 @@ Módulo de validação e padronização de dados
 - Gera relatório de qualidade
 """
 
+import numpy as np
 import pandas as pd
 import logging
 from typing import Dict, List, Tuple
 from datetime import datetime
 import re
 
+import metrics
+
 logger = logging.getLogger("analytics_api")
 
 # ============================================================================
@@ -58,6 +61,21 @@ VALID_VALUES = {
     'forma_pagamento': ['Cartão Crédito', 'Cartão Débito', 'Boleto', 'PIX', 'Dinheiro', 'Transfer'],
 }
 
+# Formatos de data aceitos, na ordem de tentativa
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%m/%d/%Y',
+    '%d-%m-%Y',
+    '%Y/%m/%d',
+]
+
+# Primeiros caracteres possíveis de um valor numérico (inclui 'inf' e 'nan')
+NUMERIC_PREFIXES = list('0123456789+-.iInN')
+
+# Colunas usadas para pré-selecionar candidatas a duplicata
+DUPLICATE_KEY_COLUMNS = ['id_transacao', 'data_venda', 'valor_final']
+
 # Ranges válidos para campos numéricos
 VALID_RANGES = {
     'quantidade': (1, 1000),
@@ -103,6 +121,35 @@ class ValidationReport:
             'quality_score': self.get_quality_score()
         }
     
+    def merge(self, other: 'ValidationReport') -> 'ValidationReport':
+        """Acumula o relatório de outro bloco (ingestão em chunks)"""
+        self.total_rows += other.total_rows
+        self.rows_after_cleaning += other.rows_after_cleaning
+        self.duplicates_removed += other.duplicates_removed
+        self.date_conversion_errors += other.date_conversion_errors
+        
+        for col, count in other.nulls_by_column.items():
+            self.nulls_by_column[col] = self.nulls_by_column.get(col, 0) + count
+        
+        for col, data in other.out_of_range_values.items():
+            if col in self.out_of_range_values:
+                self.out_of_range_values[col]['count'] += data['count']
+            else:
+                self.out_of_range_values[col] = dict(data)
+        
+        for col, data in other.invalid_values.items():
+            if col in self.invalid_values:
+                current = self.invalid_values[col]
+                current['count'] += data['count']
+                samples = current['invalid_values'] + [v for v in data['invalid_values'] if v not in current['invalid_values']]
+                current['invalid_values'] = samples[:5]
+            else:
+                self.invalid_values[col] = dict(data)
+        
+        self.warnings.extend(other.warnings)
+        self.errors.extend(other.errors)
+        return self
+    
     def get_quality_score(self) -> float:
         """Retorna score de qualidade de 0 a 100"""
         if self.total_rows == 0:
@@ -118,10 +165,12 @@ class ValidationReport:
         quality = 100 - (issues / self.total_rows * 100)
         return max(0, min(100, quality))
 
-def validate_data(data: pd.DataFrame) -> Tuple[pd.DataFrame, ValidationReport]:
+def validate_data(data: pd.DataFrame, copy: bool = True) -> Tuple[pd.DataFrame, ValidationReport]:
     """
     Valida e padroniza dados
     Retorna: (dataframe limpo, relatório de validação)
+    
+    copy=False evita a cópia inicial quando o chamador descarta o original (ex: blocos do upload)
     """
     report = ValidationReport()
     report.total_rows = len(data)
@@ -129,33 +178,40 @@ def validate_data(data: pd.DataFrame) -> Tuple[pd.DataFrame, ValidationReport]:
     logger.info(f"🔍 Iniciando validação de {len(data)} registros")
     
     # 1. Clonar dataframe
-    df = data.copy()
+    df = data.copy() if copy else data
     
     # 2. Remover duplicatas
     initial_count = len(df)
-    df = df.drop_duplicates()
+    with metrics.stage("validate.duplicates"):
+        df = drop_duplicates(df)
     report.duplicates_removed = initial_count - len(df)
     if report.duplicates_removed > 0:
         logger.warning(f"⚠️  {report.duplicates_removed} duplicatas removidas")
         report.warnings.append(f"{report.duplicates_removed} duplicatas removidas")
     
     # 3. Validar e converter tipos
-    df = _standardize_types(df, report)
+    with metrics.stage("validate.types"):
+        df = _standardize_types(df, report)
     
     # 4. Validar datas
-    df = _standardize_dates(df, report)
+    with metrics.stage("validate.dates"):
+        df = _standardize_dates(df, report)
     
     # 5. Normalizar strings
-    df = _normalize_strings(df, report)
+    with metrics.stage("validate.strings"):
+        df = _normalize_strings(df, report)
     
     # 6. Validar ranges numéricos
-    df = _validate_numeric_ranges(df, report)
+    with metrics.stage("validate.ranges"):
+        df = _validate_numeric_ranges(df, report)
     
     # 7. Validar valores categóricos
-    df = _validate_categorical_values(df, report)
+    with metrics.stage("validate.categories"):
+        df = _validate_categorical_values(df, report)
     
     # 8. Remover nulos (após validações)
-    df, nulls = _handle_missing_values(df, report)
+    with metrics.stage("validate.missing"):
+        df, nulls = _handle_missing_values(df, report)
     
     report.rows_after_cleaning = len(df)
     
@@ -194,48 +250,61 @@ def _standardize_types(df: pd.DataFrame, report: ValidationReport) -> pd.DataFra
         if col in df.columns:
             try:
                 if dtype == 'int64':
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(dtype)
+                    df[col] = _to_numeric(df[col]).fillna(0).astype(dtype)
                 else:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
+                    df[col] = _to_numeric(df[col])
             except Exception as e:
                 logger.warning(f"  ⚠️  Erro ao converter {col}: {e}")
                 report.warnings.append(f"Erro ao converter coluna '{col}': {str(e)}")
     
     return df
 
+def drop_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Remove linhas duplicadas (mantém a primeira)
+    - Linhas idênticas têm necessariamente a mesma chave (id_transacao, data, valor): só as
+      linhas com chave repetida passam pela comparação completa
+    """
+    key = [col for col in DUPLICATE_KEY_COLUMNS if col in df.columns]
+    if not key:
+        return df.drop_duplicates()
+    
+    candidates = df.duplicated(subset=key, keep=False).to_numpy()
+    if not candidates.any():
+        return df
+    
+    duplicated = np.zeros(len(df), dtype=bool)
+    duplicated[candidates] = df[candidates].duplicated(keep='first').to_numpy()
+    return df[~duplicated]
+
+def _to_numeric(values: pd.Series) -> pd.Series:
+    """
+    Equivalente a pd.to_numeric(errors='coerce') convertendo cada valor distinto uma vez
+    - Valores que não começam como número (ex: 'TXN0001') viram NaN sem tentativa de parse
+    """
+    if not pd.api.types.is_object_dtype(values):
+        return pd.to_numeric(values, errors='coerce')
+    
+    codes, uniques = pd.factorize(values)
+    uniques = np.asarray(uniques, dtype=object)
+    first_char = np.char.lstrip(uniques.astype(str)).astype('U1')
+    uniques = pd.Series(uniques, dtype=object).where(np.isin(first_char, NUMERIC_PREFIXES))
+    
+    converted = pd.to_numeric(uniques, errors='coerce').to_numpy()
+    if (codes == -1).any():
+        # Código -1 (nulo) aponta para o último elemento (NaN)
+        converted = np.append(converted.astype('float64'), np.nan)
+    return pd.Series(converted[codes], index=values.index, name=values.name)
+
 def _standardize_dates(df: pd.DataFrame, report: ValidationReport) -> pd.DataFrame:
-    """Padroniza datas para formato YYYY-MM-DD"""
+    """Padroniza datas para datetime (parsing vetorizado, uma vez por valor distinto)"""
     logger.debug("  Padronizando datas...")
     
     if 'data_venda' not in df.columns:
         return df
     
-    def parse_date(date_str):
-        """Tenta parsing em múltiplos formatos"""
-        if pd.isna(date_str):
-            return None
-        
-        date_str = str(date_str).strip()
-        
-        # Formatos a tentar
-        formats = [
-            '%Y-%m-%d',
-            '%d/%m/%Y',
-            '%m/%d/%Y',
-            '%d-%m-%Y',
-            '%Y/%m/%d',
-        ]
-        
-        for fmt in formats:
-            try:
-                return pd.to_datetime(date_str, format=fmt)
-            except:
-                continue
-        
-        return None
-    
-    # Aplicar parsing
-    df['data_venda'] = df['data_venda'].apply(parse_date)
+    if not pd.api.types.is_datetime64_any_dtype(df['data_venda']):
+        df['data_venda'] = _parse_dates(df['data_venda'])
     
     # Contar erros de conversão
     errors = df['data_venda'].isna().sum()
@@ -249,8 +318,32 @@ def _standardize_dates(df: pd.DataFrame, report: ValidationReport) -> pd.DataFra
     
     return df
 
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """
+    Tenta cada formato de DATE_FORMATS de forma vetorizada
+    - Só os valores distintos são convertidos (datas se repetem muito)
+    - Cada formato só é tentado nos valores que falharam nos anteriores
+    """
+    codes, uniques = pd.factorize(values)
+    strings = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    
+    parsed = pd.Series(pd.NaT, index=strings.index, dtype='datetime64[ns]')
+    pending = pd.Series(True, index=strings.index)
+    
+    for fmt in DATE_FORMATS:
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(strings[pending], format=fmt, errors='coerce')
+        converted = attempt.notna()
+        parsed[attempt.index[converted]] = attempt[converted]
+        pending[attempt.index[converted]] = False
+    
+    # Código -1 (nulo) aponta para o último elemento (NaT)
+    result = np.append(parsed.to_numpy(), np.datetime64('NaT', 'ns'))[codes]
+    return pd.Series(result, index=values.index, name=values.name)
+
 def _normalize_strings(df: pd.DataFrame, report: ValidationReport) -> pd.DataFrame:
-    """Normaliza strings: trim, capitalize, remove extras"""
+    """Normaliza strings: trim, capitalize, remove extras (uma vez por valor distinto)"""
     logger.debug("  Normalizando strings...")
     
     string_columns = [
@@ -260,10 +353,17 @@ def _normalize_strings(df: pd.DataFrame, report: ValidationReport) -> pd.DataFra
     
     for col in string_columns:
         if col in df.columns:
-            df[col] = df[col].apply(lambda x: str(x).strip().title() if pd.notna(x) else x)
+            df[col] = _map_unique(df[col], lambda x: str(x).strip().title())
     
     return df
 
+def _map_unique(values: pd.Series, fn) -> pd.Series:
+    """Aplica fn uma vez por valor distinto e expande pelos códigos (mapa categórico)"""
+    codes, uniques = pd.factorize(values)
+    mapped = np.array([fn(value) for value in uniques] + [np.nan], dtype=object)
+    # Código -1 (nulo) aponta para o último elemento (NaN)
+    return pd.Series(mapped[codes], index=values.index, name=values.name)
+
 def _validate_numeric_ranges(df: pd.DataFrame, report: ValidationReport) -> pd.DataFrame:
     """Valida se valores numéricos estão dentro de ranges aceitáveis"""
     logger.debug("  Validando ranges numéricos...")
@@ -328,9 +428,11 @@ def _handle_missing_values(df: pd.DataFrame, report: ValidationReport) -> Tuple[
     
     nulls_by_column = {}
     
+    # Máscara de nulos calculada uma vez (contagem por coluna e remoção de linhas)
+    null_mask = df.isna()
+    
     # Contar nulos por coluna
-    for col in df.columns:
-        null_count = df[col].isna().sum()
+    for col, null_count in null_mask.sum().items():
         if null_count > 0:
             nulls_by_column[col] = int(null_count)
     
@@ -340,7 +442,7 @@ def _handle_missing_values(df: pd.DataFrame, report: ValidationReport) -> Tuple[
         
         # Remover linhas com qualquer valor nulo
         initial_count = len(df)
-        df = df.dropna()
+        df = df[~null_mask.any(axis=1).to_numpy()]
         removed = initial_count - len(df)
         
         if removed > 0:
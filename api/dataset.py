@@ -0,0 +1,587 @@
+"""
+Dataset canônico em memória
+- Converte data_venda para datetime64 uma única vez (no load/upload)
+- Colunas de dimensão armazenadas como category
+- Colunas inteiras com downcast
+- Ordenado por data para que os endpoints trabalhem sem cópia nem re-parsing
+- Índice de datas com busca binária (searchsorted) para fatias sem cópia
+- Cubo diário pré-agregado para métricas filtradas por data
+- Append incremental: só as linhas novas são tipadas, deduplicadas (índice hash da chave
+  de duplicatas) e agregadas; o cubo existente é somado ao cubo do delta
+- Permutações de ordenação por coluna (SortIndex), construídas na primeira consulta ordenada
+- cliente_id sempre como category: códigos inteiros para contagem exata de distintos e
+  sketches HyperLogLog diários (CustomerSketch) construídos na primeira consulta aproximada
+- Índices de dimensão (DimensionIndex): dicionário rótulo -> código e lista de linhas por
+  código, para filtros combinados por interseção de listas em vez de comparação de textos
+- Estatísticas das colunas numéricas (ColumnStats, /analysis) calculadas no build e no append
+"""
+
+import itertools
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from cube import DailyCube
+from data_validator import DUPLICATE_KEY_COLUMNS
+from sketch import CustomerSketch
+from stats import ColumnStats
+
+logger = logging.getLogger("analytics_api")
+
+# ============================================================================
+# DEFINIÇÕES DE TIPOS
+# ============================================================================
+
+# Colunas de baixa cardinalidade usadas em agrupamentos e filtros
+DIMENSION_COLUMNS = [
+    'categoria',
+    'nome_produto',
+    'marca',
+    'genero_cliente',
+    'cidade_cliente',
+    'estado_cliente',
+    'regiao',
+    'canal_venda',
+    'forma_pagamento',
+    'status_entrega',
+    'dia_semana',
+    'periodo_dia',
+]
+
+# Outras colunas texto viram category se repetirem bastante
+CATEGORY_CARDINALITY_RATIO = 0.5
+
+# Identificadores sempre codificados como inteiros (category), qualquer que seja a cardinalidade
+ENCODED_ID_COLUMNS = ['cliente_id']
+
+# Dimensões com índice construído junto com o dataset (as demais sob demanda)
+INDEXED_DIMENSIONS = [
+    'regiao',
+    'categoria',
+    'estado_cliente',
+    'canal_venda',
+    'forma_pagamento',
+    'status_entrega',
+    'genero_cliente',
+    'marca',
+]
+
+# Chave de NaT nas permutações e na intercalação por data: ordena depois de qualquer data
+NULL_DATE_KEY = np.iinfo('int64').max
+
+# Contador global de versões do dataset (usado para invalidar derivados)
+_version_counter = itertools.count(1)
+
+
+class SchemaMismatchError(Exception):
+    """Linhas do append com colunas ou tipos incompatíveis com o dataset existente"""
+
+
+class DateIndex:
+    """Índice de datas: array int64 ordenado de data_venda com busca binária"""
+
+    def __init__(self, dates: pd.Series):
+        values = dates.to_numpy(dtype='datetime64[ns]').view('int64')
+        # NaT fica no final após a ordenação e não participa das buscas
+        self.valid = int(len(values) - dates.isna().sum())
+        self.values = values[:self.valid]
+        self.size = len(values)
+
+    def row_range(self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> Tuple[int, int]:
+        """Retorna (inicio, fim) das linhas com start <= data < end em O(log n)"""
+        if start is None and end is None:
+            return 0, self.size
+        lo = 0 if start is None else int(np.searchsorted(self.values, start.value, side='left'))
+        hi = self.valid if end is None else int(np.searchsorted(self.values, end.value, side='left'))
+        return lo, max(lo, hi)
+
+
+class KeyIndex:
+    """Índice hash da chave de duplicatas: hashes uint64 ordenados, consultados com busca binária"""
+
+    def __init__(self, hashes: np.ndarray):
+        self.hashes = hashes
+
+    @classmethod
+    def build(cls, frame: pd.DataFrame) -> "KeyIndex":
+        return cls(np.sort(hash_keys(frame)))
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """Máscara dos hashes já presentes no índice, em O(m log n)"""
+        if not len(self.hashes):
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.searchsorted(self.hashes, hashes).clip(max=len(self.hashes) - 1)
+        return self.hashes[positions] == hashes
+
+    def merged(self, hashes: np.ndarray) -> "KeyIndex":
+        """Novo índice com os hashes inseridos nas posições ordenadas (sem reordenar o índice)"""
+        hashes = np.sort(hashes)
+        return KeyIndex(np.insert(self.hashes, np.searchsorted(self.hashes, hashes), hashes))
+
+
+class SortIndex:
+    """
+    Permutação estável que ordena o frame por uma coluna (nulos no final) e as chaves ordenadas
+
+    Texto e category são ordenados pelo rótulo; a chave de cada linha é o posto do rótulo.
+    Empates ficam na ordem das linhas, então (valor, linha) identifica cada posição.
+    """
+
+    def __init__(self, column: pd.Series):
+        self.labels, keys = _sort_keys(column)
+        self.is_date = pd.api.types.is_datetime64_any_dtype(column)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.order = order.astype(np.int32) if len(order) < np.iinfo(np.int32).max else order
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def value_at(self, position: int) -> Any:
+        """Valor (JSON) da chave na posição da permutação"""
+        key = self.keys[position]
+        if self.labels is not None:
+            return None if key == len(self.labels) else str(self.labels[key])
+        if self.is_date:
+            return None if key == NULL_DATE_KEY else pd.Timestamp(int(key)).isoformat()
+        if self.keys.dtype.kind == 'i':
+            return int(key)
+        return None if np.isnan(key) else float(key)
+
+    def bound(self, value: Any, row: int, side: str) -> int:
+        """Posição da chave (valor, linha) na permutação: side='left' antes dela, 'right' logo depois"""
+        key, present = self._encode(value)
+        lo = int(np.searchsorted(self.keys, key, side='left'))
+        hi = int(np.searchsorted(self.keys, key, side='right')) if present else lo
+        return lo + int(np.searchsorted(self.order[lo:hi], row, side=side))
+
+    def key_range(self, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> Tuple[int, int]:
+        """Posições [inicio, fim) com start <= data < end (só para colunas de data)"""
+        lo = 0 if start is None else int(np.searchsorted(self.keys, start.value, side='left'))
+        hi = len(self.keys) if end is None else int(np.searchsorted(self.keys, end.value, side='left'))
+        return lo, max(lo, hi)
+
+    def _encode(self, value: Any) -> Tuple[Any, bool]:
+        """Chave interna do valor e se ela pode existir no índice (rótulo conhecido)"""
+        if self.labels is not None:
+            if value is None:
+                return len(self.labels), True
+            position = int(np.searchsorted(self.labels, str(value)))
+            return position, position < len(self.labels) and self.labels[position] == str(value)
+        if self.is_date:
+            return (NULL_DATE_KEY if value is None else pd.Timestamp(value).value), True
+        if value is None:
+            return np.nan, self.keys.dtype.kind == 'f'
+        return (float(value) if self.keys.dtype.kind == 'f' else int(value)), True
+
+
+class DimensionIndex:
+    """
+    Índice invertido de uma coluna de dimensão
+
+    Os códigos são os da própria coluna category (dicionário já existente); o índice guarda
+    os rótulos em minúsculas -> códigos e as linhas de cada código em ordem crescente
+    (posting lists contíguas em `rows`, delimitadas por `offsets`).
+    """
+
+    def __init__(self, column: pd.Series):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes, labels = column.cat.codes.to_numpy(), column.cat.categories
+        else:
+            codes, labels = pd.factorize(column, use_na_sentinel=True)
+        self.codes: Dict[str, List[int]] = {}
+        for code, label in enumerate(pd.Index(labels).astype(str)):
+            self.codes.setdefault(label.lower(), []).append(code)
+        # Posição 0 dos contadores reservada aos nulos (código -1)
+        counts = np.bincount(codes.astype(np.int64) + 1, minlength=len(labels) + 1)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        rows = np.argsort(codes, kind='stable')
+        self.rows = rows.astype(np.int32) if len(rows) < np.iinfo(np.int32).max else rows
+
+    def lookup(self, values: List[str], lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        """Linhas em [lo, hi) com algum dos valores (sem diferenciar maiúsculas), em ordem crescente"""
+        postings = []
+        for value in values:
+            for code in self.codes.get(value.lower(), ()):
+                rows = self.rows[self.offsets[code + 1]:self.offsets[code + 2]]
+                start = int(np.searchsorted(rows, lo, side='left')) if lo else 0
+                stop = len(rows) if hi is None else int(np.searchsorted(rows, hi, side='left'))
+                postings.append(rows[start:stop])
+        if not postings:
+            return np.empty(0, dtype=self.rows.dtype)
+        if len(postings) == 1:
+            return postings[0]
+        return np.sort(np.concatenate(postings))
+
+    def memory_usage(self) -> int:
+        return int(self.rows.nbytes + self.offsets.nbytes)
+
+
+class Dataset:
+    """Dataset tipado e ordenado por data, construído uma vez e somente leitura"""
+
+    def __init__(self, frame: pd.DataFrame, cube: Optional[DailyCube] = None):
+        self.frame = frame
+        self.version = next(_version_counter)
+        self.date_index = DateIndex(frame['data_venda']) if 'data_venda' in frame.columns else None
+        # Cubo já pronto quando o dataset vem de um snapshot
+        self.cube = cube if cube is not None else DailyCube.build(frame)
+        self._key_index: Optional[KeyIndex] = None
+        self._sort_indexes: Dict[str, SortIndex] = {}
+        self._dimension_indexes: Dict[str, DimensionIndex] = {}
+        self._customer_sketch: Optional[CustomerSketch] = None
+        self._sketch_built = False
+        self._column_stats: Optional[ColumnStats] = None
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def empty(self) -> bool:
+        return self.frame.empty
+
+    def slice_dates(self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Fatia [start, end) do frame por posição (view, sem cópia)"""
+        if self.date_index is None:
+            return self.frame
+        lo, hi = self.date_index.row_range(start, end)
+        if lo == 0 and hi == len(self.frame):
+            return self.frame
+        return self.frame.iloc[lo:hi]
+
+    def memory_usage(self) -> int:
+        """Memória ocupada pelo frame em bytes"""
+        return int(self.frame.memory_usage(deep=True).sum())
+
+    @property
+    def key_index(self) -> KeyIndex:
+        """Índice hash da chave de duplicatas, construído no primeiro append"""
+        if self._key_index is None:
+            self._key_index = KeyIndex.build(self.frame)
+        return self._key_index
+
+    def sort_index(self, column: str) -> SortIndex:
+        """Permutação de ordenação da coluna, construída na primeira consulta que a usa"""
+        index = self._sort_indexes.get(column)
+        if index is None:
+            index = self._sort_indexes[column] = SortIndex(self.frame[column])
+        return index
+
+    @property
+    def customer_sketch(self) -> Optional[CustomerSketch]:
+        """Sketches diários de clientes distintos, construídos na primeira consulta aproximada"""
+        if not self._sketch_built:
+            self._customer_sketch = CustomerSketch.build(self.frame)
+            self._sketch_built = True
+        return self._customer_sketch
+
+    @property
+    def column_stats(self) -> ColumnStats:
+        """Estatísticas de /analysis (prontas após build/append; calculadas na primeira consulta nos demais casos)"""
+        return self.build_column_stats()
+
+    @property
+    def has_column_stats(self) -> bool:
+        return self._column_stats is not None
+
+    def dimension_index(self, column: str) -> DimensionIndex:
+        """Índice invertido da coluna (INDEXED_DIMENSIONS já vêm prontos do build)"""
+        index = self._dimension_indexes.get(column)
+        if index is None:
+            index = self._dimension_indexes[column] = DimensionIndex(self.frame[column])
+        return index
+
+    def build_column_stats(self) -> ColumnStats:
+        if self._column_stats is None:
+            self._column_stats = ColumnStats.build(self.frame)
+        return self._column_stats
+
+    def build_dimension_indexes(self) -> None:
+        for column in INDEXED_DIMENSIONS:
+            if column in self.frame.columns:
+                self.dimension_index(column)
+
+    def inherit_indexes(self, other: "Dataset") -> None:
+        """Reaproveita índices derivados de outra cópia das mesmas linhas (ex: versão mapeada do snapshot)"""
+        if len(other) != len(self):
+            return
+        if self._key_index is None:
+            self._key_index = other._key_index
+        for column, index in other._sort_indexes.items():
+            self._sort_indexes.setdefault(column, index)
+        for column, index in other._dimension_indexes.items():
+            self._dimension_indexes.setdefault(column, index)
+        if not self._sketch_built and other._sketch_built:
+            self._customer_sketch, self._sketch_built = other._customer_sketch, True
+        if self._column_stats is None:
+            self._column_stats = other._column_stats
+
+
+# ============================================================================
+# CONSTRUÇÃO
+# ============================================================================
+
+def parse_date_range(start_date: Optional[str] = None, end_date: Optional[str] = None) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+    """Converte strings de filtro em limites [start, end) - end inclui o dia inteiro"""
+    start = pd.to_datetime(start_date) if start_date else None
+    end = pd.to_datetime(end_date) + pd.Timedelta(days=1) if end_date else None
+    return start, end
+
+
+def build_dataset(data: pd.DataFrame) -> Dataset:
+    """Constrói o dataset canônico a partir de um DataFrame bruto ou validado"""
+    frame = prepare_frame(data)
+    dataset = Dataset(frame)
+    dataset.build_dimension_indexes()
+    # Estatísticas de /analysis calculadas junto com o dataset, não na primeira requisição
+    dataset.build_column_stats()
+    logger.info(
+        f"🧱 Dataset v{dataset.version} construído: {len(frame)} registros, "
+        f"{dataset.memory_usage() / (1024 * 1024):.2f} MB"
+    )
+    return dataset
+
+
+def append_dataset(dataset: Dataset, data: pd.DataFrame) -> Tuple[Dataset, int]:
+    """
+    Acrescenta linhas já validadas ao dataset e retorna (novo dataset, duplicatas ignoradas)
+
+    Só o delta é tipado, deduplicado contra o índice hash e agregado; as linhas existentes
+    são apenas copiadas para o novo frame (sem re-parsing, re-tipagem nem reagrupamento).
+    """
+    if dataset.empty:
+        return build_dataset(data), 0
+
+    delta = prepare_frame(data)
+    if set(delta.columns) != set(dataset.frame.columns):
+        missing = sorted(set(dataset.frame.columns) - set(delta.columns))
+        extra = sorted(set(delta.columns) - set(dataset.frame.columns))
+        raise SchemaMismatchError(f"Colunas diferentes do dataset existente (faltando: {missing}, extras: {extra})")
+    frame, delta = _align_dtypes(dataset.frame, delta[list(dataset.frame.columns)])
+
+    hashes = hash_keys(delta)
+    duplicated = dataset.key_index.contains(hashes)
+    duplicates = int(duplicated.sum())
+    if duplicates:
+        delta, hashes = delta[~duplicated], hashes[~duplicated]
+    if delta.empty:
+        return dataset, duplicates
+
+    merged = _merge_by_date(frame, delta)
+    cube = None
+    if dataset.cube is not None:
+        delta_cube = DailyCube.build(delta)
+        cube = dataset.cube.merged(delta_cube) if delta_cube is not None else None
+    appended = Dataset(merged, cube=cube)
+    appended._key_index = dataset.key_index.merged(hashes)
+    appended.build_dimension_indexes()
+    appended.build_column_stats()
+    if dataset._customer_sketch is not None:
+        # Sketches do delta combinados aos existentes (máximo por registro)
+        delta_sketch = CustomerSketch.build(delta)
+        if delta_sketch is not None:
+            appended._customer_sketch = dataset._customer_sketch.merged(delta_sketch)
+            appended._sketch_built = appended._customer_sketch is not None
+    logger.info(
+        f"➕ Dataset v{appended.version}: {len(delta)} registros acrescentados a v{dataset.version} "
+        f"({duplicates} duplicatas ignoradas, {len(merged)} no total)"
+    )
+    return appended, duplicates
+
+
+def hash_keys(frame: pd.DataFrame) -> np.ndarray:
+    """Hash uint64 da chave de duplicatas de cada linha (todas as colunas se a chave faltar)"""
+    key = [col for col in DUPLICATE_KEY_COLUMNS if col in frame.columns] or list(frame.columns)
+    return pd.util.hash_pandas_object(frame[key], index=False).to_numpy()
+
+
+def prepare_frame(data: pd.DataFrame) -> pd.DataFrame:
+    """Aplica tipagem, cálculo de lucro e ordenação por data"""
+    if data.empty:
+        return data.reset_index(drop=True)
+
+    df = data.reset_index(drop=True)
+
+    # Calcular lucro se não existir
+    if 'lucro' not in df.columns and 'valor_final' in df.columns and 'margem_lucro' in df.columns:
+        df['lucro'] = df['valor_final'] * df['margem_lucro']
+
+    df = _convert_dates(df)
+    df = _convert_categories(df)
+    df = _downcast_integers(df)
+
+    # Ordenação estável para preservar a ordem original em datas iguais
+    if 'data_venda' in df.columns and not df['data_venda'].is_monotonic_increasing:
+        df = df.sort_values('data_venda', kind='mergesort', ignore_index=True)
+
+    return df
+
+
+def prepare_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipagem leve de um bloco do upload (datas e dimensões) antes de acumulá-lo"""
+    conversions = {}
+    if 'data_venda' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['data_venda']):
+        conversions['data_venda'] = pd.to_datetime(df['data_venda'], errors='coerce')
+    for col in DIMENSION_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            conversions[col] = df[col].astype('category')
+    # assign: o bloco validado pode ser uma fatia do bloco lido
+    return df.assign(**conversions) if conversions else df
+
+
+def concat_frames(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatena blocos preservando colunas category (união das categorias, sem passar por object)
+
+    Os blocos da lista são substituídos pela versão com categorias unificadas, para que
+    cada original possa ser liberado antes da concatenação.
+    """
+    if not parts:
+        return pd.DataFrame()
+
+    shared = {}
+    for col in parts[0].columns:
+        dtypes = [part[col].dtype if col in part.columns else None for part in parts]
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            categories = union_categoricals([pd.Categorical([], dtype=dtype) for dtype in dtypes]).categories
+            shared[col] = pd.CategoricalDtype(categories)
+
+    for i, part in enumerate(parts):
+        parts[i] = part.astype(shared, copy=False)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _align_dtypes(frame: pd.DataFrame, delta: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Converte o delta para os tipos do frame existente
+
+    category e object seguem o frame; numéricos são promovidos (ex: int8 que não comporta
+    os novos valores) e só então a coluna existente é copiada.
+    """
+    frame_casts, delta_casts = {}, {}
+    for col in frame.columns:
+        current, incoming = frame[col].dtype, delta[col].dtype
+        if current == incoming:
+            continue
+        if isinstance(current, pd.CategoricalDtype):
+            if not isinstance(incoming, pd.CategoricalDtype):
+                delta_casts[col] = 'category'
+        elif pd.api.types.is_object_dtype(current):
+            delta_casts[col] = object
+        else:
+            try:
+                target = np.promote_types(current, incoming)
+            except TypeError:
+                raise SchemaMismatchError(f"Coluna '{col}' com tipo {incoming}, esperado {current}")
+            if target != current:
+                frame_casts[col] = target
+            delta_casts[col] = target
+    if frame_casts:
+        frame = frame.astype(frame_casts)
+    if delta_casts:
+        delta = delta.astype(delta_casts)
+
+    # Ex: cliente_id texto no histórico e inteiro no lote: categorias no tipo das do frame
+    renamed = {}
+    for col in frame.columns:
+        current, incoming = frame[col].dtype, delta[col].dtype
+        if isinstance(current, pd.CategoricalDtype) and incoming.categories.dtype != current.categories.dtype:
+            renamed[col] = delta[col].cat.rename_categories(_cast_categories(incoming.categories, current.categories.dtype))
+    if renamed:
+        delta = delta.assign(**renamed)
+    return frame, delta
+
+
+def _cast_categories(categories: pd.Index, dtype) -> pd.Index:
+    """Categorias do lote convertidas para o tipo das categorias existentes"""
+    try:
+        converted = categories.astype(str) if pd.api.types.is_object_dtype(dtype) else categories.astype(dtype)
+    except (TypeError, ValueError):
+        raise SchemaMismatchError(f"Categorias do tipo {categories.dtype}, esperado {dtype}")
+    if not converted.is_unique:
+        raise SchemaMismatchError(f"Categorias do tipo {categories.dtype} não convertem para {dtype} sem colisões")
+    return converted
+
+
+def _merge_by_date(frame: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Concatena mantendo a ordem por data (NaT no final); delta posterior ao histórico só é anexado"""
+    merged = concat_frames([frame, delta])
+    if 'data_venda' not in merged.columns:
+        return merged
+
+    dates = merged['data_venda']
+    keys = dates.to_numpy(dtype='datetime64[ns]').view('int64').copy()
+    keys[dates.isna().to_numpy()] = NULL_DATE_KEY
+    if (np.diff(keys) >= 0).all():
+        return merged
+    # Duas sequências já ordenadas: o timsort estável as intercala em tempo linear
+    order = np.argsort(keys, kind='stable')
+    return merged.take(order).reset_index(drop=True)
+
+
+def _sort_keys(column: pd.Series) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """
+    (rótulos ordenados, chave por linha) para montar a permutação de ordenação
+
+    Números viram int64/float64 (NaN no final), datas o int64 em ns (NaT no final) e
+    texto/category o posto do rótulo entre os rótulos ordenados (nulo no final).
+    """
+    dtype = column.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        keys = column.to_numpy(dtype='datetime64[ns]').view('int64').copy()
+        keys[column.isna().to_numpy()] = NULL_DATE_KEY
+        return None, keys
+    if pd.api.types.is_bool_dtype(dtype) and not column.hasnans:
+        return None, column.to_numpy(dtype=np.int64)
+    if pd.api.types.is_integer_dtype(dtype) and not column.hasnans:
+        return None, column.to_numpy(dtype=np.int64)
+    if pd.api.types.is_numeric_dtype(dtype):
+        return None, column.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    labels = np.asarray(pd.Index(uniques).astype(str), dtype=object)
+    ordering = np.argsort(labels, kind='stable')
+    # rank[código] = posto do rótulo; o código -1 (nulo) cai na última posição
+    rank = np.empty(len(labels) + 1, dtype=np.int64)
+    rank[ordering] = np.arange(len(labels))
+    rank[-1] = len(labels)
+    return labels[ordering], rank[codes]
+
+
+def _convert_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte data_venda para datetime64 (uma única vez)"""
+    if 'data_venda' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['data_venda']):
+        df['data_venda'] = pd.to_datetime(df['data_venda'], errors='coerce')
+    return df
+
+
+def _convert_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte dimensões e colunas texto repetitivas para category"""
+    for col in _category_columns(df):
+        df[col] = df[col].astype('category')
+    return df
+
+
+def _category_columns(df: pd.DataFrame) -> List[str]:
+    columns = []
+    for col in df.columns:
+        if not pd.api.types.is_object_dtype(df[col]) and not pd.api.types.is_string_dtype(df[col]):
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        if col in DIMENSION_COLUMNS or col in ENCODED_ID_COLUMNS or df[col].nunique() <= len(df) * CATEGORY_CARDINALITY_RATIO:
+            columns.append(col)
+    return columns
+
+
+def _downcast_integers(df: pd.DataFrame) -> pd.DataFrame:
+    """Reduz colunas inteiras ao menor tipo que comporta os valores"""
+    for col in df.select_dtypes(include=['integer']).columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
@@ -0,0 +1,160 @@
+"""
+Ingestão em blocos dos arquivos enviados em /upload
+- Lê o arquivo direto do upload (spool em disco), sem carregar tudo em um único bytes
+- Encoding detectado uma vez a partir de uma amostra do início do arquivo
+- Cada bloco é parseado, validado e tipado antes do próximo ser lido
+- Limite de linhas verificado à medida que os blocos chegam
+- Relatórios de validação dos blocos acumulados em um único relatório
+"""
+
+import codecs
+import logging
+from itertools import islice
+from typing import BinaryIO, Iterator, List, Tuple
+
+import pandas as pd
+
+from data_validator import ValidationReport, drop_duplicates, validate_data
+from dataset import concat_frames, prepare_chunk
+
+logger = logging.getLogger("analytics_api")
+
+# Amostra usada para detectar o encoding
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# Encoding usado quando a amostra não é UTF-8 válido (decodifica qualquer byte)
+FALLBACK_ENCODING = 'latin-1'
+
+
+class UploadTooLargeError(Exception):
+    """Arquivo com mais linhas que o limite configurado"""
+
+    def __init__(self, rows: int, max_rows: int):
+        super().__init__(f"{rows} linhas recebidas (máximo {max_rows})")
+        self.rows = rows
+        self.max_rows = max_rows
+
+
+class EmptyUploadError(Exception):
+    """Arquivo sem nenhuma linha de dados"""
+
+
+# ============================================================================
+# LEITURA
+# ============================================================================
+
+def detect_encoding(sample: bytes) -> str:
+    """Detecta o encoding pela amostra: UTF-8 (com ou sem BOM) ou Latin-1"""
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Caractere multibyte cortado no fim da amostra ainda é UTF-8 válido
+        if e.reason != 'unexpected end of data':
+            return FALLBACK_ENCODING
+    return 'utf-8-sig' if sample.startswith(codecs.BOM_UTF8) else 'utf-8'
+
+
+def iter_csv_chunks(fileobj: BinaryIO, encoding: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Blocos de até chunk_rows linhas do CSV"""
+    try:
+        reader = pd.read_csv(fileobj, encoding=encoding, chunksize=chunk_rows)
+    except pd.errors.EmptyDataError:
+        return
+    with reader:
+        yield from reader
+
+
+def iter_excel_chunks(fileobj: BinaryIO, file_name: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Blocos de até chunk_rows linhas da primeira planilha"""
+    if not file_name.endswith('.xlsx'):
+        # .xls não tem leitura em modo streaming: lê a planilha e divide em blocos
+        frame = pd.read_excel(fileobj)
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start:start + chunk_rows]
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        rows = (row for row in rows if any(value is not None for value in row))
+        while True:
+            batch = list(islice(rows, chunk_rows))
+            if not batch:
+                break
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+# ============================================================================
+# INGESTÃO
+# ============================================================================
+
+def ingest_csv(fileobj: BinaryIO, max_rows: int, chunk_rows: int) -> Tuple[pd.DataFrame, ValidationReport]:
+    """Lê, valida e tipa um CSV bloco a bloco"""
+    sample = fileobj.read(ENCODING_SAMPLE_BYTES)
+    encoding = detect_encoding(sample)
+    logger.debug(f"Encoding detectado: {encoding}")
+
+    try:
+        fileobj.seek(0)
+        return ingest_chunks(iter_csv_chunks(fileobj, encoding, chunk_rows), max_rows)
+    except UnicodeDecodeError:
+        if encoding == FALLBACK_ENCODING:
+            raise
+        # Byte inválido depois da amostra: recomeça uma única vez com Latin-1
+        logger.warning(f"⚠️ Arquivo não é {encoding} além da amostra inicial, relendo como {FALLBACK_ENCODING}")
+        fileobj.seek(0)
+        return ingest_chunks(iter_csv_chunks(fileobj, FALLBACK_ENCODING, chunk_rows), max_rows)
+
+
+def ingest_excel(fileobj: BinaryIO, file_name: str, max_rows: int, chunk_rows: int) -> Tuple[pd.DataFrame, ValidationReport]:
+    """Lê, valida e tipa uma planilha XLSX/XLS bloco a bloco"""
+    return ingest_chunks(iter_excel_chunks(fileobj, file_name, chunk_rows), max_rows)
+
+
+def ingest_chunks(chunks: Iterator[pd.DataFrame], max_rows: int) -> Tuple[pd.DataFrame, ValidationReport]:
+    """
+    Valida cada bloco assim que é lido e acumula apenas o resultado tipado
+
+    Duplicatas entre blocos diferentes são removidas no final, sobre os dados já validados.
+    """
+    report = ValidationReport()
+    parts: List[pd.DataFrame] = []
+    received = 0
+
+    for chunk in chunks:
+        first_row = received + 1
+        received += len(chunk)
+        if received > max_rows:
+            raise UploadTooLargeError(received, max_rows)
+
+        cleaned, chunk_report = validate_data(chunk, copy=False)
+        if chunk_report.warnings:
+            chunk_report.warnings = [f"Linhas {first_row}-{received}: {warning}" for warning in chunk_report.warnings]
+        report.merge(chunk_report)
+        parts.append(prepare_chunk(cleaned))
+
+    if received == 0:
+        raise EmptyUploadError()
+
+    frame = concat_frames(parts)
+    del parts
+
+    before = len(frame)
+    frame = drop_duplicates(frame)
+    duplicates = before - len(frame)
+    if duplicates > 0:
+        logger.warning(f"⚠️  {duplicates} duplicatas entre blocos removidas")
+        report.duplicates_removed += duplicates
+        report.rows_after_cleaning -= duplicates
+        report.warnings.append(f"{duplicates} duplicatas removidas entre blocos")
+
+    logger.info(f"📦 {received} linhas lidas em blocos → {len(frame)} registros válidos")
+    return frame, report
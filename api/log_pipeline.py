@@ -0,0 +1,169 @@
+"""
+Pipeline de logging assíncrono
+- O logger só enfileira o registro (QueueHandler); arquivo com rotação e console são
+  escritos por uma thread em segundo plano (QueueListener): sem E/S de disco no event loop
+- Fila limitada: cheia, o registro é descartado e contado, nunca bloqueia quem loga
+- Arquivo em JSON por linha (LOG_FORMAT=json) com nível, origem, thread e exceção
+- DEBUG amostrado por ponto de chamada (1 a cada LOG_DEBUG_SAMPLE_EVERY): mensagens de
+  alta frequência (ex: uma por requisição) não dominam o arquivo
+- Limite de registros por segundo por nível (LOG_RATE_LIMITS); descartes aparecem no
+  próximo registro aceito do nível (campo suppressed) e em /metrics
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+# Formato de texto (console e LOG_FORMAT=text)
+TEXT_FORMAT = '[%(asctime)s] %(levelname)-8s [%(name)s:%(funcName)s:%(lineno)d] %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato de texto original, com a contagem de descartes quando houver"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} [+{suppressed} suprimidas]" if suppressed else text
+
+
+class DebugSampler(logging.Filter):
+    """Deixa passar 1 a cada `every` registros DEBUG de cada ponto de chamada (o primeiro sempre)"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen: Dict[tuple, int] = {}
+        self.sampled_out = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            seen = self._seen.get(site, 0)
+            self._seen[site] = seen + 1
+            if seen % self.every:
+                self.sampled_out += 1
+                return False
+        return True
+
+
+class LevelRateLimiter(logging.Filter):
+    """Token bucket por nível (registros/s, rajada de 1 s); níveis sem limite sempre passam"""
+
+    def __init__(self, limits: Dict[int, float]):
+        super().__init__()
+        self.limits = limits
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._buckets = {level: [rate, now] for level, rate in limits.items()}
+        self._suppressed = {level: 0 for level in limits}
+        self.dropped = {level: 0 for level in limits}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.limits.get(record.levelno)
+        if rate is None:
+            return True
+        with self._lock:
+            bucket = self._buckets[record.levelno]
+            now = time.monotonic()
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                self._suppressed[record.levelno] += 1
+                self.dropped[record.levelno] += 1
+                return False
+            bucket[0] -= 1
+            record.suppressed = self._suppressed[record.levelno]
+            self._suppressed[record.levelno] = 0
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que descarta (e conta) em vez de bloquear ou reportar erro com a fila cheia"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingPipeline:
+    """Logger com fila, thread de escrita e filtros de amostragem/limite"""
+
+    def __init__(self, logger: logging.Logger, handlers: List[logging.Handler], queue_size: int = 10000,
+                 debug_sample_every: int = 1, rate_limits: Optional[Dict[int, float]] = None):
+        self.logger = logger
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        self.sampler = DebugSampler(debug_sample_every)
+        self.limiter = LevelRateLimiter(rate_limits or {})
+        # Filtros no handler da fila: rodam em quem loga, antes de enfileirar
+        self.handler.addFilter(self.sampler)
+        self.handler.addFilter(self.limiter)
+        self.listener = QueueListener(self.handler.queue, *handlers, respect_handler_level=True)
+
+    def start(self) -> "LoggingPipeline":
+        self.logger.addHandler(self.handler)
+        self.listener.start()
+        return self
+
+    def stop(self) -> None:
+        """Escreve o que ainda está na fila e encerra a thread (shutdown da aplicação)"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self.handler.queue.qsize(),
+            "dropped_queue_full": self.handler.dropped,
+            "sampled_out_debug": self.sampler.sampled_out,
+            "dropped_rate_limit": {logging.getLevelName(level): count for level, count in self.limiter.dropped.items()},
+        }
+
+
+def parse_rate_limits(raw: str) -> Dict[int, float]:
+    """'DEBUG:100,INFO:500' -> {10: 100.0, 20: 500.0}"""
+    limits = {}
+    for item in raw.split(','):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition(':')
+        level = logging.getLevelName(name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Nível de log inválido em LOG_RATE_LIMITS: {name}")
+        limits[level] = float(rate)
+    return limits
@@ -1,28 +1,60 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Header, Depends, Request
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware as FastAPICORSMiddleware
+from starlette.background import BackgroundTask
 import pandas as pd
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import asyncio
 import os
-from io import BytesIO
 import tempfile
 from datetime import datetime
 import logging
 from logging.handlers import RotatingFileHandler
 import sys
-from data_validator import validate_data, generate_validation_report
-from starlette.middleware.base import BaseHTTPMiddleware
-
-import logging
-from logging.handlers import RotatingFileHandler
-import sys
+from data_validator import generate_validation_report
+from ingest import EmptyUploadError, UploadTooLargeError, ingest_csv, ingest_excel
+import analytics
+import export
+import reports
+from cache import ResultCache, cached_endpoint
+from dataset import Dataset, DateIndex, SchemaMismatchError, append_dataset, build_dataset, parse_date_range
+from cube import CubeQuery
+from sketch import SketchQuery
+from workers import PoolSaturatedError, WorkerPool
+import snapshot
+import query
+from query import DimensionFilters, InvalidQueryError
+import serialize
+from serialize import TimedJSONResponse, columnar_option
+import metrics
+from metrics import MetricsMiddleware
+import registry
+from registry import DatasetNotFoundError, DatasetRegistry
+from cors import CustomCORSMiddleware
+from log_pipeline import JsonFormatter, LoggingPipeline, TextFormatter, parse_rate_limits
 
 # ============================================================================
 # CONFIGURAÇÃO DE LOGGING
 # ============================================================================
 
-def setup_logging():
-    """Configura logging estruturado com arquivo e console"""
+# Nível mínimo do logger (registros abaixo dele nem são criados)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+# Formato do arquivo de log: json (um objeto por linha) ou text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Registros aguardando a thread de escrita; com a fila cheia são descartados (e contados)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Mensagens DEBUG: mantém 1 a cada N por ponto de chamada (1 = todas)
+LOG_DEBUG_SAMPLE_EVERY = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "10"))
+# Limite de registros por segundo por nível (WARNING e acima sem limite por padrão)
+LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "DEBUG:100,INFO:500")
+
+def setup_logging() -> LoggingPipeline:
+    """
+    Configura logging estruturado com arquivo e console
+
+    O logger só enfileira; arquivo (com rotação) e console são escritos por uma thread
+    em segundo plano, fora do event loop.
+    """
     
     # Criar diretório de logs se não existir
     log_dir = os.path.join(os.path.dirname(__file__), "..", "logs")
@@ -32,13 +64,7 @@ def setup_logging():
     
     # Criar logger
     logger = logging.getLogger("analytics_api")
-    logger.setLevel(logging.DEBUG)
-    
-    # Formato detalhado
-    log_format = logging.Formatter(
-        '[%(asctime)s] %(levelname)-8s [%(name)s:%(funcName)s:%(lineno)d] %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    logger.setLevel(LOG_LEVEL)
     
     # Handler para arquivo com rotação (10MB, manter 5 backups)
     file_handler = RotatingFileHandler(
@@ -47,19 +73,39 @@ def setup_logging():
         backupCount=5
     )
     file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(log_format)
-    logger.addHandler(file_handler)
+    file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
     
     # Handler para console
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(log_format)
-    logger.addHandler(console_handler)
+    console_handler.setFormatter(TextFormatter())
     
-    return logger
+    return LoggingPipeline(
+        logger,
+        [file_handler, console_handler],
+        queue_size=LOG_QUEUE_SIZE,
+        debug_sample_every=LOG_DEBUG_SAMPLE_EVERY,
+        rate_limits=parse_rate_limits(LOG_RATE_LIMITS),
+    ).start()
 
 # Inicializar logger
-logger = setup_logging()
+log_pipeline = setup_logging()
+logger = log_pipeline.logger
+
+async def load_datasets(request: Request) -> None:
+    """
+    Dependência de todas as rotas: recargas do disco (dataset despejado ou de outro worker,
+    nova geração do upload atual) rodam no pool de análise antes do endpoint, e
+    get_current_dataset só lê o que já está em memória (um os.stat por chamada)
+    """
+    dataset_id = request.query_params.get("dataset_id")
+    if dataset_id and registry.DATASET_ID_PATTERN.match(dataset_id) and dataset_registry.resident(dataset_id) is None:
+        try:
+            await analytics_pool.run(dataset_registry.load, dataset_id)
+        except DatasetNotFoundError:
+            pass  # O endpoint responde 404
+    if upload_watcher is not None and upload_watcher.changed():
+        await analytics_pool.run(sync_uploaded_data)
 
 app = FastAPI(
     title="Hanami Analytics API",
@@ -67,6 +113,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=TimedJSONResponse,
+    dependencies=[Depends(load_datasets)],
     openapi_url="/openapi.json",
     contact={
         "name": "Analytics Support",
@@ -89,6 +137,21 @@ app = FastAPI(
     ]
 )
 
+# ============================================================================
+# INSTRUMENTAÇÃO
+# ============================================================================
+
+# Perfil por requisição (cabeçalho X-Profile: 1): desligado por padrão, expõe detalhes internos
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Intervalo de amostragem das pilhas no modo de perfil (ms)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Adicionado antes do CORS: fica por dentro dele (o perfil também recebe os headers CORS)
+app.add_middleware(MetricsMiddleware, profiling=PROFILING_ENABLED, profile_interval=PROFILE_INTERVAL_MS / 1000)
+if PROFILING_ENABLED:
+    logger.info(f"🔬 Perfil por requisição habilitado (X-Profile: 1, amostragem a cada {PROFILE_INTERVAL_MS:g} ms)")
+
+
 # ============================================================================
 # CONFIGURAÇÃO DE CORS - Permitir Vercel e desenvolvimento local
 # ============================================================================
@@ -110,125 +173,355 @@ if CORS_ORIGINS_ENV:
 logger.info(f"🔐 CORS configurado com {len(allowed_origins)} origens permitidas")
 logger.debug(f"   Origens: {allowed_origins}")
 
+# Origem devolvida quando a requisição vem de uma origem não permitida
+CORS_FALLBACK_ORIGIN = "https://hanami-analytics.vercel.app"
+
 # IMPORTANTE: NÃO usar CORSMiddleware do FastAPI pois o Railway sobrescreve
-# Usar apenas middleware customizado abaixo
+# Usar apenas o middleware customizado (api/cors.py): ASGI puro, headers pré-calculados,
+# origens exatas em set e *.vercel.app por expressão regular
+app.add_middleware(CustomCORSMiddleware, allowed_origins=allowed_origins, fallback_origin=CORS_FALLBACK_ORIGIN)
 
 
 # ============================================================================
-# CORS MIDDLEWARE CUSTOMIZADO ADICIONAL (Fallback)
+# LIMITES DE UPLOAD
 # ============================================================================
 
-class CustomCORSMiddleware(BaseHTTPMiddleware):
-    """Middleware CORS customizado que sobrescreve headers do Railway"""
-    
-    async def dispatch(self, request, call_next):
-        # Obter origem da requisição
-        origin = request.headers.get("origin")
-        
-        # Verificar se a origem é do Vercel (qualquer subdomínio)
-        is_vercel = origin and ".vercel.app" in origin
-        is_allowed = origin in allowed_origins or is_vercel
-        
-        # Definir o header de origem corretamente
-        allowed_origin = origin if is_allowed else "https://hanami-analytics.vercel.app"
-        
-        # Log para debug
-        logger.debug(f"🌐 CORS Request - Origin: {origin}, Allowed: {is_allowed}")
-        
-        # Responder a requisições OPTIONS (preflight)
-        if request.method == "OPTIONS":
-            return JSONResponse(
-                {"status": "ok"},
-                headers={
-                    "Access-Control-Allow-Origin": allowed_origin,
-                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
-                    "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With, Accept",
-                    "Access-Control-Allow-Credentials": "true",
-                    "Access-Control-Max-Age": "86400",
-                }
-            )
-        
-        # Processar requisição normal
-        response = await call_next(request)
-        
-        # FORÇAR sobrescrita dos headers CORS (para substituir o Railway)
-        response.headers["Access-Control-Allow-Origin"] = allowed_origin
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With, Accept"
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Vary"] = "Origin"
-        
-        return response
+# Máximo de linhas aceitas por upload (verificado à medida que os blocos são lidos)
+MAX_UPLOAD_ROWS = int(os.getenv("MAX_UPLOAD_ROWS", "1000000"))
+# Linhas por bloco na leitura/validação do upload
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "50000"))
+
+
+# ============================================================================
+# POOL DE WORKERS
+# ============================================================================
+
+# Pools separados para que uploads/exportações não ocupem as vagas das análises.
+# Tamanho 0 = inline no event loop.
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+WORKER_QUEUE_DEPTH = int(os.getenv("WORKER_QUEUE_DEPTH", "32"))
+UPLOAD_POOL_SIZE = int(os.getenv("UPLOAD_POOL_SIZE", "1"))
+UPLOAD_QUEUE_DEPTH = int(os.getenv("UPLOAD_QUEUE_DEPTH", "2"))
+EXPORT_POOL_SIZE = int(os.getenv("EXPORT_POOL_SIZE", "2"))
+EXPORT_QUEUE_DEPTH = int(os.getenv("EXPORT_QUEUE_DEPTH", "4"))
+# "process" evita a disputa pelo GIL com as requisições leves (a fatia exportada é serializada)
+EXPORT_POOL_KIND = os.getenv("EXPORT_POOL_KIND", "thread")
+# Linhas por bloco na exportação CSV em streaming
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+# Exportações Excel acima deste número de linhas são gravadas em arquivo temporário
+EXPORT_SPOOL_ROWS = int(os.getenv("EXPORT_SPOOL_ROWS", "50000"))
+# Nível de compressão gzip da exportação CSV (1 = mais rápido, 9 = menor arquivo)
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "1"))
+# Maior página aceita em /sales (?limit=)
+MAX_SALES_PAGE_ROWS = int(os.getenv("MAX_SALES_PAGE_ROWS", "10000"))
 
-# Adicionar middleware customizado como fallback
-app.add_middleware(CustomCORSMiddleware)
+analytics_pool = WorkerPool("analytics", WORKER_POOL_SIZE, WORKER_QUEUE_DEPTH)
+# Upload lê o arquivo recebido (não serializável): sempre em threads
+upload_pool = WorkerPool("upload", UPLOAD_POOL_SIZE, UPLOAD_QUEUE_DEPTH)
+export_pool = WorkerPool("export", EXPORT_POOL_SIZE, EXPORT_QUEUE_DEPTH, kind=EXPORT_POOL_KIND)
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request, exc: PoolSaturatedError):
+    """Back-pressure: pool cheio responde 429 em vez de enfileirar sem limite"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Servidor ocupado, tente novamente em instantes"},
+        headers={"Retry-After": "1"}
+    )
 
 
-# Armazenamento em memória para dados enviados
-uploaded_data: Dict[str, pd.DataFrame] = {}
+# ============================================================================
+# SNAPSHOT EM DISCO
+# ============================================================================
+
+# Diretório dos snapshots colunares (dataset padrão e último upload); vazio desativa.
+# Também é o plano de dados entre workers do uvicorn (--workers / WEB_CONCURRENCY):
+# todos mapeiam os mesmos arquivos e seguem o ponteiro do upload atual.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "snapshots"))
+SNAPSHOT_DEFAULT = "default"
+SNAPSHOT_UPLOADED = "uploaded"
+
+upload_watcher = snapshot.SnapshotWatcher(SNAPSHOT_DIR, SNAPSHOT_UPLOADED) if SNAPSHOT_DIR else None
+
+
+# ============================================================================
+# REGISTRO DE DATASETS
+# ============================================================================
+
+# Orçamento de memória (MB) dos datasets enviados; acima dele os menos usados são
+# despejados e recarregados do disco sob demanda
+DATASET_MEMORY_BUDGET_MB = float(os.getenv("DATASET_MEMORY_BUDGET_MB", "512"))
+# Orçamento de disco (MB) dos snapshots dos datasets e tempo sem uso (horas) até serem
+# removidos; 0 desliga o limite
+DATASET_DISK_BUDGET_MB = float(os.getenv("DATASET_DISK_BUDGET_MB", "2048"))
+DATASET_TTL_HOURS = float(os.getenv("DATASET_TTL_HOURS", "72"))
+# Sem SNAPSHOT_DIR os datasets despejados vão para um diretório temporário (por processo)
+DATASET_DIR = SNAPSHOT_DIR or tempfile.mkdtemp(prefix="hanami-datasets-")
+dataset_registry = DatasetRegistry(
+    DATASET_DIR,
+    max_bytes=int(DATASET_MEMORY_BUDGET_MB * 1024 * 1024),
+    max_disk_bytes=int(DATASET_DISK_BUDGET_MB * 1024 * 1024),
+    ttl_seconds=DATASET_TTL_HOURS * 3600,
+)
+
+
+# ============================================================================
+# CACHE DE RESULTADOS
+# ============================================================================
+
+# Limite de memória do cache (MB), configurável via variável de ambiente
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+result_cache = ResultCache(max_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024))
+
+def cached(name: str):
+    """Cacheia o resultado do endpoint por (versão do dataset, endpoint, parâmetros)"""
+    return cached_endpoint(result_cache, name, lambda params: get_current_version(params.get('dataset_id')))
+
+
+# Armazenamento em memória para dados enviados (dataset canônico já tipado)
+uploaded_data: Dict[str, Dataset] = {}
+# dataset_id do upload atual quando não há SNAPSHOT_DIR (sem ponteiro compartilhado)
+uploaded_ids: Dict[str, str] = {}
 CSV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vendas_ficticias_10000_linhas.csv"))
 df_default = None
+dataset_default: Optional[Dataset] = None
 
 def load_default_data():
-    global df_default
-    if df_default is None:
+    global df_default, dataset_default
+    if dataset_default is None:
         try:
-            df_default = pd.read_csv(CSV_PATH)
-            # Calcular lucro se não existir
-            if 'lucro' not in df_default.columns:
-                df_default['lucro'] = df_default['valor_final'] * df_default['margem_lucro']
-            logger.info(f"✅ Dados padrão carregados de: {CSV_PATH}")
+            fingerprint = snapshot.file_fingerprint(CSV_PATH)
+            dataset_default = snapshot.load_snapshot(SNAPSHOT_DIR, SNAPSHOT_DEFAULT, fingerprint) if SNAPSHOT_DIR else None
+            if dataset_default is not None:
+                logger.info(f"⚡ Dados padrão carregados do snapshot em: {SNAPSHOT_DIR}")
+            else:
+                raw = pd.read_csv(CSV_PATH)
+                # Tipagem, cálculo de lucro e ordenação feitos uma única vez
+                dataset_default = build_dataset(raw)
+                logger.info(f"✅ Dados padrão carregados de: {CSV_PATH}")
+                if persist_snapshot(dataset_default, SNAPSHOT_DEFAULT, fingerprint) is not None:
+                    # Passa a ler a cópia mapeada, compartilhada com os outros workers
+                    mapped = snapshot.load_snapshot(SNAPSHOT_DIR, SNAPSHOT_DEFAULT, fingerprint)
+                    if mapped is not None:
+                        mapped.inherit_indexes(dataset_default)
+                        dataset_default = mapped
         except FileNotFoundError:
             logger.error(f"❌ Arquivo padrão não encontrado: {CSV_PATH}")
             logger.info("   Usando modo sem dados padrão - faça upload de um arquivo CSV/XLSX")
-            df_default = pd.DataFrame()  # DataFrame vazio
+            dataset_default = build_dataset(pd.DataFrame())  # DataFrame vazio
+        df_default = dataset_default.frame
     return df_default
 
-def get_current_data() -> pd.DataFrame:
-    """Retorna dados carregados ou dados padrão"""
+def persist_snapshot(dataset: Dataset, name: str, fingerprint: Optional[str] = None) -> Optional[int]:
+    """Grava o snapshot do dataset e retorna a geração; falhas de disco só geram aviso (None)"""
+    if not SNAPSHOT_DIR:
+        return None
+    try:
+        return snapshot.save_snapshot(dataset, SNAPSHOT_DIR, name, fingerprint or snapshot.frame_fingerprint(dataset.frame))
+    except (OSError, snapshot.SnapshotError) as e:
+        logger.warning(f"⚠️ Não foi possível gravar o snapshot '{name}': {e}")
+        return None
+
+def publish_upload(dataset: Dataset) -> Tuple[str, Dataset]:
+    """
+    Registra o upload, publica-o como dataset atual para todos os workers e retorna
+    (dataset_id, versão mapeada do snapshot)
+    """
+    dataset_id, dataset = dataset_registry.add(dataset)
+    return dataset_id, publish_current(dataset_id, dataset)
+
+def publish_append(dataset_id: Optional[str], dataset: Dataset) -> Tuple[str, Dataset, bool]:
+    """
+    Grava a nova versão de um dataset após o append e retorna (dataset_id, versão mapeada, é o atual)
+
+    Sem dataset_id o append vale para o dataset atual; sobre os dados padrão, o resultado
+    vira um novo dataset registrado e passa a ser o atual.
+    """
+    current_id = current_upload_id()
+    if dataset_id is None:
+        if current_id is None:
+            dataset_id, dataset = publish_upload(dataset)
+            return dataset_id, dataset, True
+        dataset_id = current_id
+    dataset = dataset_registry.replace(dataset_id, dataset)
+    if dataset_id != current_id:
+        return dataset_id, dataset, False
+    return dataset_id, publish_current(dataset_id, dataset), True
+
+def publish_current(dataset_id: str, dataset: Dataset) -> Dataset:
+    """
+    Aponta o dataset atual de todos os workers para os arquivos do registro e retorna a
+    versão mapeada
+
+    Sem segunda cópia em disco, e este worker passa a ler os arquivos mapeados: o frame
+    construído em memória é descartado e a máquina fica com uma única cópia do dataset.
+    """
+    if upload_watcher is None:
+        return dataset
+    try:
+        generation = snapshot.link_snapshot(SNAPSHOT_DIR, SNAPSHOT_UPLOADED, registry.snapshot_name(dataset_id))
+    except (OSError, snapshot.SnapshotError) as e:
+        logger.warning(f"⚠️ Não foi possível publicar o dataset {dataset_id} para os outros workers: {e}")
+        return dataset
+    upload_watcher.poll()
+    if upload_watcher.generation == generation and upload_watcher.dataset is not None:
+        # Registro e dataset atual compartilham o mesmo objeto
+        dataset_registry.attach(dataset_id, upload_watcher.dataset)
+        return upload_watcher.dataset
+    return dataset
+
+def current_upload_id() -> Optional[str]:
+    """dataset_id do upload atual (None com os dados padrão)"""
+    sync_uploaded_data()
+    if 'current' not in uploaded_data:
+        return None
+    if upload_watcher is not None:
+        return upload_watcher.fingerprint
+    return uploaded_ids.get('current')
+
+def sync_uploaded_data() -> None:
+    """
+    Adota a versão publicada por qualquer worker (upload, reset ou reinício); um os.stat por chamada
+
+    A recarga normalmente já foi feita no pool por load_datasets; se outra thread estiver
+    carregando a nova geração, segue com a versão atual em vez de esperar.
+    """
+    if upload_watcher is None or not upload_watcher.poll(wait=False):
+        return
+    if upload_watcher.dataset is None:
+        uploaded_data.pop('current', None)
+        logger.info(f"🔄 Upload removido (geração {upload_watcher.generation}), usando dados padrão")
+    else:
+        uploaded_data['current'] = upload_watcher.dataset
+        logger.info(f"⚡ Upload da geração {upload_watcher.generation} carregado do snapshot ({len(upload_watcher.dataset)} registros)")
+    result_cache.invalidate()
+
+def get_current_dataset(dataset_id: Optional[str] = None) -> Dataset:
+    """Retorna o dataset do registro (dataset_id), o enviado por último ou o padrão"""
+    if dataset_id:
+        try:
+            return dataset_registry.get(dataset_id)
+        except DatasetNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Dataset '{dataset_id}' não encontrado")
+    sync_uploaded_data()
     if uploaded_data and 'current' in uploaded_data:
         return uploaded_data['current']
-    return load_default_data()
+    load_default_data()
+    return dataset_default
 
-def filter_data_by_date(data: pd.DataFrame, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
-    """Filtra dados por intervalo de datas"""
-    if data.empty or 'data_venda' not in data.columns:
-        return data
+def get_current_version(dataset_id: Optional[str] = None) -> int:
+    """Versão do dataset consultado (compõe a chave do cache de resultados)"""
+    return get_current_dataset(dataset_id).version
+
+def get_current_data(dataset_id: Optional[str] = None) -> pd.DataFrame:
+    """Retorna dados carregados ou dados padrão (frame compartilhado, somente leitura)"""
+    return get_current_dataset(dataset_id).frame
+
+def filter_data_by_date(data, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+    """Filtra dados por intervalo de datas via busca binária no índice de datas (sem cópia)"""
+    frame = data.frame if isinstance(data, Dataset) else data
+    if frame.empty or 'data_venda' not in frame.columns:
+        return frame
+    if not start_date and not end_date:
+        return frame
     
     try:
-        df = data.copy()
-        df['data_venda'] = pd.to_datetime(df['data_venda'])
-        
-        if start_date:
-            start = pd.to_datetime(start_date)
-            df = df[df['data_venda'] >= start]
-            logger.debug(f"Filtro de data inicial aplicado: {start_date}")
+        start, end = parse_date_range(start_date, end_date)
         
-        if end_date:
-            end = pd.to_datetime(end_date)
-            # Incluir o dia inteiro (até 23:59:59)
-            end = end + pd.Timedelta(days=1)
-            df = df[df['data_venda'] < end]
-            logger.debug(f"Filtro de data final aplicado: {end_date}")
+        if isinstance(data, Dataset):
+            df = data.slice_dates(start, end)
+        elif frame['data_venda'].is_monotonic_increasing:
+            lo, hi = DateIndex(frame['data_venda']).row_range(start, end)
+            df = frame.iloc[lo:hi]
+        else:
+            # Frame fora de ordem: recorre às máscaras booleanas
+            df = frame
+            if start is not None:
+                df = df[df['data_venda'] >= start]
+            if end is not None:
+                df = df[df['data_venda'] < end]
         
+        logger.debug(f"Filtro de data aplicado: {start_date} a {end_date} ({len(df)} registros)")
         return df
     except Exception as e:
         logger.error(f"Erro ao filtrar por data: {e}", exc_info=True)
-        return data
+        return frame
+
+def date_filter_range(start_date: Optional[str], end_date: Optional[str]) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+    """
+    Intervalo de datas dos endpoints de análise (com ou sem filtros de dimensão)
 
-def parse_csv_file(file_content: bytes) -> pd.DataFrame:
-    """Parser robusto para CSV"""
+    Datas inválidas são ignoradas, como em filter_data_by_date: a consulta vale para o
+    período inteiro em vez de responder 400.
+    """
     try:
-        return pd.read_csv(BytesIO(file_content), encoding='utf-8')
-    except:
+        return parse_date_range(start_date, end_date)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"⚠️ Datas inválidas ignoradas (start_date={start_date}, end_date={end_date}): {e}")
+        return None, None
+
+def get_filtered_data(start_date: Optional[str] = None, end_date: Optional[str] = None, dataset_id: Optional[str] = None,
+                      filters: Optional[DimensionFilters] = None) -> pd.DataFrame:
+    """Fatia do dataset consultado pelo intervalo de datas e pelos filtros de dimensão"""
+    dataset = get_current_dataset(dataset_id)
+    with metrics.stage("filter"):
+        if not filters:
+            return filter_data_by_date(dataset, start_date, end_date)
+        start, end = date_filter_range(start_date, end_date)
         try:
-            return pd.read_csv(BytesIO(file_content), encoding='latin-1')
-        except:
-            return pd.read_csv(BytesIO(file_content), encoding='iso-8859-1')
+            return query.filter_frame(dataset, filters, start, end)
+        except (ValueError, TypeError) as e:
+            # Inclui InvalidQueryError (dimensão inexistente)
+            raise HTTPException(status_code=400, detail=str(e))
+
+def get_cube_query(start_date: Optional[str] = None, end_date: Optional[str] = None, dataset_id: Optional[str] = None,
+                   filters: Optional[DimensionFilters] = None) -> Optional[CubeQuery]:
+    """Cubo diário do dataset consultado restrito ao intervalo (None se não puder responder)"""
+    # O cubo só responde filtros por data; com filtros de dimensão a fatia é varrida
+    if filters:
+        return None
+    cube = get_current_dataset(dataset_id).cube
+    if cube is None:
+        return None
+    return cube.query(*date_filter_range(start_date, end_date))
+
+def get_sketch_query(start_date: Optional[str] = None, end_date: Optional[str] = None, dataset_id: Optional[str] = None,
+                     filters: Optional[DimensionFilters] = None) -> Optional[SketchQuery]:
+    """Sketches de clientes distintos do intervalo (None se não puderem responder: volta ao exato)"""
+    # Como o cubo, os sketches são por dia: filtros de dimensão exigem a contagem exata
+    if filters:
+        return None
+    sketch = get_current_dataset(dataset_id).customer_sketch
+    if sketch is None:
+        return None
+    return sketch.query(*date_filter_range(start_date, end_date))
 
-def parse_xlsx_file(file_content: bytes) -> pd.DataFrame:
-    """Parser para XLSX"""
-    return pd.read_excel(BytesIO(file_content))
+async def compute_kpis(data: pd.DataFrame, start_date: Optional[str], end_date: Optional[str], dataset_id: Optional[str],
+                       filters: Optional[DimensionFilters], distinct: str = "exact") -> Dict:
+    """KPIs da fatia já filtrada no pool de análise (usado por /kpis e pela aba Resumo do Excel)"""
+    if data.empty:
+        return dict(analytics.EMPTY_KPIS)
+    sketch = await analytics_pool.run(get_sketch_query, start_date, end_date, dataset_id, filters) if distinct == "approx" else None
+    return await analytics_pool.run(analytics.kpis, data, cube=get_cube_query(start_date, end_date, dataset_id, filters), distinct=sketch)
+
+def dimension_filters(
+    regiao: Optional[str] = Query(None, description="Um ou mais valores separados por vírgula (ex: Sul,Sudeste)"),
+    estado_cliente: Optional[str] = Query(None),
+    cidade_cliente: Optional[str] = Query(None),
+    categoria: Optional[str] = Query(None),
+    marca: Optional[str] = Query(None),
+    nome_produto: Optional[str] = Query(None),
+    genero_cliente: Optional[str] = Query(None),
+    canal_venda: Optional[str] = Query(None),
+    forma_pagamento: Optional[str] = Query(None),
+    status_entrega: Optional[str] = Query(None),
+) -> DimensionFilters:
+    """Filtros de dimensão comuns aos endpoints de análise, exportação e /sales"""
+    return DimensionFilters.parse(
+        regiao=regiao, estado_cliente=estado_cliente, cidade_cliente=cidade_cliente, categoria=categoria,
+        marca=marca, nome_produto=nome_produto, genero_cliente=genero_cliente, canal_venda=canal_venda,
+        forma_pagamento=forma_pagamento, status_entrega=status_entrega,
+    )
 
 @app.on_event("startup")
 async def startup_event():
@@ -236,11 +529,19 @@ async def startup_event():
     logger.info("🚀 INICIANDO HANAMI ANALYTICS API")
     logger.info("=" * 80)
     load_default_data()
+    sync_uploaded_data()
     if not df_default.empty:
         logger.info(f"✅ Dados padrão carregados com sucesso! ({len(df_default)} registros)")
     else:
         logger.warning("⚠️ API iniciada sem dados padrão. Faça upload de um arquivo para começar.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    analytics_pool.shutdown()
+    upload_pool.shutdown()
+    export_pool.shutdown()
+    log_pipeline.stop()
+
 @app.get("/")
 async def root():
     return {
@@ -250,6 +551,8 @@ async def root():
             "upload": "POST /upload",
             "data": "GET /sales",
             "analysis": "GET /analysis",
+            "dashboard": "GET /dashboard",
+            "datasets": "GET /datasets",
             "reports": "GET /reports/{report_type}"
         }
     }
@@ -259,46 +562,54 @@ async def root():
 # ============================================================================
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(
+    file: UploadFile = File(...),
+    mode: str = Query("replace", description="replace (novo dataset) ou append (acrescenta ao dataset atual ou ao dataset_id)"),
+    dataset_id: Optional[str] = Query(None, description="Dataset que recebe o append (padrão: dataset atual)")
+):
     """
     Endpoint robusto para upload de CSV ou XLSX
     
     - Suporta CSV e XLSX
     - Detecta automaticamente o tipo de arquivo
     - Valida e padroniza dados
-    - Armazena em memória para análise
+    - Registra o dataset (dataset_id na resposta) e o torna o dataset atual
+    - mode=append: valida só as linhas novas, ignora as já existentes e atualiza
+      índices e agregados sem reconstruir o dataset
     """
-    logger.info(f"📤 Iniciando upload do arquivo: {file.filename}")
+    logger.info(f"📤 Iniciando upload do arquivo: {file.filename} (modo {mode})")
+    if mode not in ("replace", "append"):
+        raise HTTPException(status_code=400, detail="Modo inválido. Use replace ou append")
+    if dataset_id and mode != "append":
+        raise HTTPException(status_code=400, detail="dataset_id só é aceito com mode=append")
+    target = get_current_dataset(dataset_id) if mode == "append" else None
     try:
-        file_content = await file.read()
         file_name = file.filename.lower()
-        file_size_mb = len(file_content) / (1024 * 1024)
-        logger.info(f"   Tamanho: {file_size_mb:.2f} MB")
+        if file.size is not None:
+            logger.info(f"   Tamanho: {file.size / (1024 * 1024):.2f} MB")
         
-        # Detectar tipo de arquivo
-        if file_name.endswith('.csv'):
-            logger.debug("Tipo detectado: CSV")
-            df_uploaded = parse_csv_file(file_content)
-        elif file_name.endswith(('.xlsx', '.xls')):
-            logger.debug("Tipo detectado: XLSX/XLS")
-            df_uploaded = parse_xlsx_file(file_content)
-        else:
-            logger.warning(f"❌ Tipo de arquivo não suportado: {file_name}")
-            raise HTTPException(status_code=400, detail="Tipo de arquivo não suportado. Use CSV ou XLSX")
+        logger.info(f"🔍 Iniciando leitura e validação em blocos de {UPLOAD_CHUNK_ROWS} linhas...")
         
-        # Validação básica
-        if df_uploaded.empty:
+        # ✅ LER, VALIDAR E PADRONIZAR DADOS (bloco a bloco, direto do arquivo recebido)
+        try:
+            if file_name.endswith('.csv'):
+                logger.debug("Tipo detectado: CSV")
+                df_uploaded, validation_report = await upload_pool.run(ingest_csv, file.file, MAX_UPLOAD_ROWS, UPLOAD_CHUNK_ROWS)
+            elif file_name.endswith(('.xlsx', '.xls')):
+                logger.debug("Tipo detectado: XLSX/XLS")
+                df_uploaded, validation_report = await upload_pool.run(ingest_excel, file.file, file_name, MAX_UPLOAD_ROWS, UPLOAD_CHUNK_ROWS)
+            else:
+                logger.warning(f"❌ Tipo de arquivo não suportado: {file_name}")
+                raise HTTPException(status_code=400, detail="Tipo de arquivo não suportado. Use CSV ou XLSX")
+        except EmptyUploadError:
             logger.warning("❌ Arquivo vazio recebido")
             raise HTTPException(status_code=400, detail="Arquivo vazio")
-        
-        if len(df_uploaded) > 100000:
-            logger.warning(f"❌ Arquivo muito grande: {len(df_uploaded)} linhas")
-            raise HTTPException(status_code=413, detail="Arquivo muito grande (máximo 100.000 linhas)")
-        
-        logger.info(f"🔍 Iniciando validação dos dados...")
-        
-        # ✅ VALIDAR E PADRONIZAR DADOS
-        df_uploaded, validation_report = validate_data(df_uploaded)
+        except UploadTooLargeError as e:
+            logger.warning(f"❌ Arquivo muito grande: mais de {e.max_rows} linhas")
+            raise HTTPException(
+                status_code=413,
+                detail=f"Arquivo muito grande (máximo {MAX_UPLOAD_ROWS:,} linhas)".replace(',', '.')
+            )
         
         # Log do relatório de validação
         report_text = generate_validation_report(validation_report)
@@ -312,475 +623,572 @@ async def upload_file(file: UploadFile = File(...)):
                 detail=f"Qualidade dos dados insuficiente. Score: {validation_report.get_quality_score():.1f}%"
             )
         
-        # Calcular lucro se necessário (usando colunas padrão)
-        if 'lucro' not in df_uploaded.columns and 'valor_final' in df_uploaded.columns and 'margem_lucro' in df_uploaded.columns:
-            df_uploaded['lucro'] = df_uploaded['valor_final'] * df_uploaded['margem_lucro']
-            logger.debug("Coluna 'lucro' calculada")
+        appended = None
+        duplicates = 0
+        is_current = True
+        if mode == "append":
+            # Só o delta é tipado, deduplicado e agregado sobre o dataset existente
+            try:
+                dataset, duplicates = await upload_pool.run(append_dataset, target, df_uploaded)
+            except SchemaMismatchError as e:
+                logger.warning(f"❌ Append incompatível: {e}")
+                raise HTTPException(status_code=422, detail=f"Append incompatível com o dataset: {e}")
+            appended = len(dataset) - len(target)
+            current_id = current_upload_id()
+            if dataset is target and (dataset_id or current_id):
+                # Só duplicatas: nada a regravar, mesmos id e is_current que publish_append reportaria
+                dataset_id = dataset_id or current_id
+                is_current = dataset_id == current_id
+            else:
+                # Sobre os dados padrão o append sempre vira um dataset registrado (mesmo sem linhas novas)
+                dataset_id, dataset, is_current = await upload_pool.run(publish_append, dataset_id, dataset)
+        else:
+            # Construir dataset canônico (lucro, tipos e ordenação calculados uma vez)
+            dataset = await upload_pool.run(build_dataset, df_uploaded)
+            # Registrar e publicar para os outros workers (e para reinícios) via snapshot em disco
+            dataset_id, dataset = await upload_pool.run(publish_upload, dataset)
+        df_uploaded = dataset.frame
         
-        # Armazenar dados
-        uploaded_data['current'] = df_uploaded
+        # Armazenar dados (nova versão invalida os resultados em cache)
+        if is_current:
+            uploaded_data['current'] = dataset
+            uploaded_ids['current'] = dataset_id
+        result_cache.invalidate()
         logger.info(f"✅ Arquivo '{file.filename}' carregado com sucesso!")
         logger.info(f"   Registros válidos: {len(df_uploaded)} | Colunas: {len(df_uploaded.columns)}")
         logger.info(f"   Score de qualidade: {validation_report.get_quality_score():.1f}%")
         
-        return {
+        response = {
             "status": "success",
             "message": f"Arquivo '{file.filename}' carregado e validado com sucesso",
+            "mode": mode,
+            "dataset_id": dataset_id,
             "rows": len(df_uploaded),
             "columns": list(df_uploaded.columns),
             "quality_score": round(validation_report.get_quality_score(), 1),
             "validation_report": validation_report.to_dict()
         }
+        if mode == "append":
+            response["appended_rows"] = appended
+            response["duplicates_skipped"] = duplicates
+        return response
     
     except HTTPException as e:
         logger.error(f"Erro HTTP no upload: {e.detail}")
         raise e
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro inesperado ao processar arquivo: {str(e)}", exc_info=True)
         raise HTTPException(status_code=400, detail=f"Erro ao processar arquivo: {str(e)}")
 
 @app.delete("/reset")
 async def reset_data():
-    """Reseta os dados enviados e volta aos dados padrão"""
+    """Reseta os dados enviados e volta aos dados padrão (datasets registrados continuam disponíveis por ID)"""
     logger.info("🔄 Reset de dados solicitado - retornando aos dados padrão")
     uploaded_data.clear()
+    uploaded_ids.clear()
+    result_cache.invalidate()
+    if SNAPSHOT_DIR:
+        # Nova geração sem diretório: os outros workers voltam aos dados padrão
+        snapshot.delete_snapshot(SNAPSHOT_DIR, SNAPSHOT_UPLOADED)
+        sync_uploaded_data()
     return {"status": "success", "message": "Dados resetados para padrão"}
 
+@app.get("/datasets")
+async def list_datasets():
+    """
+    Contagem dos datasets registrados e uso do orçamento de memória
+
+    Os IDs não são listados: quem tem o dataset_id consulta e remove o upload, então cada
+    usuário só conhece o ID devolvido pelo próprio /upload.
+    """
+    return {
+        "current": "uploaded" if current_upload_id() else "default",
+        **dataset_registry.stats(),
+        **dataset_registry.counts()
+    }
+
+@app.delete("/datasets/{dataset_id}")
+async def delete_dataset(dataset_id: str):
+    """Remove um dataset do registro (memória e disco); se for o atual, volta aos dados padrão"""
+    is_current = current_upload_id() == dataset_id
+    try:
+        dataset_registry.remove(dataset_id)
+    except DatasetNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Dataset '{dataset_id}' não encontrado")
+    if is_current:
+        await reset_data()
+    return {"status": "success", "message": f"Dataset '{dataset_id}' removido"}
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Contadores do cache de resultados (hits, misses, evicções) para dimensionamento"""
+    return {
+        "dataset_version": get_current_version(),
+        **result_cache.stats()
+    }
+
+
+@app.get("/workers/stats")
+async def get_workers_stats():
+    """Ocupação dos pools de workers (tarefas em execução, na fila e recusadas)"""
+    dataset = get_current_dataset()
+    return {
+        "analytics": analytics_pool.stats(),
+        "upload": upload_pool.stats(),
+        "export": export_pool.stats(),
+        "dataset": {
+            "pid": os.getpid(),
+            "source": "uploaded" if 'current' in uploaded_data else "default",
+            "generation": upload_watcher.generation if upload_watcher is not None else None,
+            "rows": len(dataset)
+        },
+        "registry": dataset_registry.stats()
+    }
+
+
+@app.get("/metrics")
+async def get_metrics(response_format: str = Query("prometheus", alias="format", pattern="^(prometheus|json)$",
+                                                   description="prometheus (texto de exposição) ou json (p50/p95/p99 estimados pelos buckets)")):
+    """
+    Latência por endpoint e por etapa interna deste worker
+
+    - hanami_request_duration_seconds{method, route, status}: até o último byte da resposta
+    - hanami_stage_duration_seconds{stage}: filter, <pool>.<função> (ex: analytics.kpis,
+      analytics.columns_json, export.write_excel, upload.ingest_csv), validate.<passo>
+      e serialize.json
+    - Contadores do cache de resultados, dos pools de workers e do pipeline de logging
+    """
+    if response_format == "json":
+        return metrics.summary()
+    cache = result_cache.stats()
+    pools = [(pool.name, pool.stats()) for pool in (analytics_pool, upload_pool, export_pool)]
+    logs = log_pipeline.stats()
+    gauges = [
+        ("hanami_cache_hits_total", "counter", "Acertos do cache de resultados", [({}, cache["hits"])]),
+        ("hanami_cache_misses_total", "counter", "Faltas do cache de resultados", [({}, cache["misses"])]),
+        ("hanami_cache_evictions_total", "counter", "Entradas despejadas do cache de resultados", [({}, cache["evictions"])]),
+        ("hanami_cache_bytes", "gauge", "Tamanho estimado do cache de resultados", [({}, cache["current_bytes"])]),
+        ("hanami_pool_in_flight", "gauge", "Tarefas em execução ou na fila por pool", [({"pool": name}, stats["in_flight"]) for name, stats in pools]),
+        ("hanami_pool_completed_total", "counter", "Tarefas concluídas por pool", [({"pool": name}, stats["completed"]) for name, stats in pools]),
+        ("hanami_pool_rejected_total", "counter", "Tarefas recusadas (429) por pool", [({"pool": name}, stats["rejected"]) for name, stats in pools]),
+        ("hanami_log_queued", "gauge", "Registros de log aguardando a thread de escrita", [({}, logs["queued"])]),
+        ("hanami_log_dropped_total", "counter", "Registros de log descartados (fila cheia, amostragem de DEBUG, limite por nível)",
+         [({"reason": "queue_full"}, logs["dropped_queue_full"]), ({"reason": "debug_sampling"}, logs["sampled_out_debug"])]
+         + [({"reason": "rate_limit", "level": level}, count) for level, count in logs["dropped_rate_limit"].items()]),
+    ]
+    return Response(content=metrics.render(gauges), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 @app.get("/sales")
-async def get_sales(limit: int = 100, offset: int = 0):
-    """Retorna lista de vendas com paginação"""
-    data = get_current_data()
-    total = len(data)
-    sales = data.iloc[offset:offset+limit].to_dict('records')
+async def get_sales(
+    limit: int = Query(100, ge=0, le=MAX_SALES_PAGE_ROWS),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior (paginação por chave)"),
+    sort_by: Optional[str] = Query(None, description="Coluna de ordenação (padrão: data_venda)"),
+    sort_order: str = Query("asc", pattern="^(asc|desc)$"),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    filters: DimensionFilters = Depends(dimension_filters),
+    valor_min: Optional[float] = Query(None, description="valor_final mínimo"),
+    valor_max: Optional[float] = Query(None, description="valor_final máximo"),
+    dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"),
+    response_format: str = Query("records", alias="format", pattern="^(records|columns)$", description="records (um objeto por linha) ou columns (um array por coluna)")
+):
+    """
+    Retorna lista de vendas filtrada, ordenada e paginada no servidor
     
-    return {
-        "total": total,
+    - Filtros de dimensão aceitam vários valores separados por vírgula (ex: regiao=Sul,Sudeste)
+    - sort_by/sort_order usam a permutação de ordenação pré-calculada da coluna
+    - next_cursor: enviado como ?cursor= traz a página seguinte por busca binária
+      (páginas profundas custam o mesmo que a primeira; offset continua aceito)
+    - format=columns serializa a página direto dos arrays NumPy (sem um dict por linha)
+    """
+    dataset = get_current_dataset(dataset_id)
+    try:
+        result = await analytics_pool.run(
+            query.select_page, dataset, filters, start_date, end_date, valor_min, valor_max,
+            sort_by, sort_order == "desc", limit, offset, cursor
+        )
+    except InvalidQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    page = dataset.frame.iloc[result.rows]
+    meta = {
+        "total": result.total,
         "limit": limit,
         "offset": offset,
-        "data": sales
+        "sort_by": sort_by or query.DEFAULT_SORT,
+        "sort_order": sort_order,
+        "next_cursor": result.next_cursor,
     }
+    if response_format == "columns":
+        body = await analytics_pool.run(serialize.columns_json, page)
+        return Response(content=serialize.envelope(dict(meta, format="columns"), body), media_type="application/json")
+    if 'data_venda' in page.columns:
+        page = page.assign(data_venda=page['data_venda'].dt.strftime('%Y-%m-%d'))
+    sales = await analytics_pool.run(page.to_dict, 'records')
+    
+    return dict(meta, data=sales)
 
 # ============================================================================
 # ENDPOINTS DE ANÁLISE
 # ============================================================================
 
 @app.get("/analysis")
-async def get_analysis():
-    """Retorna análise completa dos dados"""
-    data = get_current_data()
-    
-    # Análise básica
-    numeric_cols = data.select_dtypes(include=['number']).columns
-    
-    analysis = {
-        "shape": {
-            "rows": len(data),
-            "columns": len(data.columns)
-        },
-        "columns": list(data.columns),
-        "statistics": {}
-    }
-    
-    # Estatísticas por coluna numérica
-    for col in numeric_cols:
-        analysis["statistics"][col] = {
-            "mean": float(data[col].mean()),
-            "median": float(data[col].median()),
-            "min": float(data[col].min()),
-            "max": float(data[col].max()),
-            "std": float(data[col].std()),
-            "sum": float(data[col].sum())
-        }
+@cached("analysis")
+async def get_analysis(dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"),
+                       start_date: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD): estatísticas só do intervalo"),
+                       end_date: Optional[str] = Query(None, description="Data final (YYYY-MM-DD)")):
+    """
+    Retorna análise completa dos dados
+
+    - Formato, colunas, nulos por coluna e, por coluna numérica: média, mediana, mínimo,
+      máximo, desvio padrão, soma, contagem, nulos e quantis (p05, p25, p75, p95)
+    - Sem datas: estatísticas calculadas uma vez junto com o dataset (resposta imediata)
+    - Com datas: momentos combinados dos parciais diários; mediana e quantis sobre a fatia
+    """
+    dataset = get_current_dataset(dataset_id)
+    # Datasets vindos de snapshot calculam as estatísticas na primeira consulta (fora do event loop)
+    stats = dataset.column_stats if dataset.has_column_stats else await analytics_pool.run(dataset.build_column_stats)
+    if not start_date and not end_date:
+        return stats.summary
     
-    return analysis
+    try:
+        start, end = parse_date_range(start_date, end_date)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Data inválida: {e}")
+    lo, hi = dataset.date_index.row_range(start, end) if dataset.date_index is not None else (0, len(dataset))
+    return await analytics_pool.run(stats.describe_range, dataset.frame, lo, hi, start, end)
 
 @app.get("/kpis")
-async def get_kpis(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("kpis")
+async def get_kpis(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters),
+                   distinct: str = Query("exact", pattern="^(exact|approx)$", description="Clientes distintos: exact (códigos inteiros) ou approx (HyperLogLog diário)")):
     """Retorna KPIs principais - Algoritmo de análise"""
     logger.info(f"📊 Solicitação de KPIs (start_date={start_date}, end_date={end_date})")
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     if data.empty:
         logger.warning("⚠️ Nenhum dado disponível para período selecionado")
-        return {
-            "total_vendas": 0,
-            "faturamento_total": 0,
-            "ticket_medio": 0,
-            "lucro_total": 0,
-            "margem_lucro_media": 0,
-            "clientes_unicos": 0,
-            "avaliacao_media": 0
-        }
+        return dict(analytics.EMPTY_KPIS)
     
     try:
-        kpis = {
-            "total_vendas": int(len(data)),
-        }
-        
-        # Usar colunas específicas do dataset
-        if 'valor_final' in data.columns:
-            kpis["faturamento_total"] = float(data['valor_final'].sum())
-            kpis["ticket_medio"] = float(data['valor_final'].mean())
-        
-        if 'valor_final' in data.columns and 'custo_produto' in data.columns and 'quantidade' in data.columns:
-            # Calcular lucro: (valor_final - custo_total) por linha
-            lucro = (data['valor_final'] - (data['custo_produto'] * data['quantidade'])).sum()
-            kpis["lucro_total"] = float(lucro)
-            kpis["margem_lucro_media"] = float((lucro / data['valor_final'].sum() * 100)) if data['valor_final'].sum() > 0 else 0
-        elif 'margem_lucro' in data.columns:
-            kpis["lucro_total"] = float((data['valor_final'] * data['margem_lucro']).sum()) if 'valor_final' in data.columns else 0
-            kpis["margem_lucro_media"] = float(data['margem_lucro'].mean() * 100)
-        
-        if 'cliente_id' in data.columns:
-            kpis["clientes_unicos"] = int(data['cliente_id'].nunique())
-        
-        if 'avaliacao_produto' in data.columns:
-            kpis["avaliacao_media"] = float(data['avaliacao_produto'].mean())
-        
+        kpis = await compute_kpis(data, start_date, end_date, dataset_id, filters, distinct=distinct)
         logger.info(f"✅ KPIs calculados: {len(data)} registros analisados")
         return kpis
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro ao calcular KPIs: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao calcular KPIs: {str(e)}")
 
 @app.get("/sales-by-month")
-async def get_sales_by_month(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("sales_by_month")
+@columnar_option
+async def get_sales_by_month(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
     """Retorna vendas agrupadas por mês - Algoritmo de análise temporal"""
     logger.info(f"📅 Análise de vendas por mês (start_date={start_date}, end_date={end_date})")
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     if data.empty:
         logger.warning("⚠️ Nenhum dado disponível para análise de vendas por mês")
         return []
     
     try:
-        df_copy = data.copy()
-        df_copy['data_venda'] = pd.to_datetime(df_copy['data_venda'])
-        df_copy['mes'] = df_copy['data_venda'].dt.to_period('M').astype(str)
-        
-        monthly = df_copy.groupby('mes').agg({
-            'valor_final': 'sum',
-            'id_transacao': 'count'
-        }).reset_index()
-        
-        monthly.columns = ['mes', 'faturamento', 'vendas']
-        
-        # Adicionar lucro se possível
-        if 'custo_produto' in data.columns and 'quantidade' in data.columns:
-            df_copy['lucro'] = df_copy['valor_final'] - (df_copy['custo_produto'] * df_copy['quantidade'])
-            lucro_monthly = df_copy.groupby('mes')['lucro'].sum().reset_index()
-            monthly = monthly.merge(lucro_monthly, on='mes')
-        
+        monthly = await analytics_pool.run(analytics.sales_by_month, data, cube=get_cube_query(start_date, end_date, dataset_id, filters))
         logger.info(f"✅ Análise temporal concluída: {len(monthly)} períodos encontrados")
-        return monthly.to_dict('records')
+        return monthly
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro ao agrupar por mês: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao agrupar por mês: {str(e)}")
 
 @app.get("/sales-by-category")
-async def get_sales_by_category(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("sales_by_category")
+@columnar_option
+async def get_sales_by_category(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
     """Retorna vendas por categoria - Algoritmo de segmentação"""
     logger.info(f"🏷️  Análise por categoria (start_date={start_date}, end_date={end_date})")
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     if data.empty or 'categoria' not in data.columns:
         logger.warning("⚠️ Nenhum dado disponível para análise por categoria")
         return []
     
     try:
-        category = data.groupby('categoria')['valor_final'].sum().reset_index()
-        category.columns = ['name', 'value']
-        category = category.sort_values('value', ascending=False)
+        category = await analytics_pool.run(analytics.sales_by_category, data, cube=get_cube_query(start_date, end_date, dataset_id, filters))
         logger.info(f"✅ Análise por categoria: {len(category)} categorias encontradas")
-        return category.to_dict('records')
+        return category
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro ao agrupar por categoria: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao agrupar por categoria: {str(e)}")
 
 @app.get("/top-products")
-async def get_top_products(limit: int = 10, start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
-    """Retorna produtos mais vendidos - Algoritmo de ranking"""
-    logger.info(f"🏆 Top produtos (limit={limit}, start_date={start_date}, end_date={end_date})")
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
+@cached("top_products")
+@columnar_option
+async def get_top_products(limit: int = 10, start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"),
+                           filters: DimensionFilters = Depends(dimension_filters),
+                           order_by: str = Query("quantidade", description="Medida do ranking: quantidade, valor_total, lucro ou transacoes")):
+    """Retorna produtos mais vendidos - Algoritmo de ranking (seleção parcial dos top-k)"""
+    logger.info(f"🏆 Top produtos (limit={limit}, order_by={order_by}, start_date={start_date}, end_date={end_date})")
+    if order_by not in analytics.RANKING_MEASURES:
+        raise HTTPException(status_code=400, detail=f"order_by inválido. Use: {', '.join(analytics.RANKING_MEASURES)}")
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     if data.empty or 'nome_produto' not in data.columns:
         logger.warning("⚠️ Nenhum dado disponível para ranking de produtos")
         return []
     
     try:
-        products = data.groupby('nome_produto').agg({
-            'quantidade': 'sum',
-            'valor_final': 'sum',
-            'id_transacao': 'count'
-        }).reset_index()
-        
-        # Calcular lucro por produto
-        if 'custo_produto' in data.columns:
-            lucro_by_product = data.groupby('nome_produto').apply(
-                lambda x: (x['valor_final'] - (x['custo_produto'] * x['quantidade'])).sum()
-            ).reset_index(name='lucro')
-            products = products.merge(lucro_by_product, on='nome_produto')
-        else:
-            products['lucro'] = products['valor_final'] * 0.3  # Margem padrão de 30%
-        
-        products.columns = ['name', 'quantidade', 'valor_total', 'transacoes', 'lucro']
-        products = products.sort_values('quantidade', ascending=False).head(limit)
+        products = await analytics_pool.run(analytics.top_products, data, limit, cube=get_cube_query(start_date, end_date, dataset_id, filters), order_by=order_by)
         logger.info(f"✅ Ranking de produtos: {len(products)} produtos encontrados")
-        return products.to_dict('records')
+        return products
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro ao listar produtos: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao listar produtos: {str(e)}")
 
 @app.get("/customers-by-gender")
-async def get_customers_by_gender(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("customers_by_gender")
+@columnar_option
+async def get_customers_by_gender(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
     """Retorna distribuição de clientes por gênero - Algoritmo de segmentação"""
     logger.info(f"👥 Análise por gênero (start_date={start_date}, end_date={end_date})")
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     if data.empty or 'genero_cliente' not in data.columns:
         logger.warning("⚠️ Nenhum dado disponível para análise por gênero")
         return []
     
     try:
-        gender = data.groupby('genero_cliente').size().reset_index(name='value')
-        gender.columns = ['name', 'value']
+        gender = await analytics_pool.run(analytics.customers_by_gender, data, cube=get_cube_query(start_date, end_date, dataset_id, filters))
         logger.info(f"✅ Análise por gênero: {len(gender)} grupos encontrados")
-        return gender.to_dict('records')
+        return gender
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro ao agrupar por gênero: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao agrupar por gênero: {str(e)}")
 
 @app.get("/sales-by-state")
-async def get_sales_by_state(limit: int = 10, start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("sales_by_state")
+@columnar_option
+async def get_sales_by_state(limit: int = 10, start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
     """Retorna vendas por estado/região - Algoritmo de análise geográfica"""
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
-    
-    if data.empty or 'estado_cliente' not in data.columns:
-        return []
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     try:
-        states = data.groupby('estado_cliente')['valor_final'].sum().reset_index()
-        states.columns = ['name', 'value']
-        states = states.sort_values('value', ascending=False).head(limit)
-        
-        return states.to_dict('records')
+        return await analytics_pool.run(analytics.sales_by_state, data, limit, cube=get_cube_query(start_date, end_date, dataset_id, filters))
+    except (HTTPException, PoolSaturatedError):
+        raise
     except Exception as e:
-        print(f"Erro ao agrupar por estado: {e}")
-        return []
+        logger.error(f"❌ Erro ao agrupar por estado: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao agrupar por estado: {str(e)}")
 
 @app.get("/payment-methods")
-async def get_payment_methods(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("payment_methods")
+@columnar_option
+async def get_payment_methods(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
     """Retorna formas de pagamento - Algoritmo de análise de pagamentos"""
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
-    
-    if data.empty or 'forma_pagamento' not in data.columns:
-        return []
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     try:
-        payment = data.groupby('forma_pagamento').agg({
-            'id_transacao': 'count',
-            'valor_final': ['sum', 'mean']
-        }).reset_index()
-        
-        payment.columns = ['name', 'quantidade', 'valor_total', 'valor_medio']
-        payment = payment.sort_values('quantidade', ascending=False)
-        
-        return payment.to_dict('records')
+        return await analytics_pool.run(analytics.payment_methods, data, cube=get_cube_query(start_date, end_date, dataset_id, filters))
+    except (HTTPException, PoolSaturatedError):
+        raise
     except Exception as e:
-        print(f"Erro ao agrupar por forma de pagamento: {e}")
-        return []
+        logger.error(f"❌ Erro ao agrupar por forma de pagamento: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao agrupar por forma de pagamento: {str(e)}")
 
 @app.get("/customers-by-age")
-async def get_customers_by_age(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("customers_by_age")
+@columnar_option
+async def get_customers_by_age(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters),
+                               distinct: str = Query("exact", pattern="^(exact|approx)$", description="Clientes distintos: exact (códigos inteiros) ou approx (HyperLogLog diário)")):
     """Retorna distribuição de clientes por faixa etária - Algoritmo de segmentação"""
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
-    
-    if data.empty or 'idade_cliente' not in data.columns:
-        return []
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     try:
-        # Criar faixas etárias
-        bins = [0, 18, 25, 35, 45, 55, 65, 150]
-        labels = ['< 18', '18-25', '25-35', '35-45', '45-55', '55-65', '> 65']
-        data['faixa_etaria'] = pd.cut(data['idade_cliente'], bins=bins, labels=labels, right=False)
-        
-        age_dist = data.groupby('faixa_etaria', observed=True).agg({
-            'cliente_id': 'nunique'
-        }).reset_index()
-        
-        age_dist.columns = ['name', 'value']
-        return age_dist.to_dict('records')
+        sketch = await analytics_pool.run(get_sketch_query, start_date, end_date, dataset_id, filters) if distinct == "approx" else None
+        return await analytics_pool.run(analytics.customers_by_age, data, distinct=sketch)
+    except (HTTPException, PoolSaturatedError):
+        raise
     except Exception as e:
-        print(f"Erro ao distribuir por faixa etária: {e}")
-        return []
+        logger.error(f"❌ Erro ao distribuir por faixa etária: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao distribuir por faixa etária: {str(e)}")
 
 @app.get("/installments")
-async def get_installments(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("installments")
+@columnar_option
+async def get_installments(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
     """Retorna distribuição de parcelamento - Algoritmo de análise de pagamentos"""
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
-    
-    if data.empty or 'parcelas' not in data.columns:
-        return []
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     try:
-        installments = data.groupby('parcelas').agg({
-            'id_transacao': 'count',
-            'valor_final': 'sum'
-        }).reset_index()
-        
-        installments.columns = ['name', 'quantidade', 'value']
-        installments = installments.sort_values('quantidade', ascending=False)
-        return installments.to_dict('records')
+        return await analytics_pool.run(analytics.installments, data, cube=get_cube_query(start_date, end_date, dataset_id, filters))
+    except (HTTPException, PoolSaturatedError):
+        raise
     except Exception as e:
-        print(f"Erro ao agrupar por parcelamento: {e}")
-        return []
+        logger.error(f"❌ Erro ao agrupar por parcelamento: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao agrupar por parcelamento: {str(e)}")
 
 @app.get("/delivery-status")
-async def get_delivery_status(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("delivery_status")
+@columnar_option
+async def get_delivery_status(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
     """Retorna status de entrega - Algoritmo de análise logística"""
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
-    
-    if data.empty or 'status_entrega' not in data.columns:
-        return []
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     try:
-        status = data.groupby('status_entrega').agg({
-            'id_transacao': 'count'
-        }).reset_index()
-        
-        status.columns = ['name', 'value']
-        status = status.sort_values('value', ascending=False)
-        return status.to_dict('records')
+        return await analytics_pool.run(analytics.delivery_status, data, cube=get_cube_query(start_date, end_date, dataset_id, filters))
+    except (HTTPException, PoolSaturatedError):
+        raise
     except Exception as e:
-        print(f"Erro ao agrupar por status de entrega: {e}")
-        return []
+        logger.error(f"❌ Erro ao agrupar por status de entrega: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao agrupar por status de entrega: {str(e)}")
 
 @app.get("/product-ratings")
-async def get_product_ratings(limit: int = 10, start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("product_ratings")
+@columnar_option
+async def get_product_ratings(limit: int = 10, start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
     """Retorna produtos com menor avaliação - Algoritmo de análise de qualidade"""
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
-    
-    if data.empty or 'nome_produto' not in data.columns or 'avaliacao_produto' not in data.columns:
-        return []
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     try:
-        ratings = data.groupby('nome_produto').agg({
-            'avaliacao_produto': 'mean',
-            'id_transacao': 'count'
-        }).reset_index()
-        
-        ratings.columns = ['name', 'avaliacao', 'quantidade']
-        ratings = ratings[ratings['quantidade'] >= 2]  # Apenas produtos com 2+ avaliações
-        ratings = ratings.sort_values('avaliacao', ascending=True).head(limit)
-        return ratings[['name', 'avaliacao']].to_dict('records')
+        return await analytics_pool.run(analytics.product_ratings, data, limit, cube=get_cube_query(start_date, end_date, dataset_id, filters))
+    except (HTTPException, PoolSaturatedError):
+        raise
     except Exception as e:
-        print(f"Erro ao listar produtos com menor avaliação: {e}")
-        return []
+        logger.error(f"❌ Erro ao listar produtos com menor avaliação: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao listar produtos com menor avaliação: {str(e)}")
 
 @app.get("/average-delivery-time")
-async def get_average_delivery_time(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+@cached("average_delivery_time")
+async def get_average_delivery_time(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
     """Retorna tempo médio de entrega - Algoritmo de análise logística"""
-    data = get_current_data()
-    data = filter_data_by_date(data, start_date, end_date)
-    
-    if data.empty or 'tempo_entrega_dias' not in data.columns:
-        return {"tempo_medio": 0}
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
     
     try:
-        tempo_medio = float(data['tempo_entrega_dias'].mean())
-        return {"tempo_medio": round(tempo_medio, 1)}
+        return await analytics_pool.run(analytics.average_delivery_time, data, cube=get_cube_query(start_date, end_date, dataset_id, filters))
+    except (HTTPException, PoolSaturatedError):
+        raise
     except Exception as e:
-        print(f"Erro ao calcular tempo médio de entrega: {e}")
-        return {"tempo_medio": 0}
+        logger.error(f"❌ Erro ao calcular tempo médio de entrega: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular tempo médio de entrega: {str(e)}")
+
+@app.get("/dashboard")
+@cached("dashboard")
+async def get_dashboard(
+    start_date: Optional[str] = Query(None, description="Data inicial no formato YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Data final no formato YYYY-MM-DD"),
+    region: Optional[str] = Query(None, description="Região para filtrar (Norte, Nordeste, Sul, Sudeste, Centro-Oeste)"),
+    top_limit: int = Query(10, description="Quantidade de produtos no ranking"),
+    state_limit: int = Query(10, description="Quantidade de estados"),
+    ratings_limit: int = Query(10, description="Quantidade de produtos com menor avaliação"),
+    dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"),
+    filters: DimensionFilters = Depends(dimension_filters)
+):
+    """
+    Retorna todos os widgets do dashboard em uma única resposta
+    
+    - Filtra os dados uma única vez (datas, região e demais dimensões pelos índices invertidos)
+    - Reaproveita lucro por linha e o agrupamento por produto entre widgets
+    - Substitui as 12 chamadas individuais feitas pelo frontend
+    """
+    logger.info(f"🧭 Dashboard (start_date={start_date}, end_date={end_date}, region={region})")
+    if region:
+        filters = filters.merged('regiao', [region])
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
+    
+    # O cubo diário só responde filtros por data; com região/dimensões a fatia é varrida
+    cube = get_cube_query(start_date, end_date, dataset_id, filters)
+    result = await analytics_pool.run(analytics.dashboard, data, top_limit=top_limit, state_limit=state_limit, ratings_limit=ratings_limit, cube=cube)
+    logger.info(f"✅ Dashboard calculado: {len(data)} registros analisados")
+    return result
 
 # ============================================================================
 # ENDPOINTS DE RELATÓRIOS
 # ============================================================================
 
 @app.get("/reports/summary")
-async def get_report_summary(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
-    """Relatório resumido com principais insights"""
-    data = get_current_data()
-    
-    # KPIs
-    kpis = await get_kpis(start_date=start_date, end_date=end_date)
-    
-    # Top 3 categorias
-    categories = await get_sales_by_category(start_date=start_date, end_date=end_date)
-    top_categories = categories[:3] if categories else []
-    
-    # Top 5 produtos
-    top_products_data = await get_top_products(limit=5, start_date=start_date, end_date=end_date)
+async def get_report_summary(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
+    """
+    Relatório resumido com principais insights (KPIs, top 3 categorias e top 5 produtos)
+
+    - Filtra os dados uma única vez e compartilha a fatia e o cubo entre as seções
+    - Seções calculadas em paralelo no pool de análise
+    - Só as seções ficam em cache: o timestamp é o da resposta
+    """
+    logger.info(f"📝 Relatório resumido (start_date={start_date}, end_date={end_date})")
+    sections = await report_summary_sections(start_date, end_date, dataset_id, filters)
     
     return {
         "timestamp": pd.Timestamp.now().isoformat(),
-        "kpis": kpis,
-        "top_categories": top_categories,
-        "top_products": top_products_data,
-        "data_source": "uploaded" if 'current' in uploaded_data else "default"
+        **sections,
+        "data_source": "dataset" if dataset_id else ("uploaded" if 'current' in uploaded_data else "default")
     }
 
 @app.get("/reports/detailed")
-async def get_report_detailed(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
-    """Relatório detalhado com todas as análises"""
+async def get_report_detailed(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"), filters: DimensionFilters = Depends(dimension_filters)):
+    """
+    Relatório detalhado com todas as análises
+
+    - Análise estatística (dataset inteiro, pré-calculada) junto com as seções do período
+    - Filtra os dados uma única vez; lucro por linha e agrupamento por produto calculados uma vez
+    - Seções independentes em paralelo: a latência acompanha a seção mais lenta, não a soma
+    - Só as seções ficam em cache: o timestamp é o da resposta
+    """
+    logger.info(f"📝 Relatório detalhado (start_date={start_date}, end_date={end_date})")
+    sections = await report_detailed_sections(start_date, end_date, dataset_id, filters)
     
-    report = {
+    return {
         "timestamp": pd.Timestamp.now().isoformat(),
-        "analysis": await get_analysis(),
-        "kpis": await get_kpis(start_date=start_date, end_date=end_date),
-        "monthly_sales": await get_sales_by_month(start_date=start_date, end_date=end_date),
-        "sales_by_category": await get_sales_by_category(start_date=start_date, end_date=end_date),
-        "top_products": await get_top_products(limit=10, start_date=start_date, end_date=end_date),
-        "customers_by_gender": await get_customers_by_gender(start_date=start_date, end_date=end_date),
-        "sales_by_state": await get_sales_by_state(limit=15, start_date=start_date, end_date=end_date),
-        "payment_methods": await get_payment_methods(start_date=start_date, end_date=end_date),
+        **sections,
     }
-    
-    return report
+
+@cached("reports_summary")
+async def report_summary_sections(start_date: Optional[str], end_date: Optional[str], dataset_id: Optional[str],
+                                  filters: Optional[DimensionFilters]) -> Dict:
+    """Seções do relatório resumido (sem timestamp, que é da resposta)"""
+    builder = report_builder(start_date, end_date, dataset_id, filters)
+    return await builder.build(reports.SUMMARY_SECTIONS)
+
+@cached("reports_detailed")
+async def report_detailed_sections(start_date: Optional[str], end_date: Optional[str], dataset_id: Optional[str],
+                                   filters: Optional[DimensionFilters]) -> Dict:
+    """Análise e seções do relatório detalhado (sem timestamp, que é da resposta)"""
+    builder = report_builder(start_date, end_date, dataset_id, filters)
+    analysis, sections = await asyncio.gather(
+        get_analysis(dataset_id=dataset_id, start_date=None, end_date=None),
+        builder.build(reports.DETAILED_SECTIONS),
+    )
+    logger.info(f"✅ Relatório detalhado calculado: {len(builder.data)} registros analisados")
+    return {"analysis": analysis, **sections}
+
+def report_builder(start_date: Optional[str], end_date: Optional[str], dataset_id: Optional[str],
+                   filters: Optional[DimensionFilters]) -> reports.ReportBuilder:
+    """Fatia e cubo do período resolvidos uma vez para todas as seções do relatório"""
+    data = get_filtered_data(start_date, end_date, dataset_id, filters)
+    return reports.ReportBuilder(analytics_pool, data, cube=get_cube_query(start_date, end_date, dataset_id, filters))
 
 # ============================================================================
 # ENDPOINTS DE EXPORTAÇÃO
 # ============================================================================
 
-def filter_data_by_region(data: pd.DataFrame, region: Optional[str] = None) -> pd.DataFrame:
-    """Filtra dados por região"""
-    if not region or data.empty or 'regiao' not in data.columns:
-        return data
-    
-    try:
-        region_mapping = {
-            'norte': 'Norte',
-            'nordeste': 'Nordeste',
-            'centro-oeste': 'Centro-Oeste',
-            'sudeste': 'Sudeste',
-            'sul': 'Sul'
-        }
-        
-        region_normalized = region_mapping.get(region.lower(), region)
-        df = data[data['regiao'].str.lower() == region_normalized.lower()]
-        logger.debug(f"Filtro de região aplicado: {region_normalized} ({len(df)} registros)")
-        return df
-    except Exception as e:
-        logger.error(f"Erro ao filtrar por região: {e}", exc_info=True)
-        return data
-
 @app.get("/export/csv")
 async def export_csv(
     start_date: Optional[str] = Query(None, description="Data inicial no formato YYYY-MM-DD"),
     end_date: Optional[str] = Query(None, description="Data final no formato YYYY-MM-DD"),
-    region: Optional[str] = Query(None, description="Região para filtrar (Norte, Nordeste, Sul, Sudeste, Centro-Oeste)")
+    region: Optional[str] = Query(None, description="Região para filtrar (Norte, Nordeste, Sul, Sudeste, Centro-Oeste)"),
+    dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"),
+    filters: DimensionFilters = Depends(dimension_filters),
+    accept_encoding: Optional[str] = Header(None)
 ):
     """
     Exporta dados de vendas em formato CSV com filtros opcionais
@@ -789,18 +1197,22 @@ async def export_csv(
     - start_date: Data inicial (formato: YYYY-MM-DD)
     - end_date: Data final (formato: YYYY-MM-DD)
     - region: Região específica
+    - regiao, categoria, estado_cliente, ...: filtros de dimensão (valores separados por vírgula)
+    - dataset_id: Dataset registrado (padrão: dataset atual)
     
-    Retorna arquivo CSV para download
+    Retorna arquivo CSV para download, gerado e enviado em blocos de EXPORT_CHUNK_ROWS
+    linhas (comprimido com gzip quando o cliente envia Accept-Encoding: gzip)
     """
     try:
-        data = get_current_data()
+        data = get_current_data(dataset_id)
         
         if data.empty:
             raise HTTPException(status_code=404, detail="Nenhum dado disponível para exportação")
         
         # Aplicar filtros
-        filtered_data = filter_data_by_date(data, start_date, end_date)
-        filtered_data = filter_data_by_region(filtered_data, region)
+        if region:
+            filters = filters.merged('regiao', [region])
+        filtered_data = get_filtered_data(start_date, end_date, dataset_id, filters)
         
         if filtered_data.empty:
             raise HTTPException(status_code=404, detail="Nenhum dado encontrado com os filtros aplicados")
@@ -818,23 +1230,26 @@ async def export_csv(
         
         filename = "_".join(filename_parts) + ".csv"
         
-        # Converter para CSV
-        output = BytesIO()
-        filtered_data.to_csv(output, index=False, encoding='utf-8-sig')
-        output.seek(0)
+        # Converter para CSV em blocos, gerados no pool de exportação à medida que são enviados
+        chunks = export.csv_chunks(filtered_data, EXPORT_CHUNK_ROWS)
+        headers = {
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Type": "text/csv; charset=utf-8",
+            "Vary": "Accept-Encoding"
+        }
+        if export.accepts_gzip(accept_encoding):
+            chunks = export.gzip_chunks(chunks, EXPORT_GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
         
-        logger.info(f"✅ Exportação CSV gerada: {filename} ({len(filtered_data)} registros)")
+        logger.info(f"✅ Exportação CSV iniciada: {filename} ({len(filtered_data)} registros)")
         
         return StreamingResponse(
-            output,
+            export_pool.stream(chunks),
             media_type="text/csv",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Content-Type": "text/csv; charset=utf-8"
-            }
+            headers=headers
         )
     
-    except HTTPException:
+    except (HTTPException, PoolSaturatedError):
         raise
     except Exception as e:
         logger.error(f"❌ Erro ao exportar CSV: {e}", exc_info=True)
@@ -844,7 +1259,9 @@ async def export_csv(
 async def export_excel(
     start_date: Optional[str] = Query(None, description="Data inicial no formato YYYY-MM-DD"),
     end_date: Optional[str] = Query(None, description="Data final no formato YYYY-MM-DD"),
-    region: Optional[str] = Query(None, description="Região para filtrar (Norte, Nordeste, Sul, Sudeste, Centro-Oeste)")
+    region: Optional[str] = Query(None, description="Região para filtrar (Norte, Nordeste, Sul, Sudeste, Centro-Oeste)"),
+    dataset_id: Optional[str] = Query(None, description="ID retornado pelo /upload (padrão: dataset atual)"),
+    filters: DimensionFilters = Depends(dimension_filters)
 ):
     """
     Exporta dados de vendas em formato Excel (.xlsx) com filtros opcionais
@@ -853,18 +1270,21 @@ async def export_excel(
     - start_date: Data inicial (formato: YYYY-MM-DD)
     - end_date: Data final (formato: YYYY-MM-DD)
     - region: Região específica
+    - regiao, categoria, estado_cliente, ...: filtros de dimensão (valores separados por vírgula)
+    - dataset_id: Dataset registrado (padrão: dataset atual)
     
     Retorna arquivo Excel para download
     """
     try:
-        data = get_current_data()
+        data = get_current_data(dataset_id)
         
         if data.empty:
             raise HTTPException(status_code=404, detail="Nenhum dado disponível para exportação")
         
         # Aplicar filtros
-        filtered_data = filter_data_by_date(data, start_date, end_date)
-        filtered_data = filter_data_by_region(filtered_data, region)
+        if region:
+            filters = filters.merged('regiao', [region])
+        filtered_data = get_filtered_data(start_date, end_date, dataset_id, filters)
         
         if filtered_data.empty:
             raise HTTPException(status_code=404, detail="Nenhum dado encontrado com os filtros aplicados")
@@ -882,63 +1302,38 @@ async def export_excel(
         
         filename = "_".join(filename_parts) + ".xlsx"
         
-        # Converter para Excel
-        output = BytesIO()
+        # Aba Resumo com os KPIs da mesma fatia (cubo diário quando só há filtro de datas)
+        summary = None
+        if 'valor_final' in filtered_data.columns:
+            kpis = await compute_kpis(filtered_data, start_date, end_date, dataset_id, filters, distinct="exact")
+            summary = export.summary_rows(kpis)
         
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Aba principal com dados
-            filtered_data.to_excel(writer, sheet_name='Dados de Vendas', index=False)
-            
-            # Aba com resumo (KPIs)
-            if 'valor_final' in filtered_data.columns:
-                summary_data = {
-                    'Métrica': [
-                        'Total de Vendas',
-                        'Faturamento Total',
-                        'Lucro Total',
-                        'Ticket Médio',
-                        'Clientes Únicos'
-                    ],
-                    'Valor': [
-                        len(filtered_data),
-                        f"R$ {filtered_data['valor_final'].sum():,.2f}" if 'valor_final' in filtered_data.columns else 'N/A',
-                        f"R$ {filtered_data['lucro'].sum():,.2f}" if 'lucro' in filtered_data.columns else 'N/A',
-                        f"R$ {filtered_data['valor_final'].mean():,.2f}" if 'valor_final' in filtered_data.columns else 'N/A',
-                        filtered_data['id_cliente'].nunique() if 'id_cliente' in filtered_data.columns else 'N/A'
-                    ]
-                }
-                
-                summary_df = pd.DataFrame(summary_data)
-                summary_df.to_excel(writer, sheet_name='Resumo', index=False)
-            
-            # Aba com informações de filtros
-            filter_info = {
-                'Filtro': ['Data Inicial', 'Data Final', 'Região', 'Total de Registros', 'Data de Geração'],
-                'Valor': [
-                    start_date or 'Não aplicado',
-                    end_date or 'Não aplicado',
-                    region or 'Todas as regiões',
-                    len(filtered_data),
-                    datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-                ]
-            }
-            filter_df = pd.DataFrame(filter_info)
-            filter_df.to_excel(writer, sheet_name='Informações', index=False)
+        # Aba com informações de filtros
+        applied_filters = [
+            ('Data Inicial', start_date or 'Não aplicado'),
+            ('Data Final', end_date or 'Não aplicado'),
+            ('Região', region or 'Todas as regiões'),
+            *[(column, ', '.join(values)) for column, values in filters if column != 'regiao' or not region],
+            ('Total de Registros', len(filtered_data)),
+            ('Data de Geração', datetime.now().strftime("%d/%m/%Y %H:%M:%S")),
+        ]
         
-        output.seek(0)
+        # Converter para Excel em modo write-only (arquivo temporário acima de EXPORT_SPOOL_ROWS linhas)
+        content = await export_pool.run(export.write_excel, filtered_data, summary, applied_filters, EXPORT_SPOOL_ROWS)
         
         logger.info(f"✅ Exportação Excel gerada: {filename} ({len(filtered_data)} registros)")
         
         return StreamingResponse(
-            output,
+            export.file_chunks(content),
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            background=BackgroundTask(export.discard, content),
             headers={
                 "Content-Disposition": f"attachment; filename={filename}",
                 "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             }
         )
     
-    except HTTPException:
+    except (HTTPException, PoolSaturatedError):
         raise
     except Exception as e:
         logger.error(f"❌ Erro ao exportar Excel: {e}", exc_info=True)
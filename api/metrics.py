@@ -0,0 +1,323 @@
+"""
+Instrumentação de latência
+- Histogramas de latência por endpoint (método, rota, status) e por etapa (filtro,
+  tarefas dos pools de workers, passos da validação, serialização JSON)
+- /metrics no formato texto do Prometheus
+- Perfil por requisição opcional (cabeçalho X-Profile): amostragem das pilhas de todas as
+  threads durante a requisição, com as etapas que ela executou
+- Só biblioteca padrão; custo por observação: um perf_counter e um bisect sob lock
+"""
+
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Limites superiores (segundos) dos buckets dos histogramas
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Rotas sem correspondência (404) compartilham um rótulo: caminhos arbitrários não viram séries novas
+UNMATCHED_ROUTE = "unmatched"
+
+PROFILE_HEADER = b"x-profile"
+# Funções mais frequentes listadas no perfil
+PROFILE_TOP_FUNCTIONS = 30
+# Pilhas paradas nestes módulos são threads ociosas (pools esperando tarefa, event loop em select)
+IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+# Etapas da requisição em perfil (None fora do modo de perfil)
+_request_stages: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_stages", default=None)
+
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus, uma série por combinação de rótulos"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # rótulos -> [contagem por bucket (+Inf no fim), soma]
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, labels: Tuple[str, ...], seconds: float) -> None:
+        position = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += seconds
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            base = _labels(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{{{base}{',' if base else ''}le=\"{le}\"}} {cumulative}")
+            lines.append(f"{self.name}_sum{{{base}}} {total!r}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+    def summary(self) -> List[Dict]:
+        """Contagem, média e p50/p95/p99 estimados pelos buckets (para /metrics?format=json)"""
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        result = []
+        for labels, counts, total in sorted(series):
+            count = sum(counts)
+            result.append({
+                **dict(zip(self.label_names, labels)),
+                "count": count,
+                "mean_ms": round(total / count * 1000, 3) if count else 0,
+                **{f"p{q}_ms": self._quantile(counts, count, q / 100) for q in (50, 95, 99)},
+            })
+        return result
+
+    def _quantile(self, counts: List[int], count: int, q: float) -> Optional[float]:
+        """Limite superior do bucket que contém o quantil (None se cair no +Inf)"""
+        rank, cumulative = q * count, 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return round(bound * 1000, 3)
+        return None
+
+
+REQUEST_DURATION = Histogram(
+    "hanami_request_duration_seconds",
+    "Latência das requisições HTTP até o último byte da resposta",
+    ("method", "route", "status"),
+)
+STAGE_DURATION = Histogram(
+    "hanami_stage_duration_seconds",
+    "Duração das etapas internas (filtro, tarefas dos pools, validação, serialização)",
+    ("stage",),
+)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    STAGE_DURATION.observe((name,), seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mede o bloco como uma etapa (vale em código síncrono, em threads e em torno de await)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def task_name(fn) -> str:
+    """Nome da etapa de uma tarefa de pool (funções, métodos ligados e functools.partial)"""
+    fn = getattr(fn, "func", fn)
+    return getattr(fn, "__name__", type(fn).__name__)
+
+
+def render(gauges: Optional[List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]] = None) -> str:
+    """
+    Texto de exposição do Prometheus com os histogramas e métricas extras
+
+    gauges: (nome, tipo, ajuda, [(rótulos, valor)]) lidos no momento da coleta
+    (ex: contadores do cache e dos pools, mantidos pelos próprios objetos).
+    """
+    lines = REQUEST_DURATION.render() + STAGE_DURATION.render()
+    for name, kind, help_text, samples in gauges or []:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            base = _labels(labels.items())
+            lines.append(f"{name}{{{base}}} {value!r}" if base else f"{name} {value!r}")
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> Dict:
+    return {"requests": REQUEST_DURATION.summary(), "stages": STAGE_DURATION.summary()}
+
+
+def _labels(pairs) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# ============================================================================
+# PERFIL POR REQUISIÇÃO
+# ============================================================================
+
+class SamplingProfiler:
+    """
+    Amostra as pilhas de todas as threads a cada `interval` segundos
+
+    O trabalho pesado roda nos pools de workers, fora da thread do event loop: um
+    profiler determinístico (cProfile) na thread da requisição não o veria. A amostragem
+    cobre o processo inteiro, então requisições concorrentes aparecem no mesmo perfil.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_filename.endswith(IDLE_MODULES):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def report(self, top: int = PROFILE_TOP_FUNCTIONS) -> Dict:
+        """Funções mais amostradas (própria e acumulada) e pilhas no formato "folded" (flame graph)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        busy = sum(self.stacks.values()) or 1
+        return {
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self.samples,
+            "busy_samples": sum(self.stacks.values()),
+            "top_self": [{"function": label, "samples": count, "percent": round(count / busy * 100, 1)}
+                         for label, count in own.most_common(top)],
+            "top_total": [{"function": label, "samples": count, "percent": round(count / busy * 100, 1)}
+                          for label, count in total.most_common(top)],
+            "folded": {";".join(stack): count for stack, count in self.stacks.most_common()},
+        }
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# ============================================================================
+# MIDDLEWARE ASGI
+# ============================================================================
+
+class MetricsMiddleware:
+    """
+    Mede cada requisição HTTP até o último byte da resposta (inclui streaming)
+
+    Com profiling=True e o cabeçalho X-Profile: 1, a resposta é consumida e substituída por
+    um JSON com a duração, as etapas executadas e o perfil amostrado da requisição.
+    """
+
+    def __init__(self, app, profiling: bool = False, profile_interval: float = 0.005):
+        self.app = app
+        self.profiling = profiling
+        self.profile_interval = profile_interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.profiling and (header(scope, PROFILE_HEADER) or b"").strip().lower() in (b"1", b"true"):
+            await self._profile(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            REQUEST_DURATION.observe((scope["method"], route_label(scope), str(status)), time.perf_counter() - start)
+
+    async def _profile(self, scope, receive, send):
+        status = 500
+        body_bytes = 0
+
+        async def capture(message):
+            nonlocal status, body_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+
+        stages: List[Tuple[str, float]] = []
+        token = _request_stages.set(stages)
+        profiler = SamplingProfiler(self.profile_interval).start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            elapsed = time.perf_counter() - start
+            profiler.stop()
+            _request_stages.reset(token)
+            REQUEST_DURATION.observe((scope["method"], route_label(scope), str(status)), elapsed)
+
+        body = json.dumps({
+            "route": route_label(scope),
+            "status_code": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "response_bytes": body_bytes,
+            "stages": [{"stage": name, "ms": round(seconds * 1000, 3)} for name, seconds in stages],
+            "profile": profiler.report(),
+        }, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def route_label(scope) -> str:
+    """Modelo da rota (ex: /datasets/{dataset_id}), preenchido pelo roteador durante a requisição"""
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", UNMATCHED_ROUTE)
+    # Rotas do Starlette (docs, openapi) não se registram no escopo, mas não têm parâmetros
+    if scope.get("endpoint") is not None:
+        return scope["path"]
+    return UNMATCHED_ROUTE
+
+
+def header(scope, name: bytes) -> Optional[bytes]:
+    """Valor bruto do primeiro cabeçalho `name` (minúsculo) do escopo ASGI; None se ausente"""
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value
+    return None
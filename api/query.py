@@ -0,0 +1,255 @@
+"""
+Filtros de dimensão e consulta tabular de /sales
+- Filtros combinados (DimensionFilters) resolvidos pelos índices invertidos do dataset:
+  listas de linhas de cada dimensão recortadas pelo intervalo de datas e intersectadas a
+  partir da menor (busca binária), sem comparar textos linha a linha
+- /sales: filtros de dimensão, intervalo de datas e faixa de valor_final
+- Ordenação por qualquer coluna via permutação pré-calculada (Dataset.sort_index)
+- Paginação por cursor (keyset): o cursor guarda a chave (valor, linha) do último registro
+  e a página seguinte começa por busca binária na permutação, tão barata quanto a primeira
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset import Dataset, parse_date_range
+
+VALUE_COLUMN = 'valor_final'
+
+# Ordenação padrão: a própria ordem do dataset (por data)
+DEFAULT_SORT = 'data_venda'
+
+# Primeiro bloco da varredura com filtros (dobra a cada bloco)
+SCAN_BLOCK_ROWS = 4096
+
+
+class InvalidQueryError(ValueError):
+    """Filtro, ordenação ou cursor inválido"""
+
+
+class DimensionFilters:
+    """Filtros de dimensão normalizados (coluna -> valores em minúsculas), hashável para a chave do cache"""
+
+    def __init__(self, filters: Optional[Dict[str, Iterable[str]]] = None):
+        items = []
+        for column, values in (filters or {}).items():
+            normalized = tuple(sorted({value.strip().lower() for value in values if value and value.strip()}))
+            if normalized:
+                items.append((column, normalized))
+        self.items: Tuple[Tuple[str, Tuple[str, ...]], ...] = tuple(sorted(items))
+
+    @classmethod
+    def parse(cls, **raw: Optional[str]) -> "DimensionFilters":
+        """Valores separados por vírgula: parse(regiao='Sul, Sudeste')"""
+        return cls({column: parse_values(value) for column, value in raw.items()})
+
+    def merged(self, column: str, values: Iterable[str]) -> "DimensionFilters":
+        """Acrescenta valores a uma dimensão (ex: ?region= legado das exportações)"""
+        filters: Dict[str, List[str]] = {name: list(selected) for name, selected in self.items}
+        filters.setdefault(column, []).extend(values)
+        return DimensionFilters(filters)
+
+    def __iter__(self) -> Iterator[Tuple[str, Tuple[str, ...]]]:
+        return iter(self.items)
+
+    def __bool__(self) -> bool:
+        return bool(self.items)
+
+    def __hash__(self) -> int:
+        return hash(self.items)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, DimensionFilters):
+            return NotImplemented
+        return self.items == other.items
+
+    def __repr__(self) -> str:
+        return f"DimensionFilters({dict(self.items)})"
+
+
+class SalesPage:
+    """Linhas da página (posições no frame), total filtrado e cursor da página seguinte"""
+
+    def __init__(self, rows: np.ndarray, total: int, next_cursor: Optional[str]):
+        self.rows = rows
+        self.total = total
+        self.next_cursor = next_cursor
+
+
+def parse_values(raw: Optional[str]) -> List[str]:
+    """'Sul, Sudeste' -> ['Sul', 'Sudeste']"""
+    if not raw:
+        return []
+    return [value.strip() for value in raw.split(',') if value.strip()]
+
+
+def select_rows(dataset: Dataset, filters: DimensionFilters, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+    """Linhas em [lo, hi) que passam em todos os filtros de dimensão, em ordem crescente"""
+    postings = []
+    for column, values in filters:
+        if column not in dataset.frame.columns:
+            raise InvalidQueryError(f"Coluna de filtro inexistente: {column}")
+        postings.append(dataset.dimension_index(column).lookup(list(values), lo, hi))
+
+    # Interseção a partir da menor lista: custo proporcional a ela, não ao dataset
+    postings.sort(key=len)
+    rows = postings[0]
+    for other in postings[1:]:
+        if not len(rows):
+            break
+        positions = np.searchsorted(other, rows).clip(max=max(len(other) - 1, 0))
+        rows = rows[other[positions] == rows] if len(other) else other
+    return rows
+
+
+def filter_frame(dataset: Dataset, filters: DimensionFilters,
+                 start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """Fatia do dataset pelo intervalo de datas e pelos filtros (só as linhas aceitas são copiadas)"""
+    lo, hi = _date_rows(dataset, start, end)
+    if not filters:
+        return dataset.frame.iloc[lo:hi]
+    return dataset.frame.take(select_rows(dataset, filters, lo, hi))
+
+
+def select_page(
+    dataset: Dataset,
+    filters: DimensionFilters,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    value_min: Optional[float] = None,
+    value_max: Optional[float] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+    limit: int = 100,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> SalesPage:
+    """Filtra, ordena e pagina o dataset sem copiar o frame (só as linhas da página são lidas)"""
+    frame = dataset.frame
+    sort_by = sort_by or DEFAULT_SORT
+    if sort_by not in frame.columns:
+        raise InvalidQueryError(f"Coluna de ordenação inexistente: {sort_by}")
+
+    try:
+        start, end = parse_date_range(start_date, end_date)
+    except (ValueError, TypeError) as e:
+        raise InvalidQueryError(f"Data inválida: {e}")
+    lo, hi = _date_rows(dataset, start, end)
+    mask = None
+    if filters:
+        mask = np.zeros(len(frame), dtype=bool)
+        mask[select_rows(dataset, filters, lo, hi)] = True
+    mask = value_mask(frame, mask, value_min, value_max)
+    total = (hi - lo) if mask is None else int(np.count_nonzero(mask[lo:hi]))
+
+    index = dataset.sort_index(sort_by)
+    size = len(index)
+    order = index.order[::-1] if descending else index.order
+
+    # Ordenado pela data: o intervalo vira uma faixa contínua da permutação
+    first, stop = 0, size
+    in_range = None
+    if index.is_date and sort_by == 'data_venda':
+        key_lo, key_hi = index.key_range(start, end)
+        first, stop = (size - key_hi, size - key_lo) if descending else (key_lo, key_hi)
+    elif (lo, hi) != (0, len(frame)):
+        in_range = (lo, hi)
+
+    if cursor:
+        sort_key, row = decode_cursor(cursor, sort_by, descending)
+        try:
+            after = size - index.bound(sort_key, row, 'left') if descending else index.bound(sort_key, row, 'right')
+        except (ValueError, TypeError, OverflowError):
+            raise InvalidQueryError("Cursor inválido")
+        first, offset = max(first, after), 0
+
+    # Sem filtro linha a linha o offset é só um deslocamento na permutação
+    if mask is None and in_range is None:
+        first, offset = min(first + offset, stop), 0
+
+    positions = _scan(order, first, stop, offset + limit + 1, mask, in_range)[offset:]
+    has_more = len(positions) > limit
+    positions = positions[:limit]
+    rows = order[positions]
+
+    next_cursor = None
+    if has_more and len(positions):
+        last = int(positions[-1])
+        key_position = size - 1 - last if descending else last
+        next_cursor = encode_cursor(sort_by, descending, index.value_at(key_position), int(rows[-1]))
+    return SalesPage(rows, total, next_cursor)
+
+
+def value_mask(frame: pd.DataFrame, mask: Optional[np.ndarray],
+               value_min: Optional[float] = None, value_max: Optional[float] = None) -> Optional[np.ndarray]:
+    """Restringe a máscara à faixa de valor_final (None = todas as linhas)"""
+    if value_min is None and value_max is None:
+        return mask
+    if VALUE_COLUMN not in frame.columns:
+        raise InvalidQueryError(f"Coluna {VALUE_COLUMN} ausente no dataset")
+    values = frame[VALUE_COLUMN].to_numpy()
+    if value_min is not None:
+        mask = _combine(mask, values >= value_min)
+    if value_max is not None:
+        mask = _combine(mask, values <= value_max)
+    return mask
+
+
+def encode_cursor(sort_by: str, descending: bool, value: Any, row: int) -> str:
+    payload = json.dumps({"s": sort_by, "d": descending, "v": value, "r": row}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_by: str, descending: bool) -> Tuple[Any, int]:
+    """(valor, linha) do último registro entregue; o cursor precisa ser da mesma ordenação"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        sort_key, row = payload["v"], int(payload["r"])
+        same_order = payload["s"] == sort_by and bool(payload["d"]) == descending
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise InvalidQueryError("Cursor inválido")
+    if not same_order:
+        raise InvalidQueryError("Cursor gerado com outra ordenação (sort_by/sort_order)")
+    return sort_key, row
+
+
+def _scan(order: np.ndarray, first: int, stop: int, wanted: int,
+          mask: Optional[np.ndarray], in_range: Optional[Tuple[int, int]]) -> np.ndarray:
+    """Posições da permutação em [first, stop) aceitas pelos filtros, até juntar `wanted`"""
+    if mask is None and in_range is None:
+        return np.arange(first, min(stop, first + wanted))
+
+    found: List[np.ndarray] = []
+    count = 0
+    block = max(SCAN_BLOCK_ROWS, wanted)
+    position = first
+    while position < stop and count < wanted:
+        end = min(stop, position + block)
+        rows = order[position:end]
+        accepted = np.ones(len(rows), dtype=bool) if mask is None else mask[rows]
+        if in_range is not None:
+            accepted &= (rows >= in_range[0]) & (rows < in_range[1])
+        hits = np.flatnonzero(accepted) + position
+        found.append(hits)
+        count += len(hits)
+        position = end
+        block *= 2
+    if not found:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(found)[:wanted]
+
+
+def _date_rows(dataset: Dataset, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> Tuple[int, int]:
+    if dataset.date_index is None:
+        return 0, len(dataset.frame)
+    return dataset.date_index.row_range(start, end)
+
+
+def _combine(mask: Optional[np.ndarray], other: np.ndarray) -> np.ndarray:
+    return other if mask is None else mask & other
@@ -0,0 +1,342 @@
+"""
+Registro de datasets enviados (vários usuários ao mesmo tempo)
+- Cada upload recebe um dataset_id; os endpoints aceitam ?dataset_id= para consultá-lo
+- Gravação imediata no formato colunar do snapshot (dataset-<id>): sobrevive a reinícios
+  e fica visível para os outros workers do uvicorn
+- Orçamento global de memória com despejo LRU: datasets despejados só perdem a referência
+  em memória e são recarregados sob demanda (memory-map) na próxima consulta
+- Cada dataset residente acompanha o próprio ponteiro (SnapshotWatcher): um append feito
+  em outro worker é visto na consulta seguinte
+- resident() só consulta a memória e um os.stat; a recarga do disco (load) roda fora do
+  lock do registro, no pool de análise, com uma carga por ID de cada vez
+- Disco também limitado: a cada registro, snapshots sem uso há mais que o TTL e os menos
+  usados acima do orçamento de disco são removidos (último uso em dataset-<id>.used,
+  visível para todos os workers); o dataset atual e o recém-registrado ficam
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import snapshot
+from dataset import Dataset
+
+logger = logging.getLogger("analytics_api")
+
+# Prefixo dos snapshots dos datasets registrados (dataset-<id>.json)
+SNAPSHOT_PREFIX = "dataset-"
+
+DATASET_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Intervalo mínimo (s) entre atualizações do marcador de último uso de um dataset
+TOUCH_INTERVAL = 60
+
+
+class DatasetNotFoundError(Exception):
+    """dataset_id inválido, removido ou sem snapshot em disco"""
+
+
+class _Entry:
+    """Dataset residente em memória e o tamanho contado no orçamento"""
+
+    def __init__(self, dataset: Dataset, watcher: Optional[snapshot.SnapshotWatcher]):
+        self.dataset = dataset
+        # Sem watcher o dataset não tem snapshot: não pode ser despejado nem recarregado
+        self.watcher = watcher
+        self.size = dataset.memory_usage()
+
+    @property
+    def persisted(self) -> bool:
+        return self.watcher is not None
+
+
+class DatasetRegistry:
+    """
+    Datasets por ID, limitados por memória (LRU) e persistidos em <directory>
+
+    max_disk_bytes e ttl_seconds limitam os snapshots em disco (0 = sem limite).
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_disk_bytes: int = 0, ttl_seconds: float = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Watchers de IDs sendo recarregados: cargas simultâneas do mesmo ID esperam a mesma
+        self._loading: Dict[str, snapshot.SnapshotWatcher] = {}
+        # Último marcador de uso gravado por ID (limita os os.utime a um por TOUCH_INTERVAL)
+        self._touched: Dict[str, float] = {}
+        self.current_bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def add(self, dataset: Dataset) -> Tuple[str, Dataset]:
+        """
+        Registra um dataset e retorna (dataset_id, versão residente)
+
+        A versão residente é a cópia mapeada do snapshot recém-gravado; se a gravação
+        falhar, o dataset fica só em memória e nunca é despejado.
+        """
+        dataset_id = uuid.uuid4().hex
+        entry = self._persist(dataset_id, dataset)
+        with self._lock:
+            self._insert(dataset_id, entry)
+        logger.info(f"🗂️ Dataset {dataset_id} registrado ({len(entry.dataset)} registros)")
+        self.prune(keep=(dataset_id,))
+        return dataset_id, entry.dataset
+
+    def replace(self, dataset_id: str, dataset: Dataset) -> Dataset:
+        """Grava uma nova versão do dataset sob o mesmo ID (append) e retorna a versão residente"""
+        self.get(dataset_id)
+        entry = self._persist(dataset_id, dataset)
+        with self._lock:
+            previous = self._entries.pop(dataset_id, None)
+            if previous is not None:
+                self.current_bytes -= previous.size
+            self._insert(dataset_id, entry)
+        self.prune(keep=(dataset_id,))
+        return entry.dataset
+
+    def get(self, dataset_id: str) -> Dataset:
+        """
+        Dataset pelo ID, recarregado do disco se tiver sido despejado ou vier de outro worker
+
+        A recarga bloqueia quem chama: no event loop, chame load() no pool antes (ver resident()).
+        """
+        dataset = self.resident(dataset_id)
+        return dataset if dataset is not None else self.load(dataset_id)
+
+    def resident(self, dataset_id: str) -> Optional[Dataset]:
+        """Dataset em memória e sem versão nova no disco (um os.stat); None se precisar de load()"""
+        if not DATASET_ID_PATTERN.match(dataset_id or ""):
+            raise DatasetNotFoundError(dataset_id)
+        with self._lock:
+            entry = self._entries.get(dataset_id)
+            if entry is None or (entry.watcher is not None and entry.watcher.changed()):
+                return None
+            self._entries.move_to_end(dataset_id)
+        self._touch(dataset_id)
+        return entry.dataset
+
+    def load(self, dataset_id: str) -> Dataset:
+        """
+        Recarrega o dataset do disco (despejado, vindo de outro worker ou com versão nova)
+
+        O memory-map e o cubo são montados fora do lock do registro: só cargas do mesmo ID
+        esperam umas pelas outras (lock do watcher), as demais consultas seguem.
+        """
+        if not DATASET_ID_PATTERN.match(dataset_id or ""):
+            raise DatasetNotFoundError(dataset_id)
+        with self._lock:
+            entry = self._entries.get(dataset_id)
+            if entry is not None and entry.watcher is None:
+                return entry.dataset
+            watcher = entry.watcher if entry is not None else self._loading.get(dataset_id)
+            if watcher is None:
+                watcher = self._loading[dataset_id] = snapshot.SnapshotWatcher(self.directory, snapshot_name(dataset_id))
+
+        watcher.poll()
+        if watcher.dataset is not None:
+            self._touch(dataset_id)
+
+        with self._lock:
+            if self._loading.get(dataset_id) is watcher:
+                del self._loading[dataset_id]
+            current = self._entries.get(dataset_id)
+            if current is not None and current.watcher is not watcher:
+                # Outra versão registrada durante a carga (ex: append neste worker)
+                self._entries.move_to_end(dataset_id)
+                return current.dataset
+            if current is not None and current.dataset is watcher.dataset:
+                self._entries.move_to_end(dataset_id)
+                return current.dataset
+            if current is not None:
+                # Nova versão publicada (append) ou removida por outro worker
+                del self._entries[dataset_id]
+                self.current_bytes -= current.size
+            if watcher.dataset is None:
+                raise DatasetNotFoundError(dataset_id)
+            self._insert(dataset_id, _Entry(watcher.dataset, watcher))
+            if current is None:
+                self.loads += 1
+                logger.info(f"📂 Dataset {dataset_id} recarregado do disco ({len(watcher.dataset)} registros)")
+            return watcher.dataset
+
+    def attach(self, dataset_id: str, dataset: Dataset) -> None:
+        """Troca a versão residente por outra cópia dos mesmos arquivos (ex: a do upload atual)"""
+        with self._lock:
+            entry = self._entries.get(dataset_id)
+            if entry is None:
+                return
+            dataset.inherit_indexes(entry.dataset)
+            if entry.watcher is not None:
+                entry.watcher.dataset = dataset
+            self.current_bytes -= entry.size
+            self._insert(dataset_id, _Entry(dataset, entry.watcher))
+
+    def remove(self, dataset_id: str) -> None:
+        """Remove o dataset da memória e do disco"""
+        if not DATASET_ID_PATTERN.match(dataset_id or ""):
+            raise DatasetNotFoundError(dataset_id)
+        name = snapshot_name(dataset_id)
+        with self._lock:
+            entry = self._entries.pop(dataset_id, None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+            elif name not in snapshot.list_snapshots(self.directory, name):
+                raise DatasetNotFoundError(dataset_id)
+        snapshot.delete_snapshot(self.directory, name)
+        self._touched.pop(dataset_id, None)
+        # Ponteiro ausente também é visto pelos watchers como removido: nada fica no disco
+        for path in (self._marker_path(dataset_id), *(os.path.join(self.directory, f"{name}{ext}") for ext in (".json", ".lock"))):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        logger.info(f"🗑️ Dataset {dataset_id} removido")
+
+    def prune(self, keep: Iterable[str] = ()) -> int:
+        """
+        Remove do disco os snapshots sem uso há mais que ttl_seconds e, do menos para o mais
+        recentemente usado, os que passam de max_disk_bytes; retorna quantos foram removidos
+
+        Nunca remove os IDs de keep nem os arquivos apontados por outro ponteiro (o dataset
+        atual). Workers que ainda os mapeiam continuam lendo os arquivos já abertos.
+        """
+        if not self.max_disk_bytes and not self.ttl_seconds:
+            return 0
+        protected = set(keep) | self._linked_ids()
+        now = time.time()
+        snapshots = []
+        total = 0
+        for name in snapshot.list_snapshots(self.directory, SNAPSHOT_PREFIX):
+            dataset_id = name[len(SNAPSHOT_PREFIX):]
+            size = snapshot.snapshot_size(self.directory, name)
+            total += size
+            if DATASET_ID_PATTERN.match(dataset_id) and dataset_id not in protected:
+                snapshots.append((self._last_used(dataset_id), size, dataset_id))
+
+        removed = 0
+        for last_used, size, dataset_id in sorted(snapshots):
+            expired = self.ttl_seconds and now - last_used > self.ttl_seconds
+            if not expired and (not self.max_disk_bytes or total <= self.max_disk_bytes):
+                break
+            try:
+                self.remove(dataset_id)
+            except DatasetNotFoundError:
+                pass  # Removido por outro worker
+            total -= size
+            removed += 1
+            self.expired += 1
+            reason = "expirado" if expired else "acima do orçamento de disco"
+            logger.info(f"🧹 Dataset {dataset_id} removido do disco ({reason}, {size / (1024 * 1024):.2f} MB)")
+        return removed
+
+    def counts(self) -> Dict:
+        """
+        Quantidade de datasets registrados (residentes neste processo ou gravados em disco)
+
+        Só contagens: o dataset_id é a única credencial de acesso a um upload, então os IDs
+        nunca são listados.
+        """
+        with self._lock:
+            resident = set(self._entries)
+            resident_rows = sum(len(entry.dataset) for entry in self._entries.values())
+        on_disk = {name[len(SNAPSHOT_PREFIX):] for name in snapshot.list_snapshots(self.directory, SNAPSHOT_PREFIX)}
+        return {
+            "registered": len(resident | on_disk),
+            "on_disk": len(on_disk),
+            "resident_rows": resident_rows,
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "resident": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+    def _persist(self, dataset_id: str, dataset: Dataset) -> _Entry:
+        """Grava o snapshot do dataset e devolve a entrada com a cópia mapeada"""
+        watcher = snapshot.SnapshotWatcher(self.directory, snapshot_name(dataset_id))
+        try:
+            snapshot.save_snapshot(dataset, self.directory, watcher.name, dataset_id)
+        except (OSError, snapshot.SnapshotError) as e:
+            logger.warning(f"⚠️ Dataset {dataset_id} mantido só em memória (snapshot falhou): {e}")
+            return _Entry(dataset, None)
+        watcher.poll()
+        if watcher.dataset is None:
+            return _Entry(dataset, None)
+        watcher.dataset.inherit_indexes(dataset)
+        return _Entry(watcher.dataset, watcher)
+
+    def _touch(self, dataset_id: str) -> None:
+        """Atualiza o marcador de último uso (no máximo uma vez por TOUCH_INTERVAL)"""
+        now = time.time()
+        if now - self._touched.get(dataset_id, 0) < TOUCH_INTERVAL:
+            return
+        self._touched[dataset_id] = now
+        path = self._marker_path(dataset_id)
+        try:
+            with open(path, 'a'):
+                pass
+            os.utime(path, (now, now))
+        except OSError as e:
+            logger.warning(f"⚠️ Não foi possível marcar o uso do dataset {dataset_id}: {e}")
+
+    def _last_used(self, dataset_id: str) -> float:
+        """Último uso visto por qualquer worker (marcador) ou, sem ele, a gravação do ponteiro"""
+        for path in (self._marker_path(dataset_id), os.path.join(self.directory, f"{snapshot_name(dataset_id)}.json")):
+            try:
+                return os.stat(path).st_mtime
+            except OSError:
+                continue
+        return 0.0
+
+    def _linked_ids(self) -> Set[str]:
+        """IDs cujos arquivos também são apontados por outro ponteiro (ex: o dataset atual)"""
+        linked = set()
+        for name in snapshot.list_snapshots(self.directory, ""):
+            if name.startswith(SNAPSHOT_PREFIX):
+                continue
+            folder = snapshot.snapshot_folder(self.directory, name) or ""
+            if folder.startswith(SNAPSHOT_PREFIX):
+                linked.add(folder[len(SNAPSHOT_PREFIX):].split("-", 1)[0])
+        return linked
+
+    def _marker_path(self, dataset_id: str) -> str:
+        return os.path.join(self.directory, f"{snapshot_name(dataset_id)}.used")
+
+    def _insert(self, dataset_id: str, entry: _Entry) -> None:
+        """Insere como mais recente e despeja os menos usados até caber no orçamento"""
+        self._entries[dataset_id] = entry
+        self._entries.move_to_end(dataset_id)
+        self.current_bytes += entry.size
+
+        for candidate in list(self._entries):
+            if self.current_bytes <= self.max_bytes:
+                break
+            evicted = self._entries[candidate]
+            # O mais recente fica mesmo acima do limite; sem snapshot não há como recarregar
+            if candidate == dataset_id or not evicted.persisted:
+                continue
+            del self._entries[candidate]
+            self.current_bytes -= evicted.size
+            self.evictions += 1
+            logger.info(f"💤 Dataset {candidate} despejado da memória ({evicted.size / (1024 * 1024):.2f} MB)")
+
+
+def snapshot_name(dataset_id: str) -> str:
+    return f"{SNAPSHOT_PREFIX}{dataset_id}"
@@ -0,0 +1,132 @@
+"""
+Montagem dos relatórios (/reports/summary e /reports/detailed)
+- Cada seção declara o widget de analytics e as entradas compartilhadas de que precisa
+- O plano reúne as entradas pedidas pelas seções: a fatia filtrada e o cubo do intervalo
+  chegam prontos, o lucro por linha e o agrupamento por produto são calculados uma vez
+  e só se alguma seção precisar
+- Seções independentes rodam em paralelo no pool de análise (asyncio.gather): a latência
+  do relatório se aproxima da seção mais lenta, não da soma
+- Erro em uma seção vira o valor padrão dela (como no /dashboard); pool saturado propaga (429)
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import pandas as pd
+
+import analytics
+from cube import CubeQuery
+from workers import PoolSaturatedError, WorkerPool
+
+logger = logging.getLogger("analytics_api")
+
+# Entradas compartilhadas que uma seção pode pedir (nome do argumento do widget)
+INPUTS = ('cube', 'profit', 'products')
+
+
+class Section:
+    """Uma seção do relatório: chave na resposta, widget, argumentos fixos e entradas (head: só os primeiros)"""
+
+    def __init__(self, key: str, fn: Callable, default: Callable[[], object], args: Tuple = (),
+                 inputs: Tuple[str, ...] = ('cube',), head: Optional[int] = None, **kwargs):
+        unknown = set(inputs) - set(INPUTS)
+        if unknown:
+            raise ValueError(f"Entradas de relatório inválidas: {', '.join(sorted(unknown))}")
+        self.key = key
+        self.fn = fn
+        self.default = default
+        self.args = args
+        self.inputs = inputs
+        self.head = head
+        self.kwargs = kwargs
+
+
+SUMMARY_SECTIONS = (
+    Section("kpis", analytics.kpis, lambda: dict(analytics.EMPTY_KPIS), inputs=('profit', 'cube')),
+    # Top 3 categorias (a lista já vem ordenada por faturamento)
+    Section("top_categories", analytics.sales_by_category, list, head=3),
+    Section("top_products", analytics.top_products, list, args=(5,), inputs=('products', 'cube'), order_by='quantidade'),
+)
+
+DETAILED_SECTIONS = (
+    Section("kpis", analytics.kpis, lambda: dict(analytics.EMPTY_KPIS), inputs=('profit', 'cube')),
+    Section("monthly_sales", analytics.sales_by_month, list, inputs=('profit', 'cube')),
+    Section("sales_by_category", analytics.sales_by_category, list),
+    Section("top_products", analytics.top_products, list, args=(10,), inputs=('products', 'cube'), order_by='quantidade'),
+    Section("customers_by_gender", analytics.customers_by_gender, list),
+    Section("sales_by_state", analytics.sales_by_state, list, args=(15,)),
+    Section("payment_methods", analytics.payment_methods, list),
+)
+
+
+class ReportBuilder:
+    """Avalia as seções de um relatório sobre a mesma fatia, em paralelo no pool"""
+
+    def __init__(self, pool: WorkerPool, data: pd.DataFrame, cube: Optional[CubeQuery] = None):
+        self.pool = pool
+        self.data = data
+        self.cube = cube
+        self._inputs: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def plan(sections: Sequence[Section]) -> Tuple[str, ...]:
+        """Entradas compartilhadas exigidas pelas seções (na ordem de INPUTS)"""
+        needed = {name for section in sections for name in section.inputs}
+        return tuple(name for name in INPUTS if name in needed)
+
+    async def build(self, sections: Sequence[Section]) -> Dict:
+        """{chave: resultado} de todas as seções; entradas começam junto com as seções"""
+        for name in self.plan(sections):
+            self._input(name)
+        try:
+            results = await asyncio.gather(*[self._section(section) for section in sections])
+        finally:
+            # Pool saturado no meio do relatório: entradas ainda pendentes são descartadas
+            for task in self._inputs.values():
+                task.cancel()
+        return {
+            section.key: result[:section.head] if section.head is not None else result
+            for section, result in zip(sections, results)
+        }
+
+    def _input(self, name: str) -> asyncio.Future:
+        """Tarefa única por entrada: seções que pedem a mesma entrada aguardam o mesmo cálculo"""
+        task = self._inputs.get(name)
+        if task is None:
+            task = self._inputs[name] = asyncio.ensure_future(self._compute_input(name))
+        return task
+
+    async def _compute_input(self, name: str):
+        if name == 'cube':
+            return self.cube
+        if self.data.empty:
+            return None
+        try:
+            if name == 'profit':
+                # Com cubo, lucro e meses saem das somas diárias: nada a varrer
+                if self.cube is not None:
+                    return None
+                return await self.pool.run(analytics.compute_profit, self.data)
+            # products: sem cubo, agrupamento por produto reaproveitando o lucro por linha;
+            # com cubo, o ranking soma o cubo por conta própria
+            if self.cube is not None or 'nome_produto' not in self.data.columns:
+                return None
+            profit = await self._input('profit')
+            return await self.pool.run(analytics.product_summary, self.data, profit)
+        except PoolSaturatedError:
+            raise
+        except Exception as e:
+            # Sem a entrada compartilhada cada widget calcula a sua
+            logger.error(f"❌ Erro ao preparar '{name}' do relatório: {e}", exc_info=True)
+            return None
+
+    async def _section(self, section: Section):
+        try:
+            inputs = {name: await self._input(name) for name in section.inputs}
+            return await self.pool.run(section.fn, self.data, *section.args, **inputs, **section.kwargs)
+        except PoolSaturatedError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Erro ao calcular seção '{section.key}' do relatório: {e}", exc_info=True)
+            return section.default()
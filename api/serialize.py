@@ -0,0 +1,140 @@
+"""
+Serialização JSON colunar das respostas de análise
+- ?format=columns: um array por coluna em vez de um objeto por linha
+- Frames (ex: páginas de /sales) convertidos direto dos arrays NumPy para texto JSON:
+  números formatados de forma vetorizada, textos e categorias escapados uma vez por
+  valor distinto e espalhados pelos códigos (sem dict por linha nem jsonable_encoder)
+- Listas de registros (widgets) apenas transpostas para o mesmo formato
+- TimedJSONResponse: resposta JSON padrão da API, com o json.dumps medido como etapa
+"""
+
+import functools
+import inspect
+import json
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from fastapi import Query
+from fastapi.responses import JSONResponse
+
+import metrics
+
+# Formatos aceitos em ?format=
+RESPONSE_FORMATS = ('records', 'columns')
+
+JSON_NULL = 'null'
+
+
+# ============================================================================
+# FRAMES
+# ============================================================================
+
+def columns_json(frame: pd.DataFrame) -> bytes:
+    """Frame como objeto JSON {coluna: [valores]} em bytes UTF-8"""
+    parts = [f'{_dumps(str(col))}:[{",".join(encode_column(frame[col]))}]' for col in frame.columns]
+    return ('{' + ','.join(parts) + '}').encode('utf-8')
+
+
+def envelope(meta: Dict[str, Any], data: bytes) -> bytes:
+    """Objeto JSON com os metadados e a chave "data" já serializada"""
+    head = json.dumps(meta, ensure_ascii=False)
+    separator = ',' if meta else ''
+    return head[:-1].encode('utf-8') + f'{separator}"data":'.encode('utf-8') + data + b'}'
+
+
+def encode_column(series: pd.Series) -> List[str]:
+    """Texto JSON de cada valor da coluna (null para ausentes e não finitos)"""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return _spread(series.cat.codes.to_numpy(), series.cat.categories)
+
+    kind = dtype.kind if isinstance(dtype, np.dtype) else 'O'
+    values = series.to_numpy()
+    if kind == 'b':
+        return np.where(values, 'true', 'false').tolist()
+    if kind in 'iu':
+        return values.astype(str).tolist()
+    if kind == 'f':
+        text = values.astype(str)
+        text[~np.isfinite(values)] = JSON_NULL
+        return text.tolist()
+    if kind == 'M':
+        return _encode_dates(values)
+
+    # Texto livre ou tipos mistos: escapa cada valor distinto uma única vez
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return _spread(codes, uniques)
+
+
+def _encode_dates(values: np.ndarray) -> List[str]:
+    missing = np.isnat(values)
+    ticks = values[~missing].astype('datetime64[s]').view('int64')
+    # Mesmo critério do CSV: só a data quando todos os valores estão à meia-noite
+    unit = 'D' if not len(ticks) or not (ticks % 86400).any() else 's'
+    text = np.char.add(np.char.add('"', np.datetime_as_string(values, unit=unit)), '"').astype(object)
+    text[missing] = JSON_NULL
+    return text.tolist()
+
+
+def _spread(codes: np.ndarray, uniques) -> List[str]:
+    """Codifica os valores distintos e os distribui pelos códigos (-1 = null)"""
+    lookup = np.array([_dumps(value) for value in pd.Index(uniques).tolist()] + [JSON_NULL], dtype=object)
+    return lookup[codes].tolist()
+
+
+def _dumps(value: Any) -> str:
+    if isinstance(value, float) and not np.isfinite(value):
+        return JSON_NULL
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+# ============================================================================
+# REGISTROS
+# ============================================================================
+
+def records_to_columns(result: Any) -> Any:
+    """Lista de registros vira {coluna: [valores]}; outros resultados ficam como estão"""
+    if not isinstance(result, list):
+        return result
+    if not result:
+        return {}
+    keys = list(result[0].keys())
+    return {key: [record.get(key) for record in result] for key in keys}
+
+
+def columnar_option(fn):
+    """
+    Decorator que adiciona ?format=records|columns a um endpoint que retorna registros
+
+    Deve ficar abaixo de @cached: o formato entra na chave do cache e a resposta
+    colunar é cacheada já transposta.
+    """
+    signature = inspect.signature(fn)
+    parameter = inspect.Parameter(
+        'response_format',
+        inspect.Parameter.KEYWORD_ONLY,
+        default=Query('records', alias='format', pattern='^(records|columns)$',
+                      description="records (um objeto por linha) ou columns (um array por coluna)"),
+        annotation=str,
+    )
+
+    @functools.wraps(fn)
+    async def wrapper(*args, response_format: str = 'records', **kwargs):
+        result = await fn(*args, **kwargs)
+        return records_to_columns(result) if response_format == 'columns' else result
+
+    wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), parameter])
+    return wrapper
+
+
+# ============================================================================
+# RESPOSTAS
+# ============================================================================
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse que registra a codificação do corpo como a etapa serialize.json"""
+
+    def render(self, content: Any) -> bytes:
+        with metrics.stage("serialize.json"):
+            return super().render(content)
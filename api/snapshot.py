@@ -0,0 +1,426 @@
+"""
+Snapshot colunar do dataset em disco
+- Uma coluna por arquivo .npy (numpy puro, sem pickle) e um manifest.json com o esquema
+- Carregado com memory-map: o sistema operacional traz as páginas sob demanda, sem
+  re-parsing do CSV nem nova validação/tipagem
+- Colunas category gravadas como códigos + categorias; texto livre (ex: id_transacao)
+  também codificado assim e remontado como object na carga
+- Cubo diário e metadados salvos junto (sem reagrupar as linhas na carga)
+- Escrita atômica: diretório novo + ponteiro <nome>.json trocado com os.replace
+- Impressão digital (fingerprint) da origem: snapshot de outra versão do CSV é ignorado
+- Ponteiro com geração (contador de versões entre processos): workers do uvicorn
+  acompanham o ponteiro com SnapshotWatcher e mapeiam os mesmos arquivos (uma única
+  cópia em memória na máquina, via cache de páginas do sistema)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cube import DailyCube
+from dataset import Dataset
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos (um único worker)
+    fcntl = None
+
+logger = logging.getLogger("analytics_api")
+
+# Versão do formato em disco; incrementar quando a tipagem do dataset canônico mudar
+# (prepare_frame, DailyCube) para descartar snapshots antigos
+SNAPSHOT_FORMAT = 1
+
+MANIFEST_FILE = "manifest.json"
+
+
+class SnapshotError(Exception):
+    """Snapshot ausente, corrompido ou com coluna não suportada"""
+
+
+# ============================================================================
+# IMPRESSÃO DIGITAL
+# ============================================================================
+
+def file_fingerprint(path: str) -> str:
+    """
+    Identidade do arquivo de origem: caminho, tamanho e mtime + versão do formato
+
+    Não lê o conteúdo (o hash de um CSV de 1M linhas custaria mais que a própria carga);
+    um deploy que regrave o arquivo só provoca uma reconstrução do snapshot.
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"format={SNAPSHOT_FORMAT};{os.path.abspath(path)};{stat.st_size};{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def frame_fingerprint(frame: pd.DataFrame) -> str:
+    """Hash do conteúdo do frame (datasets enviados, sem arquivo de origem)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"format={SNAPSHOT_FORMAT};".encode())
+    digest.update(json.dumps([str(col) for col in frame.columns]).encode())
+    if len(frame.columns):
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+# ============================================================================
+# GRAVAÇÃO E CARGA
+# ============================================================================
+
+def save_snapshot(dataset: Dataset, directory: str, name: str, fingerprint: str) -> int:
+    """
+    Grava o dataset em <directory>/<name>-<id>/, aponta <name>.json para ele e
+    retorna a nova geração do ponteiro
+
+    Snapshots anteriores do mesmo nome são removidos depois da troca do ponteiro
+    (processos que ainda os mapeiam continuam lendo os arquivos já abertos).
+    """
+    os.makedirs(directory, exist_ok=True)
+    folder = f"{name}-{fingerprint[:12]}-{uuid.uuid4().hex[:8]}"
+    staging = os.path.join(directory, f".tmp-{folder}")
+    os.makedirs(staging)
+    try:
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "fingerprint": fingerprint,
+            "created_at": datetime.now().isoformat(timespec='seconds'),
+            "rows": len(dataset.frame),
+            "frame": _write_frame(dataset.frame, staging, "frame"),
+            "cube": None,
+        }
+        cube = dataset.cube
+        if cube is not None:
+            manifest["cube"] = {
+                "has_profit": cube.has_profit,
+                "missing_dates": cube.missing_dates,
+                "frames": {
+                    key: _write_frame(frame, staging, f"cube.{index}")
+                    for index, (key, frame) in enumerate(cube.frames().items())
+                },
+            }
+        _write_json(os.path.join(staging, MANIFEST_FILE), manifest)
+        os.rename(staging, os.path.join(directory, folder))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    generation = _publish(directory, name, folder, fingerprint)
+    logger.info(f"💾 Snapshot '{name}' gravado (geração {generation}): {len(dataset.frame)} registros em {folder}")
+    return generation
+
+
+def load_snapshot(directory: str, name: str, fingerprint: Optional[str] = None) -> Optional[Dataset]:
+    """
+    Carrega o snapshot com memory-map, ou None se não existir, for de outra origem
+    (fingerprint diferente) ou estiver ilegível
+    """
+    try:
+        pointer = _read_json(_pointer_path(directory, name))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Ponteiro do snapshot '{name}' ilegível, ignorado: {e}")
+        return None
+    return _load_pointer(directory, name, pointer, fingerprint)
+
+
+def link_snapshot(directory: str, name: str, source: str) -> int:
+    """
+    Aponta <name>.json para o diretório já gravado do snapshot <source> (sem copiar arquivos)
+    e retorna a nova geração de <name>
+    """
+    try:
+        pointer = _read_json(_pointer_path(directory, source))
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Snapshot '{source}' inexistente: {e}")
+    if not pointer.get("folder"):
+        raise SnapshotError(f"Snapshot '{source}' removido")
+    generation = _publish(directory, name, pointer["folder"], pointer.get("fingerprint"))
+    logger.info(f"🔗 Snapshot '{name}' aponta para '{source}' (geração {generation})")
+    return generation
+
+
+def list_snapshots(directory: str, prefix: str) -> List[str]:
+    """Nomes dos snapshots publicados (ponteiro com diretório) que começam com prefix"""
+    if not os.path.isdir(directory):
+        return []
+    names = []
+    for entry in sorted(os.listdir(directory)):
+        if not entry.startswith(prefix) or not entry.endswith(".json"):
+            continue
+        try:
+            if _read_json(os.path.join(directory, entry)).get("folder"):
+                names.append(entry[:-len(".json")])
+        except (OSError, ValueError):
+            continue
+    return names
+
+
+def snapshot_folder(directory: str, name: str) -> Optional[str]:
+    """Diretório publicado pelo ponteiro <name> (None se removido ou ilegível)"""
+    try:
+        return _read_json(_pointer_path(directory, name)).get("folder")
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_size(directory: str, name: str) -> int:
+    """Bytes em disco do diretório publicado por <name> (0 se não houver)"""
+    folder = snapshot_folder(directory, name)
+    if not folder:
+        return 0
+    total = 0
+    try:
+        with os.scandir(os.path.join(directory, folder)) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        return 0
+    return total
+
+
+def delete_snapshot(directory: str, name: str) -> int:
+    """Aponta o snapshot para nenhum diretório (nova geração) e remove os arquivos"""
+    generation = _publish(directory, name, None, None)
+    logger.info(f"🗑️ Snapshot '{name}' removido (geração {generation})")
+    return generation
+
+
+class SnapshotWatcher:
+    """
+    Acompanha o ponteiro de um snapshot publicado por qualquer processo
+
+    poll() custa um os.stat: o snapshot só é recarregado (memory-map, sem cópia)
+    quando outro worker publica ou remove uma versão. Recargas do mesmo watcher são
+    serializadas pelo lock dele; changed() só consulta o stat.
+    """
+
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self.dataset: Optional[Dataset] = None
+        self.generation = 0
+        self.fingerprint: Optional[str] = None
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._lock = threading.Lock()
+
+    def changed(self) -> bool:
+        """True se o ponteiro mudou desde o último poll (só o os.stat, sem recarregar)"""
+        return self._pointer_stamp() != self._stamp
+
+    def poll(self, wait: bool = True) -> bool:
+        """
+        Recarrega se o ponteiro mudou; True quando self.dataset foi trocado
+
+        wait=False não espera uma recarga em andamento em outra thread: devolve False e
+        quem chamou segue com a versão atual.
+        """
+        stamp = self._pointer_stamp()
+        if stamp == self._stamp:
+            return False
+        if not self._lock.acquire(blocking=wait):
+            return False
+        try:
+            stamp = self._pointer_stamp()
+            if stamp == self._stamp:
+                return False
+            # Ponteiro lido depois do stat: uma troca no meio só provoca mais uma recarga
+            try:
+                pointer = _read_json(_pointer_path(self.directory, self.name)) if stamp else {}
+            except (OSError, ValueError):
+                return False
+            dataset = None
+            if pointer.get("folder"):
+                dataset = _load_pointer(self.directory, self.name, pointer)
+                if dataset is None:
+                    # Mantém a versão atual; se o diretório sumiu por uma publicação mais
+                    # nova, o ponteiro já tem outro stamp e o próximo poll a carrega
+                    self._stamp = stamp
+                    return False
+            self._stamp = stamp
+            self.generation = pointer.get("generation", 0)
+            self.fingerprint = pointer.get("fingerprint")
+            self.dataset = dataset
+            return True
+        finally:
+            self._lock.release()
+
+    def _pointer_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(_pointer_path(self.directory, self.name))
+        except FileNotFoundError:
+            return None
+        # os.replace cria um novo inode a cada publicação
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _load_pointer(directory: str, name: str, pointer: Dict, fingerprint: Optional[str] = None) -> Optional[Dataset]:
+    if not pointer.get("folder"):
+        return None
+    try:
+        if fingerprint is not None and pointer.get("fingerprint") != fingerprint:
+            logger.info(f"♻️ Snapshot '{name}' desatualizado (origem alterada), será regravado")
+            return None
+        folder = os.path.join(directory, pointer["folder"])
+        manifest = _read_json(os.path.join(folder, MANIFEST_FILE))
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            logger.info(f"♻️ Snapshot '{name}' em formato antigo ({manifest.get('format')}), será regravado")
+            return None
+
+        frame = _read_frame(folder, manifest["frame"])
+        cube = None
+        if manifest["cube"] is not None:
+            # Cubo é pequeno: carregado em memória, com blocos consolidados como no original
+            frames = {key: _read_frame(folder, specs, mmap=False) for key, specs in manifest["cube"]["frames"].items()}
+            cube = DailyCube.from_frames(frames, manifest["cube"]["has_profit"], manifest["cube"]["missing_dates"])
+    except (OSError, ValueError, KeyError, SnapshotError) as e:
+        logger.warning(f"⚠️ Snapshot '{name}' ilegível, ignorado: {e}")
+        return None
+
+    if len(frame) != manifest["rows"]:
+        logger.warning(f"⚠️ Snapshot '{name}' incompleto ({len(frame)} de {manifest['rows']} linhas), ignorado")
+        return None
+    return Dataset(frame, cube=cube)
+
+
+# ============================================================================
+# COLUNAS
+# ============================================================================
+
+def _write_frame(frame: pd.DataFrame, folder: str, prefix: str) -> List[Dict]:
+    """Grava cada coluna em .npy e devolve o esquema para o manifest"""
+    specs = []
+    for position, col in enumerate(frame.columns):
+        series = frame[col]
+        base = f"{prefix}.{position}"
+        spec = {"name": col}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            spec.update(kind="category", ordered=bool(series.cat.ordered))
+            _save_encoded(folder, base, series.cat.codes.to_numpy(), series.cat.categories, spec)
+        elif pd.api.types.is_object_dtype(series.dtype):
+            # Texto livre: códigos + valores distintos, remontado como object
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            spec.update(kind="object")
+            _save_encoded(folder, base, codes, pd.Index(uniques), spec)
+        elif isinstance(series.dtype, np.dtype) and series.dtype.kind in "biufmM":
+            spec.update(kind="array", file=f"{base}.npy")
+            np.save(os.path.join(folder, spec["file"]), series.to_numpy(), allow_pickle=False)
+        else:
+            raise SnapshotError(f"Coluna '{col}' com tipo não suportado: {series.dtype}")
+        specs.append(spec)
+    return specs
+
+
+def _save_encoded(folder: str, base: str, codes: np.ndarray, values: pd.Index, spec: Dict) -> None:
+    if values.dtype == object:
+        if pd.api.types.infer_dtype(values, skipna=False) not in ("string", "empty"):
+            raise SnapshotError(f"Coluna '{spec['name']}' com valores de tipos mistos")
+        stored = values.to_numpy(dtype=str)
+    else:
+        stored = values.to_numpy()
+    spec.update(codes=f"{base}.codes.npy", values=f"{base}.values.npy")
+    np.save(os.path.join(folder, spec["codes"]), codes, allow_pickle=False)
+    np.save(os.path.join(folder, spec["values"]), stored, allow_pickle=False)
+
+
+def _read_frame(folder: str, specs: List[Dict], mmap: bool = True) -> pd.DataFrame:
+    columns = {}
+    for spec in specs:
+        if spec["kind"] == "array":
+            columns[spec["name"]] = _load(folder, spec["file"], mmap)
+            continue
+
+        codes = _load(folder, spec["codes"], mmap)
+        values = pd.Index(_load_values(folder, spec["values"]))
+        if spec["kind"] == "category":
+            dtype = pd.CategoricalDtype(values, ordered=spec["ordered"])
+            columns[spec["name"]] = pd.Categorical.from_codes(codes, dtype=dtype)
+        else:
+            column = values.to_numpy(dtype=object).take(codes)
+            column[codes < 0] = np.nan
+            columns[spec["name"]] = column
+
+    # copy=False: as colunas continuam apontando para os arquivos mapeados
+    return pd.DataFrame(columns, copy=not mmap)
+
+
+def _load(folder: str, file: str, mmap: bool = True) -> np.ndarray:
+    if not mmap:
+        return np.load(os.path.join(folder, file), allow_pickle=False)
+    # ndarray comum sobre o mapeamento (np.memmap vazaria como subclasse nos resultados)
+    return np.load(os.path.join(folder, file), mmap_mode='r', allow_pickle=False).view(np.ndarray)
+
+
+def _load_values(folder: str, file: str) -> np.ndarray:
+    values = np.load(os.path.join(folder, file), allow_pickle=False)
+    # Texto volta como object (str do Python), como no frame original
+    return values.astype(object) if values.dtype.kind == "U" else values
+
+
+# ============================================================================
+# ARQUIVOS
+# ============================================================================
+
+def _pointer_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.json")
+
+
+def _publish(directory: str, name: str, folder: Optional[str], fingerprint: Optional[str]) -> int:
+    """Troca o ponteiro incrementando a geração (serializado entre processos) e limpa os antigos"""
+    os.makedirs(directory, exist_ok=True)
+    with _pointer_lock(directory, name):
+        try:
+            generation = _read_json(_pointer_path(directory, name)).get("generation", 0) + 1
+        except (OSError, ValueError):
+            generation = 1
+        _write_json(_pointer_path(directory, name), {"folder": folder, "fingerprint": fingerprint, "generation": generation})
+        _remove_stale(directory, name, keep=folder)
+    return generation
+
+
+@contextmanager
+def _pointer_lock(directory: str, name: str) -> Iterator[None]:
+    with open(os.path.join(directory, f"{name}.lock"), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_json(path: str, content: Dict) -> None:
+    """Grava em arquivo temporário e troca com os.replace (leitores nunca veem meio arquivo)"""
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as target:
+        json.dump(content, target, ensure_ascii=False)
+        target.flush()
+        os.fsync(target.fileno())
+    os.replace(temp_path, path)
+
+
+def _read_json(path: str) -> Dict:
+    with open(path, encoding='utf-8') as source:
+        return json.load(source)
+
+
+def _remove_stale(directory: str, name: str, keep: Optional[str]) -> None:
+    if not os.path.isdir(directory):
+        return
+    for entry in os.listdir(directory):
+        if entry.startswith(f"{name}-") and entry != keep and os.path.isdir(os.path.join(directory, entry)):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
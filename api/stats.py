@@ -0,0 +1,254 @@
+"""
+Estatísticas descritivas das colunas numéricas (/analysis)
+- Calculadas uma vez por dataset, no build do load/upload, e servidas prontas
+- Por coluna, direto do array NumPy: contagem, nulos, soma, média, desvio padrão (ddof=1),
+  mínimo, máximo, mediana e quantis (mesmas definições do pandas)
+- Parciais diários combináveis (contagem, soma, M2, mínimo, máximo e nulos por dia):
+  um intervalo de datas combina só as linhas dos dias cobertos (fórmula de Chan para a
+  variância), sem varrer as transações; mediana e quantis, que não são combináveis, são
+  calculados sobre a fatia de datas
+- Colunas inteiras de faixa curta (idade, quantidade, mês, avaliação...) têm os quantis
+  tirados da contagem por valor (bincount), sem particionar a coluna
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("analytics_api")
+
+# Quantis além da mediana
+QUANTILES = (0.05, 0.25, 0.75, 0.95)
+_ALL_QUANTILES = (0.5,) + QUANTILES
+# Maior amplitude (máximo - mínimo) de uma coluna inteira com quantis por contagem
+MAX_COUNTED_RANGE = 1 << 16
+
+
+class ColumnStats:
+    """Estatísticas do dataset inteiro e parciais diários para consultas por intervalo"""
+
+    def __init__(self, summary: Dict, daily: Optional["DailyPartials"]):
+        # Resposta completa de /analysis sem filtro (compartilhada: somente leitura)
+        self.summary = summary
+        self.daily = daily
+
+    @classmethod
+    def build(cls, frame: pd.DataFrame, daily: bool = True) -> "ColumnStats":
+        """Estatísticas do frame inteiro (e parciais diários, se daily)"""
+        numeric = numeric_columns(frame)
+        summary = _analysis(
+            frame,
+            {col: describe_values(_float_values(frame[col]), column_quantiles(frame[col])) for col in numeric},
+            {col: int(count) for col, count in frame.isna().sum().items()},
+        )
+        return cls(summary, DailyPartials.build(frame, numeric) if daily else None)
+
+    def describe_range(self, frame: pd.DataFrame, lo: int, hi: int,
+                       start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> Dict:
+        """
+        Estatísticas das linhas [lo, hi) do frame, que correspondem às datas [start, end)
+
+        Momentos, extremos e nulos saem dos parciais diários quando o intervalo é de dias
+        inteiros; caso contrário (ou sem data_venda), tudo é calculado sobre a fatia.
+        """
+        part = frame.iloc[lo:hi]
+        if self.daily is None or not self.daily.covers(start, end):
+            return ColumnStats.build(part, daily=False).summary
+
+        moments, nulls = self.daily.combine(start, end)
+        statistics = {}
+        for col, values in moments.items():
+            statistics[col] = _column_dict(values, column_quantiles(part[col]))
+        return _analysis(part, statistics, nulls)
+
+    def memory_usage(self) -> int:
+        return self.daily.memory_usage() if self.daily is not None else 0
+
+
+class DailyPartials:
+    """Agregados combináveis por dia (linhas do dia x coluna), na ordem das datas"""
+
+    def __init__(self, days: np.ndarray, numeric: List[str], columns: List[str], count: np.ndarray, total: np.ndarray,
+                 m2: np.ndarray, minimum: np.ndarray, maximum: np.ndarray, nulls: np.ndarray):
+        self.days = days
+        self.numeric = numeric
+        self.columns = columns
+        self.count = count
+        self.total = total
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+        self.nulls = nulls
+
+    @classmethod
+    def build(cls, frame: pd.DataFrame, numeric: List[str]) -> Optional["DailyPartials"]:
+        """Parciais do frame ordenado por data (None sem data_venda ou sem linhas datadas)"""
+        if frame.empty or 'data_venda' not in frame.columns:
+            return None
+        dates = frame['data_venda']
+        # NaT fica no final após a ordenação: só as linhas datadas entram nos dias
+        valid = int(len(frame) - dates.isna().sum())
+        if not valid:
+            return None
+        keys = dates.iloc[:valid].dt.normalize().to_numpy(dtype='datetime64[ns]').view('int64')
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        day_of_row = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, valid]))
+
+        shape = (len(starts), len(numeric))
+        count, total, m2 = np.zeros(shape, dtype='int64'), np.zeros(shape), np.zeros(shape)
+        minimum, maximum = np.full(shape, np.nan), np.full(shape, np.nan)
+        for j, col in enumerate(numeric):
+            values = _float_values(frame[col].iloc[:valid])
+            present = ~np.isnan(values)
+            filled = np.where(present, values, 0.0)
+            count[:, j] = np.add.reduceat(present.astype('int64'), starts)
+            total[:, j] = np.add.reduceat(filled, starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = total[:, j] / count[:, j]
+            deviation = np.where(present, values - mean[day_of_row], 0.0)
+            m2[:, j] = np.add.reduceat(deviation * deviation, starts)
+            minimum[:, j] = np.fmin.reduceat(values, starts)
+            maximum[:, j] = np.fmax.reduceat(values, starts)
+
+        columns = list(frame.columns)
+        nulls = np.column_stack([
+            np.add.reduceat(frame[col].iloc[:valid].isna().to_numpy().astype('int64'), starts) for col in columns
+        ])
+        return cls(keys[starts], numeric, columns, count, total, m2, minimum, maximum, nulls)
+
+    def covers(self, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> bool:
+        """Mesmo critério do cubo diário: só intervalos alinhados em dias inteiros"""
+        if start is None and end is None:
+            return False
+        return all(bound is None or bound == bound.normalize() for bound in (start, end))
+
+    def combine(self, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]):
+        """({coluna: momentos combinados}, {coluna: nulos}) dos dias em [start, end)"""
+        lo = 0 if start is None else int(np.searchsorted(self.days, start.value, side='left'))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, end.value, side='left'))
+        hi = max(lo, hi)
+
+        count = self.count[lo:hi]
+        n = count.sum(axis=0)
+        total = self.total[lo:hi].sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / n
+            day_mean = self.total[lo:hi] / count
+            # M2 total = soma dos M2 diários + desvio de cada média diária em relação à média geral
+            spread = np.where(count > 0, count * (day_mean - mean) ** 2, 0.0).sum(axis=0)
+            m2 = self.m2[lo:hi].sum(axis=0) + spread
+            minimum = np.fmin.reduce(self.minimum[lo:hi], axis=0) if hi > lo else np.full(len(self.numeric), np.nan)
+            maximum = np.fmax.reduce(self.maximum[lo:hi], axis=0) if hi > lo else np.full(len(self.numeric), np.nan)
+
+        moments = {
+            col: {"count": int(n[j]), "sum": float(total[j]), "mean": mean[j],
+                  "std": np.sqrt(m2[j] / (n[j] - 1)) if n[j] > 1 else np.nan,
+                  "min": minimum[j], "max": maximum[j]}
+            for j, col in enumerate(self.numeric)
+        }
+        nulls = dict(zip(self.columns, (int(value) for value in self.nulls[lo:hi].sum(axis=0))))
+        return moments, nulls
+
+    def memory_usage(self) -> int:
+        return int(sum(array.nbytes for array in (self.days, self.count, self.total, self.m2,
+                                                    self.minimum, self.maximum, self.nulls)))
+
+
+def numeric_columns(frame: pd.DataFrame) -> List[str]:
+    """Mesma seleção do describe anterior (select_dtypes number)"""
+    return list(frame.select_dtypes(include=['number']).columns)
+
+
+def describe_values(values: np.ndarray, quantiles: Optional[np.ndarray] = None) -> Dict:
+    """Estatísticas de um array float64 (NaN = ausente); quantiles: mediana e QUANTILES já calculados"""
+    present = values[~np.isnan(values)]
+    n = len(present)
+    total = float(present.sum())
+    mean = total / n if n else np.nan
+    # Duas passagens, como o pandas: média e depois soma dos desvios ao quadrado
+    std = np.sqrt(((present - mean) ** 2).sum() / (n - 1)) if n > 1 else np.nan
+    moments = {
+        "count": n,
+        "sum": total,
+        "mean": mean,
+        "std": std,
+        "min": present.min() if n else np.nan,
+        "max": present.max() if n else np.nan,
+    }
+    if quantiles is None:
+        quantiles = _quantiles(present, dropna=False)
+    return _column_dict(moments, quantiles)
+
+
+def column_quantiles(series: pd.Series) -> np.ndarray:
+    """Mediana e QUANTILES de uma coluna: por contagem se inteira de faixa curta, senão por partição"""
+    values = series.to_numpy()
+    if values.dtype.kind in 'iu' and len(values):
+        low, high = int(values.min()), int(values.max())
+        if high - low <= MAX_COUNTED_RANGE:
+            return _counted_quantiles(values, low)
+    return _quantiles(_float_values(series))
+
+
+def _counted_quantiles(values: np.ndarray, low: int) -> np.ndarray:
+    """
+    Quantis de inteiros pela contagem acumulada de cada valor: o k-ésimo da ordenação é o
+    primeiro valor cuja contagem acumulada passa de k (mesma interpolação linear do NumPy)
+    """
+    cumulative = np.cumsum(np.bincount(values.astype('int64') - low))
+    positions = np.array(_ALL_QUANTILES) * (len(values) - 1)
+    below = np.floor(positions).astype('int64')
+    above = np.minimum(below + 1, len(values) - 1)
+    lower = low + np.searchsorted(cumulative, below, side='right').astype('float64')
+    upper = low + np.searchsorted(cumulative, above, side='right').astype('float64')
+    return lower + (upper - lower) * (positions - below)
+
+
+def _quantiles(values: np.ndarray, dropna: bool = True) -> np.ndarray:
+    """Mediana e QUANTILES (interpolação linear, como Series.quantile)"""
+    if dropna:
+        values = values[~np.isnan(values)]
+    if not len(values):
+        return np.full(len(_ALL_QUANTILES), np.nan)
+    return np.quantile(values, _ALL_QUANTILES)
+
+
+def _column_dict(moments: Dict, quantiles: np.ndarray) -> Dict:
+    """Chaves antigas primeiro (mean, median, min, max, std, sum); indefinidos viram None"""
+    result = {
+        "mean": _number(moments["mean"]),
+        "median": _number(quantiles[0]),
+        "min": _number(moments["min"]),
+        "max": _number(moments["max"]),
+        "std": _number(moments["std"]),
+        "sum": _number(moments["sum"]),
+        "count": int(moments["count"]),
+    }
+    for q, value in zip(QUANTILES, quantiles[1:]):
+        result[f"p{int(q * 100):02d}"] = _number(value)
+    return result
+
+
+def _analysis(frame: pd.DataFrame, statistics: Dict, nulls: Dict) -> Dict:
+    for col, column in statistics.items():
+        column["nulls"] = nulls.get(col, 0)
+    return {
+        "shape": {
+            "rows": len(frame),
+            "columns": len(frame.columns)
+        },
+        "columns": list(frame.columns),
+        "statistics": statistics,
+        "null_counts": nulls,
+    }
+
+
+def _float_values(series: pd.Series) -> np.ndarray:
+    return series.to_numpy(dtype='float64', na_value=np.nan)
+
+
+def _number(value) -> Optional[float]:
+    value = float(value)
+    return value if np.isfinite(value) else None
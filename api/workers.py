@@ -0,0 +1,217 @@
+"""
+Pool de workers para o trabalho pesado de pandas
+- Tira groupbys, validação e serialização (CSV/Excel) do event loop
+- Fila limitada: com todos os workers ocupados e a fila cheia, recusa na hora (429)
+- Tamanho 0 executa inline no event loop (depuração e comparação em benchmarks)
+- Cada tarefa é medida como uma etapa (histograma em /metrics, perfil por requisição)
+- Respostas em streaming ocupam uma vaga do início ao fim e geram cada pedaço fora do loop
+- Threads: as tarefas leem o dataset compartilhado em memória sem cópia
+- Processos: sem disputa pelo GIL, ao custo de serializar argumentos e resultado
+  (para tarefas longas em Python puro sobre fatias pequenas, ex: exportação Excel)
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import metrics
+
+logger = logging.getLogger("analytics_api")
+
+# Tipos de executor suportados
+POOL_KINDS = ("thread", "process")
+
+
+class PoolSaturatedError(Exception):
+    """Todos os workers ocupados e fila cheia"""
+
+    def __init__(self, pool: str):
+        super().__init__(f"Pool '{pool}' saturado")
+        self.pool = pool
+
+
+class WorkerPool:
+    """Executor de threads ou processos com profundidade de fila limitada e contadores"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, kind: str = "thread"):
+        if kind not in POOL_KINDS:
+            raise ValueError(f"Tipo de pool inválido: {kind} (use {', '.join(POOL_KINDS)})")
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self._executor = self._create_executor()
+        self._lock = threading.Lock()
+        # Tarefas aceitas e ainda não concluídas (em execução + na fila)
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Executa fn(*args, **kwargs) no pool; PoolSaturatedError se não houver vaga
+
+        A execução é medida como a etapa "<pool>.<função>" (ex: analytics.kpis). Em
+        processos a medida inclui a espera por vaga e a serialização dos argumentos.
+        """
+        name = f"{self.name}.{metrics.task_name(fn)}"
+        if self._executor is None:
+            with metrics.stage(name):
+                return fn(*args, **kwargs)
+
+        self._acquire()
+        try:
+            if self.kind == "process":
+                future = self._executor.submit(fn, *args, **kwargs)
+            else:
+                # Contexto copiado (como asyncio.to_thread): as etapas entram no perfil da requisição
+                future = self._executor.submit(contextvars.copy_context().run, _timed, name, fn, args, kwargs)
+        except RuntimeError:
+            self._release(None)
+            raise
+        # A vaga só é liberada quando a thread termina (mesmo se o cliente desconectar antes)
+        future.add_done_callback(self._release)
+        if self.kind == "process":
+            with metrics.stage(name):
+                return await asyncio.wrap_future(future)
+        return await asyncio.wrap_future(future)
+
+    def stream(self, chunks: Iterator[bytes]) -> "PooledStream":
+        """
+        Consome um iterador de pedaços (ex: CSV em blocos) para uma StreamingResponse
+
+        A vaga é reservada já na chamada, para que a saturação vire 429 antes de a
+        resposta começar, e liberada quando o fluxo termina ou é descartado.
+        """
+        if self._executor is not None:
+            self._acquire()
+        return PooledStream(self, chunks)
+
+    def _next_chunk(self, chunks: Iterator[bytes]) -> "asyncio.Future":
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            future = loop.create_future()
+            try:
+                future.set_result(next(chunks, _END))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        # Geradores não vão para outro processo: nesse caso o pedaço é gerado no executor padrão
+        executor = None if self.kind == "process" else self._executor
+        return loop.run_in_executor(executor, next, chunks, _END)
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                logger.warning(f"⚠️ Pool '{self.name}' saturado ({self.in_flight} tarefas), requisição recusada")
+                raise PoolSaturatedError(self.name)
+            self.in_flight += 1
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def _create_executor(self) -> Optional[Executor]:
+        if self.max_workers <= 0:
+            return None
+        if self.kind == "process":
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-worker")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": max(0, self.in_flight - self.max_workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Marca de fim do iterador consumido em outra thread
+_END = object()
+
+
+def _timed(name: str, fn: Callable, args: tuple, kwargs: Dict) -> Any:
+    """Executa a tarefa na thread do pool medindo só a execução (sem a espera na fila)"""
+    with metrics.stage(name):
+        return fn(*args, **kwargs)
+
+
+class PooledStream:
+    """Iterador assíncrono que gera cada pedaço no pool e libera a vaga ao terminar"""
+
+    def __init__(self, pool: WorkerPool, chunks: Iterator[bytes]):
+        self._pool = pool
+        self._chunks = chunks
+        self._holds_slot = pool._executor is not None
+
+    def __aiter__(self) -> "PooledStream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        chunks = self._chunks
+        if chunks is None:
+            raise StopAsyncIteration
+        future = self._pool._next_chunk(chunks)
+        try:
+            # shield: cancelar a requisição não descarta o futuro do pedaço em andamento
+            chunk = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # O pedaço ainda está sendo gerado na thread: gerador e vaga só são liberados quando ela terminar
+            self._chunks = None
+            future.add_done_callback(lambda done: self._finish(chunks, done))
+            raise
+        except BaseException:
+            self.close()
+            raise
+        if chunk is _END:
+            self.close()
+            raise StopAsyncIteration
+        return chunk
+
+    def _finish(self, chunks: Iterator[bytes], done: "asyncio.Future") -> None:
+        if not done.cancelled():
+            done.exception()  # Evita o aviso de exceção nunca recuperada
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        if self._holds_slot:
+            self._holds_slot = False
+            self._pool._release(None)
+
+    def close(self) -> None:
+        if self._chunks is None:
+            return
+        close = getattr(self._chunks, 'close', None)
+        self._chunks = None
+        if close is not None:
+            close()
+        self._release_slot()
+
+    async def aclose(self) -> None:
+        self.close()
+
+    def __del__(self):
+        # Cliente desconectou antes do fim: a vaga não pode ficar presa. O gerador não é
+        # fechado aqui (poderia estar executando em outra thread); ele se fecha ao ser coletado
+        self._release_slot()
@@ -56,66 +56,27 @@ export const useApiReport = (startDate?: string, endDate?: string, region?: stri
 
         console.log('📡 Buscando dados com filtro:', { startDate, endDate, region, suffix });
 
-        // Carregar todos os dados em paralelo
-        const [
-          kpisRes,
-          monthlySalesRes,
-          categoriesRes,
-          productsRes,
-          genderRes,
-          stateRes,
-          paymentRes,
-          ageRes,
-          installmentsRes,
-          deliveryRes,
-          ratingsRes,
-          timeRes,
-        ] = await Promise.all([
-          fetch(`${API_URL}/kpis${suffix}`),
-          fetch(`${API_URL}/sales-by-month${suffix}`),
-          fetch(`${API_URL}/sales-by-category${suffix}`),
-          fetch(`${API_URL}/top-products${suffix}`),
-          fetch(`${API_URL}/customers-by-gender${suffix}`),
-          fetch(`${API_URL}/sales-by-state${suffix}`),
-          fetch(`${API_URL}/payment-methods${suffix}`),
-          fetch(`${API_URL}/customers-by-age${suffix}`),
-          fetch(`${API_URL}/installments${suffix}`),
-          fetch(`${API_URL}/delivery-status${suffix}`),
-          fetch(`${API_URL}/product-ratings${suffix}`),
-          fetch(`${API_URL}/average-delivery-time${suffix}`),
-        ]);
+        // Carregar todos os widgets em uma única requisição (filtro e agrupamentos feitos uma vez no servidor)
+        const response = await fetch(`${API_URL}/dashboard${suffix}`);
 
-        // Verificar se todos os responses são ok
-        if (
-          !kpisRes.ok ||
-          !monthlySalesRes.ok ||
-          !categoriesRes.ok ||
-          !productsRes.ok ||
-          !genderRes.ok ||
-          !stateRes.ok ||
-          !paymentRes.ok ||
-          !ageRes.ok ||
-          !installmentsRes.ok ||
-          !deliveryRes.ok ||
-          !ratingsRes.ok ||
-          !timeRes.ok
-        ) {
+        if (!response.ok) {
           throw new Error('Erro ao carregar dados do servidor');
         }
 
-        // Processar respostas
-        const kpisData = await kpisRes.json();
-        const monthlySalesData = await monthlySalesRes.json();
-        const categoriesData = await categoriesRes.json();
-        const productsData = await productsRes.json();
-        const genderData = await genderRes.json();
-        const stateData = await stateRes.json();
-        const paymentData = await paymentRes.json();
-        const ageData = await ageRes.json();
-        const installmentsData = await installmentsRes.json();
-        const deliveryData = await deliveryRes.json();
-        const ratingsData = await ratingsRes.json();
-        const timeData = await timeRes.json();
+        // Processar resposta
+        const dashboard = await response.json();
+        const kpisData = dashboard.kpis;
+        const monthlySalesData = dashboard.sales_by_month;
+        const categoriesData = dashboard.sales_by_category;
+        const productsData = dashboard.top_products;
+        const genderData = dashboard.customers_by_gender;
+        const stateData = dashboard.sales_by_state;
+        const paymentData = dashboard.payment_methods;
+        const ageData = dashboard.customers_by_age;
+        const installmentsData = dashboard.installments;
+        const deliveryData = dashboard.delivery_status;
+        const ratingsData = dashboard.product_ratings;
+        const timeData = dashboard.average_delivery_time;
 
         console.log('✅ Dados carregados com sucesso:', {
           kpis: kpisData,
@@ -0,0 +1,190 @@
+"""
+Teste do upload incremental (mode=append)
+- Lotes só de duplicatas sobre os dados padrão: o append vira um dataset registrado e passa a ser o atual
+- Lotes só de duplicatas sobre um dataset registrado: mesmo dataset_id, e o atual só muda se ele já era o atual
+- Lote com sobreposição: os endpoints de análise respondem o mesmo que um upload dos dados combinados
+
+Roda a API em processo (TestClient), sem servidor nem snapshots em disco.
+
+Uso (a partir da raiz do projeto):
+    python -m pytest -q test_append.py
+"""
+
+import io
+import os
+import sys
+
+os.environ["SNAPSHOT_DIR"] = ""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+
+import pandas as pd  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from dataset import build_dataset  # noqa: E402
+from ingest import ingest_csv  # noqa: E402
+
+ROWS = 500
+
+# Endpoints comparados entre append e upload completo (o dashboard usa `region` em vez de `regiao`)
+ENDPOINTS = [
+    ("/kpis", {}),
+    ("/kpis", {"distinct": "approx"}),
+    ("/sales-by-month", {}),
+    ("/sales-by-category", {}),
+    ("/top-products", {}),
+    ("/customers-by-gender", {}),
+    ("/sales-by-state", {}),
+    ("/payment-methods", {}),
+    ("/customers-by-age", {}),
+    ("/customers-by-age", {"distinct": "approx"}),
+    ("/installments", {}),
+    ("/delivery-status", {}),
+    ("/product-ratings", {}),
+    ("/average-delivery-time", {}),
+    ("/analysis", {}),
+    ("/dashboard", {}),
+]
+
+FILTERS = [
+    {},
+    {"start_date": "2023-06-01", "end_date": "2024-03-31"},
+    {"regiao": "Sul"},
+    {"start_date": "2023-06-01", "end_date": "2024-03-31", "regiao": "Sul,Nordeste"},
+]
+
+
+def csv_bytes(start: int, rows: int = ROWS) -> bytes:
+    frame = pd.read_csv(main.CSV_PATH, skiprows=range(1, start + 1), nrows=rows)
+    # O validador converte cliente_id para inteiro: "CLI000974" viraria 0 e todos seriam o mesmo cliente
+    frame["cliente_id"] = frame["cliente_id"].str.removeprefix("CLI").astype(int)
+    return frame.to_csv(index=False).encode("utf-8")
+
+
+def append(client: TestClient, content: bytes, dataset_id=None) -> dict:
+    params = {"mode": "append", **({"dataset_id": dataset_id} if dataset_id else {})}
+    response = client.post("/upload", params=params, files={"file": ("lote.csv", content, "text/csv")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def upload(client: TestClient, content: bytes) -> str:
+    response = client.post("/upload", files={"file": ("base.csv", content, "text/csv")})
+    assert response.status_code == 200, response.text
+    return response.json()["dataset_id"]
+
+
+def endpoint_params(path: str, params: dict, filters: dict, dataset_id: str) -> dict:
+    filters = dict(filters)
+    if path == "/dashboard" and "regiao" in filters:
+        if "," in filters["regiao"]:
+            return None  # O dashboard aceita uma única região
+        filters["region"] = filters.pop("regiao")
+    if path == "/analysis" and "regiao" in filters:
+        return None  # /analysis só filtra por data
+    return {**params, **filters, "dataset_id": dataset_id}
+
+
+def snapshot_responses(client: TestClient, dataset_id: str) -> dict:
+    responses = {}
+    for path, params in ENDPOINTS:
+        for filters in FILTERS:
+            query = endpoint_params(path, params, filters, dataset_id)
+            if query is None:
+                continue
+            response = client.get(path, params=query)
+            assert response.status_code == 200, (path, query, response.text)
+            responses[(path, tuple(sorted(params.items())), tuple(sorted(filters.items())))] = response.json()
+    return responses
+
+
+def assert_same(actual, expected, where=""):
+    """Mesma estrutura e valores; números com a tolerância do pytest.approx (somas em outra ordem)"""
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and actual.keys() == expected.keys(), where
+        for key in expected:
+            assert_same(actual[key], expected[key], f"{where}.{key}")
+    elif isinstance(expected, list):
+        assert isinstance(actual, list) and len(actual) == len(expected), where
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            assert_same(a, e, f"{where}[{i}]")
+    elif isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        assert actual == pytest.approx(expected, rel=1e-9, nan_ok=True), where
+    else:
+        assert actual == expected, where
+
+
+@pytest.fixture(scope="module")
+def app_client():
+    # Um único ciclo de vida: o shutdown da aplicação encerra os pools de workers
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def client(app_client):
+    app_client.delete("/reset")
+    yield app_client
+    app_client.delete("/reset")
+
+
+def test_duplicate_append_on_default_data_registers_dataset(client, monkeypatch):
+    # Dados padrão iguais ao que o upload do lote produz: todas as linhas do append são duplicatas
+    sample = csv_bytes(0)
+    default = build_dataset(ingest_csv(io.BytesIO(sample), main.MAX_UPLOAD_ROWS, main.UPLOAD_CHUNK_ROWS)[0])
+    monkeypatch.setattr(main, "dataset_default", default)
+    monkeypatch.setattr(main, "df_default", default.frame)
+
+    body = append(client, sample)
+
+    assert body["appended_rows"] == 0
+    assert body["duplicates_skipped"] == ROWS
+    assert body["dataset_id"] is not None
+    assert main.current_upload_id() == body["dataset_id"]
+    assert client.get("/datasets").json()["current"] == "uploaded"
+    assert client.get("/kpis", params={"dataset_id": body["dataset_id"]}).json()["total_vendas"] == ROWS
+
+
+def test_duplicate_append_on_current_dataset_keeps_it_current(client):
+    sample = csv_bytes(0)
+    dataset_id = upload(client, sample)
+
+    body = append(client, sample)
+
+    assert body["dataset_id"] == dataset_id
+    assert body["appended_rows"] == 0
+    assert body["duplicates_skipped"] == ROWS
+    assert main.current_upload_id() == dataset_id
+
+
+def test_duplicate_append_on_other_dataset_keeps_current(client):
+    sample = csv_bytes(0)
+    first = upload(client, sample)
+    second = upload(client, csv_bytes(ROWS))
+
+    body = append(client, sample, dataset_id=first)
+
+    assert body["dataset_id"] == first
+    assert body["appended_rows"] == 0
+    assert main.current_upload_id() == second
+
+
+def test_overlapping_append_matches_full_upload(client):
+    # Linhas [0, 600) + lote [400, 1000): 200 duplicatas, e as datas do lote se intercalam às existentes
+    base, batch = csv_bytes(0, 600), csv_bytes(400, 600)
+    expected = snapshot_responses(client, upload(client, csv_bytes(0, 1000)))
+    client.delete("/reset")
+
+    dataset_id = upload(client, base)
+    # Consultas antes do append constroem o sketch de clientes, que então é combinado ao do lote
+    snapshot_responses(client, dataset_id)
+    body = append(client, batch)
+
+    assert body["dataset_id"] == dataset_id
+    assert body["appended_rows"] == 400
+    assert body["duplicates_skipped"] == 200
+    actual = snapshot_responses(client, dataset_id)
+    assert actual.keys() == expected.keys()
+    for key, response in expected.items():
+        assert_same(actual[key], response, str(key))